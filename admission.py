@@ -0,0 +1,93 @@
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import metrics
+
+
+class RateLimiter:
+    """Token bucket per source, refilled at `rate` tokens a second up to `burst`.
+
+    Buckets are kept least recently used first and the oldest is dropped
+    beyond max_sources, so memory stays bounded however many senders there
+    are; a flooding source is always recent and keeps its bucket.
+    """
+
+    def __init__(self, rate, burst, max_sources):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_sources = max_sources
+        # source -> [tokens, last refill time]
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, source):
+        """Take a token: 0 if the request may proceed, else seconds until a token is due"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(source)
+            if bucket is None:
+                bucket = self._buckets[source] = [self.burst, now]
+                if len(self._buckets) > self.max_sources:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(source)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AdmissionControl:
+    """Decides whether to take a webhook from its headers and the current load.
+
+    Runs before the body is read: a forward backlog or too many upstream
+    calls in flight sheds every request with 503, and a source over its
+    rate limit gets 429, both with a Retry-After.
+    """
+
+    def __init__(self, limiter, key_header, max_queue_depth, max_in_flight, retry_after):
+        self.limiter = limiter
+        self.key_header = key_header
+        self.max_queue_depth = max_queue_depth
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.rejected = Counter()
+        self._lock = threading.Lock()
+
+    def check(self, remote_addr, headers, queue_depth, in_flight):
+        """None to accept the request, else (status code, reason, Retry-After seconds)"""
+        if self.max_queue_depth and queue_depth >= self.max_queue_depth:
+            return self._reject(503, 'queue_full', self.retry_after)
+        if self.max_in_flight and in_flight >= self.max_in_flight:
+            return self._reject(503, 'upstream_busy', self.retry_after)
+        if self.limiter is not None:
+            # Behind a proxy, key on a header such as X-Forwarded-For instead
+            source = (headers.get(self.key_header) if self.key_header else None) or remote_addr
+            wait = self.limiter.acquire(source)
+            if wait:
+                return self._reject(429, 'rate_limited', math.ceil(wait))
+        return None
+
+    def _reject(self, status, reason, retry_after):
+        metrics.REJECTED.inc(reason)
+        with self._lock:
+            self.rejected[reason] += 1
+        return status, reason, retry_after
+
+    def stats(self):
+        with self._lock:
+            rejected = dict(self.rejected)
+        return {
+            'rate_limit': self.limiter.rate if self.limiter is not None else None,
+            'sources': len(self.limiter) if self.limiter is not None else 0,
+            'max_queue_depth': self.max_queue_depth,
+            'max_in_flight': self.max_in_flight,
+            'rejected': rejected
+        }
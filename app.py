@@ -1,9 +1,39 @@
-from flask import Flask, request, jsonify, render_template_string
-import requests
+from flask import Flask, Response, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.serving import make_server
 import logging
+import atexit
+import gzip
+import hashlib
 import json
+import os
+import sys
+import threading
+import time
 from datetime import datetime
+from admission import AdmissionControl, RateLimiter
+from batching import CONTENT_TYPES, BatchForwarder
+from breaker import CircuitBreakers
+from compression import (
+    GZIP_LEVEL, MIN_COMPRESS_BYTES, DecompressRequests, InflatingReader, InvalidEncoding, accepts_gzip, compressible
+)
 from config import Config
+from dedup import DuplicateFilter
+from fragments import FragmentCache
+from events import EventBroker
+from jinja2 import Environment
+from journal import Journal
+from markupsafe import Markup
+import metrics
+import prefork
+from profiling import IngestProfiler
+from retry import DeadLetterQueue, DeadLetterReplayer, RetryScheduler, circuit_open_only, failed_targets
+from routing import Router, load_routes
+from search import SearchIndex
+from forwarder import FanOutForwarder, ForwardQueue, UpstreamSessions, combine_results, forward_headers
+from sqlite_store import SQLiteDeadLetterQueue, SQLiteRequestStore
+from streaming import BodySpill, BodyTooLarge, StreamingBody, is_large_body
+from store import RequestRecord, RequestStore
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,14 +41,304 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# In-memory storage for requests (in production, use a database)
-received_requests = []
+# Storage for captured requests: bounded in memory (oldest are evicted
+# first) or an SQLite database for histories too large for RAM
+if Config.STORE_BACKEND == 'sqlite':
+    received_requests = SQLiteRequestStore(
+        Config.SQLITE_PATH,
+        Config.SQLITE_MAX_REQUESTS,
+        Config.SQLITE_BATCH_SIZE,
+        # Shared with the other worker processes under the pre-fork launcher
+        prefork.shared_ids
+    )
+    atexit.register(received_requests.close)
+else:
+    received_requests = RequestStore(
+        Config.STORE_MAX_REQUESTS,
+        Config.STORE_MAX_BYTES,
+        Config.STORE_COMPACT,
+        Config.STORE_COMPRESS_BYTES
+    )
 response_templates = []
 
 # Configuration
 REDIRECT_URL = Config.REDIRECT_URL
 LISTEN_PORT = Config.LISTEN_PORT
 HOST = Config.HOST
+ASYNC_FORWARDING = Config.ASYNC_FORWARDING
+FORWARD_PASSTHROUGH = Config.FORWARD_PASSTHROUGH
+
+# Upper bound for the page size accepted by /api/requests
+MAX_PAGE_SIZE = 500
+
+# Longest profiling window accepted by /admin/profile, in seconds
+MAX_PROFILE_SECONDS = 300
+
+# Sampling profiler of the webhook handlers, started by /admin/profile
+ingest_profiler = IngestProfiler()
+
+# Live push of new requests to open dashboards
+event_broker = EventBroker(Config.EVENTS_BUFFER_SIZE)
+
+def publish_shared_requests(interval=0.5, window=10):
+    """Publish requests stored by any worker, read back from the shared store"""
+    published = {}
+    while True:
+        time.sleep(interval)
+        now = time.time()
+        if not event_broker.stats()['subscribers'] and search_index is None:
+            continue
+        for request_id in received_requests.ids_since(now - window):
+            if request_id not in published:
+                published[request_id] = now
+                record = received_requests.get(request_id)
+                if record is not None:
+                    event_broker.publish('request', record.summary())
+                    if search_index is not None:
+                        search_index.add(record)
+        for request_id in [i for i, seen in published.items() if seen < now - 2 * window]:
+            del published[request_id]
+
+if prefork.shared_ids is None:
+    received_requests.on_add.append(lambda record: event_broker.publish('request', record.summary()))
+
+# Optional on-disk journal so captured requests survive restarts
+journal = None
+if Config.JOURNAL_ENABLED and Config.STORE_BACKEND == 'sqlite':
+    logger.warning("JOURNAL_ENABLED is ignored with the sqlite store backend")
+elif Config.JOURNAL_ENABLED:
+    journal = Journal(
+        Config.JOURNAL_DIR,
+        Config.JOURNAL_SEGMENT_BYTES,
+        Config.JOURNAL_MAX_SEGMENTS,
+        Config.JOURNAL_FSYNC,
+        Config.JOURNAL_MAX_PENDING
+    )
+    journal.recover(received_requests)
+    journal.start()
+    received_requests.on_add.append(journal.append_request)
+    received_requests.on_forward.append(journal.append_forward)
+    received_requests.on_clear.append(journal.append_clear)
+    atexit.register(journal.close)
+
+# Inverted index behind /api/search, built from the stored requests at
+# startup and then kept up to date by the store callbacks
+search_index = None
+if Config.SEARCH_ENABLED:
+    search_index = SearchIndex(received_requests, Config.SEARCH_MAX_TERMS, Config.SEARCH_QUEUE_SIZE)
+    if prefork.shared_ids is None:
+        received_requests.on_add.append(search_index.add)
+    received_requests.on_evict.append(search_index.remove)
+    received_requests.on_clear.append(search_index.clear)
+    search_index.start()
+
+if prefork.shared_ids is not None:
+    # Requests captured by other workers only reach this worker through the
+    # database; started once search_index, which it also feeds, is set
+    threading.Thread(target=publish_shared_requests, name='shared-events', daemon=True).start()
+
+# Large bodies are streamed upstream; the store keeps a preview and the
+# full body is spilled to disk until its last forward has finished (no
+# retry or dead letter needs it any more)
+app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH or None
+# gzip / deflate bodies are inflated as they are read, within the same
+# size limit and an expansion ratio against decompression bombs
+app.wsgi_app = DecompressRequests(app.wsgi_app, Config.DECOMPRESS_MAX_RATIO, Config.MAX_CONTENT_LENGTH)
+body_spill = BodySpill(Config.BODY_SPILL_DIR)
+received_requests.on_evict.append(body_spill.remove)
+received_requests.on_clear.append(body_spill.clear)
+
+# Pooled keep-alive connections to the upstream targets
+upstream_sessions = UpstreamSessions(
+    Config.UPSTREAM_POOL_SIZE,
+    Config.UPSTREAM_CONNECT_TIMEOUT,
+    Config.UPSTREAM_READ_TIMEOUT
+)
+
+# Upstream targets: the routing table from ROUTES / ROUTES_FILE, compiled
+# once, or the single REDIRECT_URL
+router = Router(
+    load_routes(Config.ROUTES, Config.ROUTES_FILE),
+    REDIRECT_URL,
+    (Config.UPSTREAM_CONNECT_TIMEOUT, Config.UPSTREAM_READ_TIMEOUT),
+    Config.FORWARD_GZIP
+)
+# Optional circuit breaker per target, so a down or slow upstream fails fast
+breakers = None
+if Config.BREAKER_ENABLED:
+    breakers = CircuitBreakers(
+        Config.BREAKER_WINDOW,
+        Config.BREAKER_MIN_CALLS,
+        Config.BREAKER_ERROR_RATE,
+        Config.BREAKER_SLOW_MS,
+        Config.BREAKER_SLOW_RATE,
+        Config.BREAKER_OPEN_SECONDS
+    )
+forwarder = FanOutForwarder(router, upstream_sessions, Config.FANOUT_WORKERS, breakers)
+
+def handle_forward_result(job, result):
+    """Record a forward result, scheduling a retry of the failed targets"""
+    record = job.get('record') or received_requests.get(job.get('request_id'))
+    # Keep the results of targets that succeeded on earlier attempts
+    if record is not None and record.forward and record.forward.get('targets'):
+        result = combine_results(dict(record.forward['targets'], **result['targets']))
+    failed = [name for name in failed_targets(result) if name in job['targets']]
+    if retry_scheduler and failed:
+        job['targets'] = failed
+        # Not sent upstream at all: wait for the circuits instead of
+        # spending an attempt, or an outage would dead-letter everything
+        wait = None
+        if breakers is not None and circuit_open_only(result, failed):
+            wait = breakers.retry_after(failed)
+        delay = retry_scheduler.schedule(job, result, wait)
+        if delay is None:
+            result = dict(result, status='dead_letter', attempts=job.get('attempt', 1))
+        else:
+            result = dict(result, status='retrying', attempts=job.get('attempt', 1) - 1, retry_in=round(delay, 1))
+    # Last forward of a spilled body: nothing reads the file after this
+    finished = job.get('body_path') and result['status'] not in ('retrying', 'dead_letter')
+    if record is not None:
+        if record.timings is not None and 'elapsed_ms' in result:
+            record.timings['forward'] = result['elapsed_ms']
+        if finished and record.body_path == job['body_path']:
+            record.body_path = None
+        received_requests.set_forward(record, result)
+    if finished:
+        body_spill.release(job['body_path'])
+    return result
+
+# Background forwarder used in accept-then-forward mode and for retries
+forward_queue = ForwardQueue(
+    Config.FORWARD_QUEUE_SIZE,
+    Config.FORWARD_WORKERS,
+    forwarder,
+    handle_forward_result
+)
+
+# Optional batched delivery: requests are coalesced per target into NDJSON
+# or JSON-array posts, up to FORWARD_QUEUE_SIZE waiting at once
+batch_forwarder = None
+if Config.BATCH_ENABLED:
+    if Config.BATCH_FORMAT not in CONTENT_TYPES:
+        logger.warning(f"Unknown BATCH_FORMAT {Config.BATCH_FORMAT}, using ndjson")
+    batch_forwarder = BatchForwarder(
+        router,
+        upstream_sessions,
+        Config.BATCH_MAX_SIZE,
+        Config.BATCH_MAX_BYTES,
+        Config.BATCH_MAX_DELAY,
+        Config.BATCH_FORMAT if Config.BATCH_FORMAT in CONTENT_TYPES else 'ndjson',
+        Config.BATCH_FLUSH_WORKERS,
+        Config.FORWARD_QUEUE_SIZE,
+        handle_forward_result,
+        breakers
+    )
+    atexit.register(batch_forwarder.flush)
+
+def queued_forwards():
+    """Requests waiting for a forwarder worker or a batch"""
+    return forward_queue.depth() + (batch_forwarder.depth() if batch_forwarder else 0)
+
+# Gauges read when /metrics is scraped
+metrics.registry.register(metrics.Gauge(
+    'webhook_store_records', 'Captured requests held by the store', lambda: len(received_requests)
+))
+metrics.registry.register(metrics.Gauge(
+    'webhook_store_bytes', 'Approximate size of the captured requests held by the store',
+    lambda: received_requests.stats()['bytes']
+))
+metrics.registry.register(metrics.Gauge(
+    'webhook_forward_queue_depth', 'Requests waiting for a forwarder worker or a batch', queued_forwards
+))
+
+# Retries with exponential backoff; forwards that run out of attempts go to
+# a persisted dead-letter queue
+retry_scheduler = None
+dead_letters = None
+dead_letter_replayer = None
+if Config.RETRY_ENABLED:
+    if prefork.shared_ids is not None:
+        # In the shared database, so every worker lists and replays the same ones
+        dead_letters = SQLiteDeadLetterQueue(Config.SQLITE_PATH, Config.DEAD_LETTER_MAX)
+    else:
+        dead_letters = DeadLetterQueue(Config.DEAD_LETTER_PATH, Config.DEAD_LETTER_MAX)
+    retry_scheduler = RetryScheduler(
+        forward_queue.submit,
+        Config.RETRY_MAX_ATTEMPTS,
+        Config.RETRY_BASE_DELAY,
+        Config.RETRY_MAX_DELAY,
+        dead_letters
+    )
+    dead_letter_replayer = DeadLetterReplayer(dead_letters, forward_queue.submit)
+    body_spill.holders.extend([
+        forward_queue.holds_body,
+        retry_scheduler.holds_body,
+        dead_letters.holds_body,
+        dead_letter_replayer.holds_body
+    ])
+
+# Rate limits per source and load shedding, checked before reading a body
+admission = AdmissionControl(
+    RateLimiter(Config.RATE_LIMIT, Config.RATE_LIMIT_BURST, Config.RATE_LIMIT_MAX_SOURCES)
+    if Config.RATE_LIMIT > 0 else None,
+    Config.RATE_LIMIT_HEADER,
+    Config.SHED_QUEUE_DEPTH,
+    Config.SHED_IN_FLIGHT,
+    Config.SHED_RETRY_AFTER
+)
+
+# Optional duplicate filter: repeated deliveries are stored and linked to the
+# first one, but acknowledged without being forwarded again
+duplicate_filter = None
+if Config.DEDUP_ENABLED:
+    duplicate_filter = DuplicateFilter(Config.DEDUP_HEADER, Config.DEDUP_TTL, Config.DEDUP_MAX_KEYS)
+
+if not len(received_requests) and prefork.shared_ids is None:
+    # Only dead letters can still refer to bodies spilled by an earlier run
+    body_spill.clear()
+
+# Dashboard entry of one captured request, rendered once per record and
+# cached (see dashboard_fragments); live updates use renderRequestItem() in
+# the page script
+REQUEST_ITEM_TEMPLATE = '''
+<div class="request-item" id="request-{{ req.id }}">
+    <div class="request-header">
+        <span class="method-badge method-{{ req.method|lower }}">{{ req.method }}</span>
+        <span class="timestamp">{{ req.timestamp }}</span>
+    </div>
+    <div class="request-url">
+        <strong>{{ req.url }}</strong>
+    </div>
+    {% if req.forward %}
+    <div class="forward-status forward-{{ req.forward.status }}">
+        ↪️ Forward: {{ req.forward.status }}{% if req.forward.status_code %} ({{ req.forward.status_code }}{% if req.forward.response_bytes is defined %}, {{ req.forward.response_bytes }} B{% endif %}){% endif %}{% if req.forward.batch %} in batch {{ req.forward.batch }}{% endif %}{% if req.forward.error %} — {{ req.forward.error }}{% endif %}{% if req.forward.duplicate_of %} of <a href="/api/requests/{{ req.forward.duplicate_of }}" target="_blank">#{{ req.forward.duplicate_of }}</a>{% endif %}
+        {% if req.forward.targets and req.forward.targets|length > 1 %}
+        <ul>
+            {% for name, result in req.forward.targets.items() %}
+            <li class="forward-{{ result.status }}">{{ name }}: {{ result.status_code or result.error }}</li>
+            {% endfor %}
+        </ul>
+        {% endif %}
+    </div>
+    {% endif %}
+    
+    <div class="request-details" id="details-{{ req.id }}" style="display: none;"></div>
+    
+    <div class="actions">
+        <button onclick="toggleDetails('{{ req.id }}')">🔍 Details</button>
+        <button onclick="toggleResponseForm('response-form-{{ req.id }}')">💬 Respond</button>
+    </div>
+    
+    <div id="response-form-{{ req.id }}" class="response-form">
+        <h4>Send Custom Response</h4>
+        <textarea id="response-text-{{ req.id }}" placeholder='{"status": "success", "message": "Response received"}'>{"status": "success", "message": "Request processed successfully"}</textarea>
+        <label>Status Code: 
+            <input type="number" id="status-code-{{ req.id }}" value="200" min="100" max="599">
+        </label>
+        <button class="btn-success" onclick="sendResponse('{{ req.id }}')">Send Response</button>
+    </div>
+</div>
+'''
 
 # Enhanced HTML template for the web interface
 HTML_TEMPLATE = '''
@@ -86,6 +406,25 @@ HTML_TEMPLATE = '''
             backdrop-filter: blur(10px);
         }
         
+        .circuit {
+            padding: 2px 8px;
+            border-radius: 10px;
+            font-size: 0.8rem;
+            font-weight: 600;
+        }
+        
+        .circuit-closed {
+            background-color: #28a745;
+        }
+        
+        .circuit-half_open {
+            background-color: #f8961e;
+        }
+        
+        .circuit-open {
+            background-color: #dc3545;
+        }
+        
         .controls {
             display: flex;
             gap: 10px;
@@ -215,6 +554,24 @@ HTML_TEMPLATE = '''
             margin: 15px 0;
         }
         
+        .forward-status {
+            margin-top: 8px;
+            font-size: 0.9rem;
+            color: var(--gray);
+        }
+        
+        .forward-forwarded {
+            color: #28a745;
+        }
+        
+        .forward-partial, .forward-retrying, .forward-duplicate {
+            color: #f8961e;
+        }
+        
+        .forward-error, .forward-dropped, .forward-dead_letter {
+            color: #dc3545;
+        }
+        
         .detail-section {
             margin-bottom: 15px;
         }
@@ -258,6 +615,46 @@ HTML_TEMPLATE = '''
             font-family: 'Courier New', monospace;
         }
         
+        .search-bar {
+            display: flex;
+            gap: 10px;
+            padding: 15px 20px;
+            border-bottom: 1px solid #eee;
+        }
+        
+        .search-bar input {
+            margin: 0;
+        }
+        
+        .dead-letters {
+            margin-top: 20px;
+        }
+        
+        .dead-letter-item {
+            padding: 12px 20px;
+            border-bottom: 1px solid #eee;
+            font-size: 0.9rem;
+        }
+        
+        .dead-letter-error {
+            color: #dc3545;
+        }
+        
+        .replay-controls {
+            display: flex;
+            gap: 10px;
+            align-items: center;
+        }
+        
+        .replay-controls input {
+            width: 90px;
+        }
+        
+        .load-more {
+            padding: 20px;
+            text-align: center;
+        }
+        
         .empty-state {
             text-align: center;
             padding: 50px 20px;
@@ -298,7 +695,11 @@ HTML_TEMPLATE = '''
                 </div>
                 <div class="config-card">
                     <h3>🔄 Redirect URL</h3>
-                    <p>{{ redirect_url or 'Not set (requests stored locally)' }}</p>
+                    {% for target in targets %}
+                    <p>{% if target.name != 'default' %}{{ target.name }}: {% endif %}{{ target.url }}{% if circuits[target.name] %} <span class="circuit circuit-{{ circuits[target.name] }}">circuit {{ circuits[target.name]|replace('_', '-') }}</span>{% endif %}</p>
+                    {% else %}
+                    <p>Not set (requests stored locally)</p>
+                    {% endfor %}
                 </div>
                 <div class="config-card">
                     <h3>📊 Status</h3>
@@ -309,21 +710,27 @@ HTML_TEMPLATE = '''
         
         <div class="stats">
             <div class="stat-card">
-                <div class="stat-number">{{ requests|length }}</div>
+                <div class="stat-number" id="total-count">{{ total_requests }}</div>
                 <div class="stat-label">Total Requests</div>
             </div>
             <div class="stat-card">
-                <div class="stat-number">{{ post_count }}</div>
+                <div class="stat-number" id="post-count">{{ post_count }}</div>
                 <div class="stat-label">POST Requests</div>
             </div>
             <div class="stat-card">
-                <div class="stat-number">{{ get_count }}</div>
+                <div class="stat-number" id="get-count">{{ get_count }}</div>
                 <div class="stat-label">GET Requests</div>
             </div>
             <div class="stat-card">
-                <div class="stat-number">{{ recent_count }}</div>
+                <div class="stat-number" id="recent-count">{{ recent_count }}</div>
                 <div class="stat-label">Last Hour</div>
             </div>
+            {% if async_forwarding %}
+            <div class="stat-card">
+                <div class="stat-number">{{ forwarder.queue_depth }}</div>
+                <div class="stat-label">Forward Queue ({{ forwarder.workers }} workers)</div>
+            </div>
+            {% endif %}
         </div>
         
         <div class="controls">
@@ -335,64 +742,24 @@ HTML_TEMPLATE = '''
         <div class="requests-container">
             <div class="requests-header">
                 <h2>📥 Received Requests</h2>
-                <span>{{ requests|length }} requests</span>
+                <span><span id="list-count">{{ total_requests }}</span> requests</span>
             </div>
             
-            <div class="request-list">
+            {% if search_enabled %}
+            <div class="search-bar">
+                <input type="search" id="search-query" placeholder="Search headers, query params and payloads, e.g. order.id=1234" onkeydown="if (event.key === 'Enter') searchRequests()">
+                <button onclick="searchRequests()">🔎 Search</button>
+            </div>
+            {% endif %}
+            
+            <div class="request-list" id="request-list">
                 {% if requests %}
-                    {% for req in requests|reverse %}
-                    <div class="request-item" id="request-{{ req.id }}">
-                        <div class="request-header">
-                            <span class="method-badge method-{{ req.method|lower }}">{{ req.method }}</span>
-                            <span class="timestamp">{{ req.timestamp }}</span>
-                        </div>
-                        <div class="request-url">
-                            <strong>{{ req.url }}</strong>
-                        </div>
-                        
-                        <div class="request-details">
-                            {% if req.headers %}
-                            <div class="detail-section">
-                                <div class="detail-title">📋 Headers</div>
-                                <div class="detail-content">
-                                    <pre>{{ req.headers|tojson(indent=2) }}</pre>
-                                </div>
-                            </div>
-                            {% endif %}
-                            
-                            {% if req.data %}
-                            <div class="detail-section">
-                                <div class="detail-title">📄 Data</div>
-                                <div class="detail-content">
-                                    <pre>{{ req.data|tojson(indent=2) }}</pre>
-                                </div>
-                            </div>
-                            {% endif %}
-                            
-                            {% if req.query_params %}
-                            <div class="detail-section">
-                                <div class="detail-title">🔍 Query Parameters</div>
-                                <div class="detail-content">
-                                    <pre>{{ req.query_params|tojson(indent=2) }}</pre>
-                                </div>
-                            </div>
-                            {% endif %}
-                        </div>
-                        
-                        <div class="actions">
-                            <button onclick="toggleResponseForm('response-form-{{ req.id }}')">💬 Respond</button>
-                        </div>
-                        
-                        <div id="response-form-{{ req.id }}" class="response-form">
-                            <h4>Send Custom Response</h4>
-                            <textarea id="response-text-{{ req.id }}" placeholder='{"status": "success", "message": "Response received"}'>{"status": "success", "message": "Request processed successfully"}</textarea>
-                            <label>Status Code: 
-                                <input type="number" id="status-code-{{ req.id }}" value="200" min="100" max="599">
-                            </label>
-                            <button class="btn-success" onclick="sendResponse('{{ req.id }}')">Send Response</button>
-                        </div>
+                    {{ request_items }}
+                    {% if next_cursor %}
+                    <div class="load-more">
+                        <button id="load-more" data-cursor="{{ next_cursor }}" onclick="loadMore()">⬇️ Load Older Requests</button>
                     </div>
-                    {% endfor %}
+                    {% endif %}
                 {% else %}
                     <div class="empty-state">
                         <div>📭</div>
@@ -403,6 +770,36 @@ HTML_TEMPLATE = '''
                 {% endif %}
             </div>
         </div>
+        
+        {% if dead_letters is not none %}
+        <div class="requests-container dead-letters">
+            <div class="requests-header">
+                <h2>☠️ Dead Letters</h2>
+                <div class="replay-controls">
+                    <span>{{ dead_letter_count }} failed forwards</span>
+                    {% if dead_letter_count %}
+                    <input type="number" id="replay-rate" value="{{ replay_rate }}" min="0.1" step="0.1" title="Requests per second">
+                    <button class="btn-warning" onclick="replayDeadLetters()">🔁 Replay All</button>
+                    {% endif %}
+                </div>
+            </div>
+            <div class="request-list">
+                {% for entry in dead_letters %}
+                <div class="dead-letter-item">
+                    <span class="method-badge method-{{ entry.method|lower }}">{{ entry.method }}</span>
+                    <strong>Request #{{ entry.request_id }}</strong> → {{ (entry.targets or [])|join(', ') }}
+                    <span class="timestamp">{{ entry.failed_at }} after {{ entry.attempt }} attempts</span>
+                    <div class="dead-letter-error">{{ entry.error }}</div>
+                </div>
+                {% else %}
+                <div class="empty-state">
+                    <h3>No Dead Letters</h3>
+                    <p>Forwards that run out of retry attempts show up here</p>
+                </div>
+                {% endfor %}
+            </div>
+        </div>
+        {% endif %}
     </div>
     
     <script>
@@ -417,6 +814,163 @@ HTML_TEMPLATE = '''
             }
         }
         
+        function escapeHtml(text) {
+            return String(text)
+                .replace(/&/g, '&amp;')
+                .replace(/</g, '&lt;')
+                .replace(/>/g, '&gt;')
+                .replace(/"/g, '&quot;')
+                .replace(/'/g, '&#39;');
+        }
+        
+        function renderDetailSection(title, value) {
+            return '<div class="detail-section">' +
+                '<div class="detail-title">' + title + '</div>' +
+                '<div class="detail-content"><pre>' + escapeHtml(JSON.stringify(value, null, 2)) + '</pre></div>' +
+                '</div>';
+        }
+        
+        function toggleDetails(requestId) {
+            const details = document.getElementById('details-' + requestId);
+            if (details.style.display !== 'none') {
+                details.style.display = 'none';
+                return;
+            }
+            details.style.display = 'block';
+            if (details.dataset.loaded) {
+                return;
+            }
+            details.innerHTML = '<p class="timestamp">Loading...</p>';
+            fetch('/api/requests/' + requestId)
+                .then(response => response.json())
+                .then(req => {
+                    let html = '';
+                    if (req.headers && Object.keys(req.headers).length) {
+                        html += renderDetailSection('📋 Headers', req.headers);
+                    }
+                    if (req.data) {
+                        html += renderDetailSection('📄 Data', req.data);
+                    }
+                    if (req.query_params && Object.keys(req.query_params).length) {
+                        html += renderDetailSection('🔍 Query Parameters', req.query_params);
+                    }
+                    if (req.timings) {
+                        html += renderDetailSection('⏱️ Timing (ms)', req.timings);
+                    }
+                    if (req.forward && req.forward.targets) {
+                        html += renderDetailSection('↪️ Upstream', req.forward.targets);
+                    }
+                    details.innerHTML = html || '<p class="timestamp">No headers or payload</p>';
+                    details.dataset.loaded = 'true';
+                })
+                .catch(error => {
+                    details.innerHTML = '<p class="timestamp">Error loading request: ' + escapeHtml(error) + '</p>';
+                });
+        }
+        
+        function renderForwardStatus(forward) {
+            if (!forward) {
+                return '';
+            }
+            let text = '↪️ Forward: ' + forward.status;
+            if (forward.status_code) {
+                text += ' (' + forward.status_code +
+                    (forward.response_bytes !== undefined ? ', ' + forward.response_bytes + ' B' : '') + ')';
+            }
+            if (forward.batch) {
+                text += ' in batch ' + forward.batch;
+            }
+            if (forward.error) {
+                text += ' — ' + forward.error;
+            }
+            let original = '';
+            if (forward.duplicate_of) {
+                original = ' of <a href="/api/requests/' + forward.duplicate_of + '" target="_blank">#' + forward.duplicate_of + '</a>';
+            }
+            let targets = '';
+            if (forward.targets && Object.keys(forward.targets).length > 1) {
+                targets = '<ul>' + Object.entries(forward.targets).map(([name, result]) =>
+                    '<li class="forward-' + escapeHtml(result.status) + '">' + escapeHtml(name + ': ' + (result.status_code || result.error)) + '</li>'
+                ).join('') + '</ul>';
+            }
+            return '<div class="forward-status forward-' + escapeHtml(forward.status) + '">' + escapeHtml(text) + original + targets + '</div>';
+        }
+        
+        function renderRequestItem(req) {
+            const id = req.id;
+            return '<div class="request-item" id="request-' + id + '">' +
+                '<div class="request-header">' +
+                '<span class="method-badge method-' + escapeHtml(req.method.toLowerCase()) + '">' + escapeHtml(req.method) + '</span>' +
+                '<span class="timestamp">' + escapeHtml(req.timestamp) + '</span>' +
+                '</div>' +
+                '<div class="request-url"><strong>' + escapeHtml(req.url) + '</strong></div>' +
+                renderForwardStatus(req.forward) +
+                '<div class="request-details" id="details-' + id + '" style="display: none;"></div>' +
+                '<div class="actions">' +
+                '<button onclick="toggleDetails(\'' + id + '\')">🔍 Details</button>' +
+                '<button onclick="toggleResponseForm(\'response-form-' + id + '\')">💬 Respond</button>' +
+                '</div>' +
+                '<div id="response-form-' + id + '" class="response-form">' +
+                '<h4>Send Custom Response</h4>' +
+                '<textarea id="response-text-' + id + '">{"status": "success", "message": "Request processed successfully"}</textarea>' +
+                '<label>Status Code: <input type="number" id="status-code-' + id + '" value="200" min="100" max="599"></label>' +
+                '<button class="btn-success" onclick="sendResponse(\'' + id + '\')">Send Response</button>' +
+                '</div>' +
+                '</div>';
+        }
+        
+        // Query whose matches the request list shows instead of the latest requests
+        let searchQuery = '';
+        
+        function searchRequests() {
+            searchQuery = document.getElementById('search-query').value.trim();
+            if (!searchQuery) {
+                location.reload();
+                return;
+            }
+            fetch('/api/search?q=' + encodeURIComponent(searchQuery))
+                .then(response => response.json())
+                .then(page => {
+                    if (page.status === 'error') {
+                        alert(page.message);
+                        return;
+                    }
+                    const list = document.getElementById('request-list');
+                    list.innerHTML = page.requests.length
+                        ? page.requests.map(renderRequestItem).join('')
+                        : '<div class="empty-state"><div>🔎</div><h3>No Matching Requests</h3></div>';
+                    if (page.next_cursor) {
+                        list.insertAdjacentHTML('beforeend',
+                            '<div class="load-more"><button id="load-more" data-cursor="' + page.next_cursor +
+                            '" onclick="loadMore()">⬇️ Load Older Matches</button></div>');
+                    }
+                })
+                .catch(error => {
+                    alert('Error searching requests: ' + error);
+                });
+        }
+        
+        function loadMore() {
+            const button = document.getElementById('load-more');
+            const url = searchQuery
+                ? '/api/search?q=' + encodeURIComponent(searchQuery) + '&cursor='
+                : '/api/requests?cursor=';
+            fetch(url + button.dataset.cursor)
+                .then(response => response.json())
+                .then(page => {
+                    const html = page.requests.map(renderRequestItem).join('');
+                    button.parentElement.insertAdjacentHTML('beforebegin', html);
+                    if (page.next_cursor) {
+                        button.dataset.cursor = page.next_cursor;
+                    } else {
+                        button.parentElement.remove();
+                    }
+                })
+                .catch(error => {
+                    alert('Error loading requests: ' + error);
+                });
+        }
+        
         function toggleResponseForm(formId) {
             const form = document.getElementById(formId);
             form.style.display = form.style.display === 'none' ? 'block' : 'none';
@@ -447,6 +1001,25 @@ HTML_TEMPLATE = '''
             });
         }
         
+        function replayDeadLetters() {
+            const rate = parseFloat(document.getElementById('replay-rate').value);
+            fetch('/dead-letters/replay', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ rate: rate })
+            })
+            .then(response => response.json())
+            .then(data => {
+                alert(data.message);
+                location.reload();
+            })
+            .catch(error => {
+                alert('Error replaying dead letters: ' + error);
+            });
+        }
+        
         function sendTestRequest() {
             fetch('/', {
                 method: 'POST',
@@ -462,145 +1035,381 @@ HTML_TEMPLATE = '''
                 })
             })
             .then(() => {
-                alert('Test request sent! Refresh to see it.');
-                setTimeout(() => location.reload(), 1000);
+                if (!liveUpdates) {
+                    alert('Test request sent! Refresh to see it.');
+                    setTimeout(() => location.reload(), 1000);
+                }
             })
             .catch(error => {
                 alert('Error sending test request: ' + error);
             });
         }
         
-        // Auto-refresh every 30 seconds
-        setInterval(() => {
-            // Only refresh if we're not in the middle of filling out a form
-            if (!document.querySelector('.response-form[style*="block"]')) {
-                location.reload();
+        function incrementCount(elementId) {
+            const element = document.getElementById(elementId);
+            if (element) {
+                element.textContent = parseInt(element.textContent) + 1;
+            }
+        }
+        
+        function showNewRequest(req) {
+            // With several workers, recent requests may be pushed again
+            if (document.getElementById('request-' + req.id)) {
+                return;
             }
-        }, 30000);
+            // Search results are left alone; the counters still update
+            if (!searchQuery) {
+                const list = document.getElementById('request-list');
+                const emptyState = list.querySelector('.empty-state');
+                if (emptyState) {
+                    emptyState.remove();
+                }
+                list.insertAdjacentHTML('afterbegin', renderRequestItem(req));
+            }
+            incrementCount('total-count');
+            incrementCount('list-count');
+            incrementCount('recent-count');
+            if (req.method === 'POST') {
+                incrementCount('post-count');
+            } else if (req.method === 'GET') {
+                incrementCount('get-count');
+            }
+        }
+        
+        // Live updates: new requests are pushed by the server as they arrive
+        let liveUpdates = false;
+        if (window.EventSource) {
+            const events = new EventSource('/events');
+            events.onopen = () => { liveUpdates = true; };
+            events.onerror = () => { liveUpdates = false; };
+            events.addEventListener('request', event => {
+                showNewRequest(JSON.parse(event.data));
+            });
+        } else {
+            // Fall back to reloading every 30 seconds
+            setInterval(() => {
+                // Only refresh if we're not in the middle of filling out a form
+                if (!document.querySelector('.response-form[style*="block"]')) {
+                    location.reload();
+                }
+            }, 30000);
+        }
     </script>
 </body>
 </html>
 '''
 
+# The page template compiled once, and the dashboard entries rendered once
+# per request and dropped when the request leaves the store
+dashboard_template = app.jinja_env.from_string(HTML_TEMPLATE)
+request_item_template = Environment(autoescape=True).from_string(REQUEST_ITEM_TEMPLATE)
+dashboard_fragments = FragmentCache(
+    lambda record: request_item_template.render(req=record),
+    2 * Config.DASHBOARD_PAGE_SIZE
+)
+received_requests.on_evict.append(dashboard_fragments.discard)
+received_requests.on_clear.append(dashboard_fragments.clear)
+
 def count_requests_by_method(method):
-    """Count requests by HTTP method"""
-    return len([req for req in received_requests if req['method'] == method])
+    """Count stored requests by HTTP method"""
+    return received_requests.counters.count_method(method)
 
 def count_recent_requests(hours=1):
     """Count requests from the last hour"""
-    now = datetime.now()
-    count = 0
-    for req in received_requests:
-        try:
-            req_time = datetime.strptime(req['timestamp'], '%Y-%m-%d %H:%M:%S')
-            if (now - req_time).total_seconds() < hours * 3600:
-                count += 1
-        except:
-            pass
-    return count
+    return received_requests.counters.count_recent(hours)
+
+def store_and_route(request_info, job, path, dedup_key=None):
+    """Store a captured request and pick the targets it is forwarded to"""
+    with metrics.STORE_SECONDS.time():
+        received_requests.add(request_info)
+    job['request_id'] = request_info.id
+    if dedup_key is not None:
+        original = duplicate_filter.claim(dedup_key, request_info.id)
+        if original is not None:
+            received_requests.set_forward(request_info, {'status': 'duplicate', 'duplicate_of': original})
+            job['targets'] = []
+            return []
+        job['dedup_key'] = dedup_key
+    # Only parse a raw body when a route matches on JSON fields
+    data = None
+    if router.uses_data:
+        data = job['json'] if job.get('json') is not None else request_info.data
+    targets = router.match(job['method'], path, request_info.headers, data)
+    if not targets and router.targets:
+        received_requests.set_forward(request_info, {'status': 'unrouted'})
+    job['targets'] = targets
+    return targets
+
+def drop_stored(record, job, error):
+    """Mark a stored request as not forwarded. Its dedup key is released, so
+    the sender's retry is forwarded rather than taken for a duplicate"""
+    received_requests.set_forward(record, {'status': 'dropped', 'error': error})
+    if job.get('dedup_key') is not None:
+        duplicate_filter.release(job['dedup_key'], record.id)
+
+def rejected_response(rejection):
+    """Response body and headers for a webhook turned away by admission control"""
+    status_code, reason, retry_after = rejection
+    message = "Rate limit exceeded" if reason == 'rate_limited' else "Server overloaded"
+    return {"status": "error", "message": message, "reason": reason}, {'Retry-After': str(retry_after)}
+
+def submit_batched(record, job):
+    """Hand a request to the batch forwarder; returns the response body and status"""
+    received_requests.set_forward(record, {'status': 'queued'})
+    if batch_forwarder.submit(job):
+        return {
+            "status": "accepted",
+            "message": f"{job['method']} request queued for batched delivery",
+            "request_id": record.id
+        }, 202
+    logger.warning("Batch queue full, request stored but not forwarded")
+    drop_stored(record, job, 'Batch queue full')
+    return {
+        "status": "error",
+        "message": "Batch queue full",
+        "request_id": record.id
+    }, 503
+
+def received_response(method, record):
+    """Response body for a request stored without forwarding it"""
+    if record.forward and record.forward['status'] == 'duplicate':
+        return {
+            "status": "success",
+            "message": f"Duplicate of request {record.forward['duplicate_of']}, not forwarded again",
+            "duplicate_of": record.forward['duplicate_of']
+        }
+    return {
+        "status": "success",
+        "message": f"{method} request received"
+    }
+
+def forward_response(method, targets, result):
+    """Response body for a request forwarded before acknowledging it"""
+    if 'status_code' in result:
+        response = {
+            "status": "success",
+            "message": f"{method} request forwarded",
+            "redirect_status": result['status_code']
+        }
+    else:
+        response = {
+            "status": "success",
+            "message": f"{method} request received",
+            "forward_error": result['error']
+        }
+    if len(targets) > 1:
+        response['targets'] = {
+            name: target_result.get('status_code', target_result.get('error'))
+            for name, target_result in result['targets'].items()
+        }
+    if result['status'] == 'retrying':
+        response['retry_scheduled'] = True
+    return response
+
+def elapsed_ms(since, until=None):
+    """Milliseconds between two perf_counter() readings (or since one)"""
+    return round(((until or time.perf_counter()) - since) * 1000, 2)
+
+def finish_streamed_body(request_info, job, body):
+    """Read the rest of a streamed body to disk; later forwards send the file"""
+    body.drain()
+    request_info.body_size = body.size
+    job.pop('body', None)
+    job['body_path'] = body.path
+
+def body_length():
+    """Length of the request body as sent, compressed or not"""
+    compressed = request.environ.get('webhook.compressed_length')
+    return int(compressed) if compressed else request.content_length
+
+@app.before_request
+def reject_large_bodies():
+    """Answer 413 before reading a body declared larger than MAX_CONTENT_LENGTH"""
+    if Config.MAX_CONTENT_LENGTH and (body_length() or 0) > Config.MAX_CONTENT_LENGTH:
+        return jsonify({"status": "error", "message": "Request body too large"}), 413
+
+@app.after_request
+def count_webhooks(response):
+    """Count webhook requests by method and response status for /metrics"""
+    if request.endpoint == 'webhook_handler':
+        metrics.REQUESTS.inc(request.method, str(response.status_code))
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip API and dashboard responses for clients that accept it"""
+    if (not Config.COMPRESS_RESPONSES or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or not compressible(response.mimetype)):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not accepts_gzip(request.headers.get('Accept-Encoding')):
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+    response.set_data(gzip.compress(data, GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
 
 @app.route('/', methods=['GET', 'POST'])
-def webhook_handler():
+def webhook_handler(subpath=''):
     """Handle both GET and POST requests and redirect them"""
+    started = time.perf_counter()
+    rejection = admission.check(
+        request.remote_addr, request.headers, queued_forwards(), upstream_sessions.in_flight
+    )
+    if rejection:
+        body, headers = rejected_response(rejection)
+        return jsonify(body), rejection[0], headers
     # Store request information
-    request_info = {
-        'id': str(len(received_requests) + 1),
-        'method': request.method,
-        'url': request.url,
-        'headers': dict(request.headers),
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'data': None,
-        'query_params': None
-    }
+    headers = dict(request.headers)
+    request_info = RequestRecord(
+        method=request.method,
+        url=request.url,
+        headers=headers,
+        ts=time.time(),
+        size=len(request.url) + sum(len(k) + len(v) for k, v in headers.items())
+    )
     
     try:
+        job = {
+            'record': request_info,
+            'method': request.method,
+            'headers': forward_headers(headers)
+        }
+        
+        streamed = None
+        received_at = started
         if request.method == 'POST':
             logger.info("Received POST request")
-            # Get JSON data if available
-            if request.is_json:
-                data = request.get_json()
-                request_info['data'] = data
-            else:
-                # Handle form data or raw data
-                data = request.get_data(as_text=True)
-                if data:
-                    try:
-                        # Try to parse as JSON
-                        request_info['data'] = json.loads(data)
-                    except:
-                        # If not JSON, store as raw string
-                        request_info['data'] = data
-            
-            # Store request info
-            received_requests.append(request_info)
-            
-            # Forward the request to the redirect URL
-            if REDIRECT_URL:
-                try:
-                    response = requests.post(
-                        REDIRECT_URL,
-                        json=data if request.is_json else None,
-                        data=data if not request.is_json else None,
-                        headers=dict(request.headers)
-                    )
-                    
-                    logger.info(f"Forwarded POST request to {REDIRECT_URL}")
-                    return jsonify({
-                        "status": "success",
-                        "message": "POST request forwarded",
-                        "redirect_status": response.status_code
-                    }), 200
-                except Exception as e:
-                    logger.error(f"Error forwarding request: {str(e)}")
-                    return jsonify({
-                        "status": "success",
-                        "message": "POST request received",
-                        "forward_error": str(e)
-                    }), 200
+            large = is_large_body(body_length(), request.headers.get('Transfer-Encoding'), Config.STREAM_THRESHOLD)
+            reader = request.environ.get('wsgi.input')
+            if not large and isinstance(reader, InflatingReader):
+                # A small compressed body may still inflate to a large one
+                large = reader.exceeds(Config.STREAM_THRESHOLD)
+            if not large:
+                # Read the body before parsing it, so the two are timed apart
+                request.get_data()
+                received_at = time.perf_counter()
+            if large:
+                # Large body: keep a preview and stream the rest upstream
+                streamed = StreamingBody(
+                    request.stream,
+                    request.content_length,
+                    Config.BODY_PREVIEW_BYTES,
+                    body_spill.new_path(),
+                    Config.MAX_CONTENT_LENGTH
+                )
+                request_info.body = streamed.preview
+                request_info.body_path = streamed.path
+                request_info.body_size = request.content_length
+                request_info.size += len(streamed.preview)
+                job['body'] = streamed
+                received_at = time.perf_counter()
             else:
-                # If no redirect URL, just acknowledge receipt
-                return jsonify({
-                    "status": "success",
-                    "message": "POST request received"
-                }), 200
-                
+                # The store keeps the original bytes; they are parsed only for display
+                body = request.get_data()
+                request_info.body = body
+                request_info.size += len(body)
+                if FORWARD_PASSTHROUGH:
+                    job['body'] = body
+                # Get JSON data if available
+                elif request.is_json:
+                    job['json'] = request.get_json()
+                else:
+                    # Handle form data or raw data
+                    job['data'] = request.get_data(as_text=True)
         elif request.method == 'GET':
             logger.info("Received GET request")
             # Get query parameters
             params = request.args.to_dict()
-            request_info['query_params'] = params
-            
-            # Store request info
-            received_requests.append(request_info)
-            
-            # Forward the request to the redirect URL
-            if REDIRECT_URL:
-                try:
-                    response = requests.get(
-                        REDIRECT_URL,
-                        params=params,
-                        headers=dict(request.headers)
-                    )
-                    
-                    logger.info(f"Forwarded GET request to {REDIRECT_URL}")
-                    return jsonify({
-                        "status": "success",
-                        "message": "GET request forwarded",
-                        "redirect_status": response.status_code
-                    }), 200
-                except Exception as e:
-                    logger.error(f"Error forwarding request: {str(e)}")
-                    return jsonify({
-                        "status": "success",
-                        "message": "GET request received",
-                        "forward_error": str(e)
-                    }), 200
-            else:
-                # If no redirect URL, just acknowledge receipt
+            request_info.query_params = params
+            job['params'] = params
+        
+        dedup_key = None
+        if duplicate_filter is not None:
+            body = None if streamed is not None else request.get_data()
+            dedup_key = duplicate_filter.key(request.method, request.url, request.headers, body)
+        
+        parsed_at = time.perf_counter()
+        metrics.PARSE_SECONDS.observe(parsed_at - started)
+        request_info.timings = {
+            'receive': elapsed_ms(started, received_at),
+            'parse': elapsed_ms(received_at, parsed_at)
+        }
+        
+        # Store request info
+        targets = store_and_route(request_info, job, request.path, dedup_key)
+        request_info.timings['store'] = elapsed_ms(parsed_at)
+        
+        # Only a single target forwarded right away can take the body as it
+        # arrives; otherwise it is read to disk first
+        if streamed is not None and (len(targets) != 1 or ASYNC_FORWARDING):
+            finish_streamed_body(request_info, job, streamed)
+        
+        # If there is no target for this request, just acknowledge receipt
+        if not targets:
+            if streamed is not None:
+                # Nothing will send the spilled body; the record keeps its preview
+                body_spill.detach(request_info)
+            request_info.timings['total'] = elapsed_ms(started)
+            return jsonify(received_response(request.method, request_info)), 200
+        
+        # Batched delivery: sent upstream together with other requests
+        if batch_forwarder is not None and streamed is None:
+            request_info.timings['total'] = elapsed_ms(started)
+            body, status_code = submit_batched(request_info, job)
+            return jsonify(body), status_code
+        
+        # Accept-then-forward: hand the request to the forwarder workers
+        if ASYNC_FORWARDING:
+            request_info.timings['total'] = elapsed_ms(started)
+            received_requests.set_forward(request_info, {'status': 'queued'})
+            if forward_queue.submit(job):
                 return jsonify({
-                    "status": "success",
-                    "message": "GET request received"
-                }), 200
+                    "status": "accepted",
+                    "message": f"{request.method} request queued for forwarding",
+                    "request_id": request_info.id
+                }), 202
+            logger.warning("Forward queue full, request stored but not forwarded")
+            drop_stored(request_info, job, 'Forward queue full')
+            return jsonify({
+                "status": "error",
+                "message": "Forward queue full",
+                "request_id": request_info.id
+            }), 503
+        
+        # Forward the request to the redirect URL
+        result = forwarder(job)
+        if streamed is not None:
+            finish_streamed_body(request_info, job, streamed)
+        request_info.timings['total'] = elapsed_ms(started)
+        result = handle_forward_result(job, result)
+        return jsonify(forward_response(request.method, targets, result)), 200
+    
+    except (BodyTooLarge, RequestEntityTooLarge):
+        logger.warning("Request body over MAX_CONTENT_LENGTH rejected")
+        if request_info.id is not None:
+            body_spill.detach(request_info)
+            drop_stored(request_info, job, 'Request body too large')
+        else:
+            body_spill.remove(request_info)
+        return jsonify({
+            "status": "error",
+            "message": "Request body too large"
+        }), 413
+    
+    except InvalidEncoding as e:
+        logger.warning(str(e))
+        if request_info.id is not None:
+            body_spill.detach(request_info)
+            drop_stored(request_info, job, str(e))
+        else:
+            body_spill.remove(request_info)
+        return jsonify({
+            "status": "error",
+            "message": "Request body could not be decompressed"
+        }), 400
                 
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}")
@@ -609,20 +1418,127 @@ def webhook_handler():
             "message": str(e)
         }), 500
 
+ingest_profiler.entry_points.add(webhook_handler.__code__)
+
+# Sub-paths are only captured when a route matches on the path, so other
+# paths (favicon, typos, scanners) still get 404
+if router.uses_path:
+    app.add_url_rule('/<path:subpath>', view_func=webhook_handler, methods=['GET', 'POST'])
+
 @app.route('/dashboard')
 def dashboard():
     """Web interface to view and respond to requests"""
-    return render_template_string(
-        HTML_TEMPLATE,
-        requests=received_requests,
+    with metrics.DASHBOARD_SECONDS.time():
+        page = dashboard_template.render(**dashboard_context())
+    response = Response(page, mimetype='text/html')
+    # Weak: the same page may be sent gzipped
+    response.set_etag(page_etag(page), weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def page_etag(page):
+    """ETag of a rendered page, so an unchanged dashboard is answered with 304"""
+    return hashlib.blake2b(page.encode(), digest_size=16).hexdigest()
+
+def dashboard_context():
+    """Template variables for the dashboard page"""
+    records, next_cursor = received_requests.page(limit=Config.DASHBOARD_PAGE_SIZE)
+    return dict(
+        requests=records,
+        request_items=Markup(''.join(map(dashboard_fragments.get, records))),
+        next_cursor=next_cursor,
+        total_requests=len(received_requests),
         host=HOST,
         port=LISTEN_PORT,
-        redirect_url=REDIRECT_URL,
+        targets=router.targets.values(),
+        circuits=breakers.states() if breakers else {},
         post_count=count_requests_by_method('POST'),
         get_count=count_requests_by_method('GET'),
-        recent_count=count_recent_requests()
+        recent_count=count_recent_requests(),
+        async_forwarding=ASYNC_FORWARDING,
+        forwarder=forward_queue.stats(),
+        dead_letters=dead_letters.list() if dead_letters is not None else None,
+        dead_letter_count=len(dead_letters) if dead_letters is not None else 0,
+        search_enabled=search_index is not None,
+        replay_rate=Config.DEAD_LETTER_REPLAY_RATE
     )
 
+@app.route('/events')
+def events():
+    """Server-Sent Events stream of newly stored requests"""
+    subscriber = event_broker.subscribe()
+    return Response(
+        event_broker.stream(subscriber),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def parse_time_arg(value):
+    """Parse an epoch-seconds or 'YYYY-MM-DD HH:MM:SS' query argument"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').timestamp()
+
+@app.route('/api/requests', methods=['GET'])
+def list_requests():
+    """Newest-first page of request summaries with cursor pagination"""
+    try:
+        limit = min(int(request.args.get('limit', Config.DASHBOARD_PAGE_SIZE)), MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        method = request.args.get('method')
+        records, next_cursor = received_requests.page(
+            before=int(cursor) if cursor else None,
+            limit=max(limit, 1),
+            method=method.upper() if method else None,
+            since=parse_time_arg(request.args.get('since')),
+            until=parse_time_arg(request.args.get('until'))
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    
+    return jsonify({
+        "requests": [record.summary() for record in records],
+        "next_cursor": next_cursor,
+        "total_requests": len(received_requests)
+    })
+
+@app.route('/api/search', methods=['GET'])
+def search_requests():
+    """Newest-first summaries of the requests matching a search query"""
+    if search_index is None:
+        return jsonify({"status": "error", "message": "Search is disabled"}), 404
+    try:
+        limit = min(int(request.args.get('limit', Config.DASHBOARD_PAGE_SIZE)), MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        ids, next_cursor = search_index.search(
+            request.args.get('q', ''),
+            before=int(cursor) if cursor else None,
+            limit=max(limit, 1)
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    
+    return jsonify({
+        "requests": search_results(ids),
+        "next_cursor": next_cursor
+    })
+
+def search_results(ids):
+    """Summaries of the matched requests still in the store"""
+    records = (received_requests.get(request_id) for request_id in ids)
+    return [record.summary() for record in records if record is not None]
+
+@app.route('/api/requests/<request_id>', methods=['GET'])
+def get_request(request_id):
+    """Full details of a single captured request"""
+    record = received_requests.get(request_id)
+    if record is None:
+        return jsonify({"status": "error", "message": "Request not found"}), 404
+    return jsonify(record.to_dict())
+
 @app.route('/respond/<request_id>', methods=['POST'])
 def respond_to_request(request_id):
     """Send a custom response to a specific request"""
@@ -638,13 +1554,7 @@ def respond_to_request(request_id):
             response_data = response_text
         
         # Find the request
-        request_found = False
-        for req in received_requests:
-            if req['id'] == request_id:
-                request_found = True
-                break
-        
-        if request_found:
+        if received_requests.get(request_id) is not None:
             return jsonify(response_data), status_code
         else:
             return jsonify({"status": "error", "message": "Request not found"}), 404
@@ -652,32 +1562,139 @@ def respond_to_request(request_id):
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/api/dead-letters', methods=['GET'])
+def list_dead_letters():
+    """Newest forwards that ran out of retry attempts"""
+    if dead_letters is None:
+        return jsonify({"status": "error", "message": "Retries are disabled"}), 404
+    try:
+        limit = min(int(request.args.get('limit', 20)), MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({
+        "dead_letters": dead_letters.list(max(limit, 0)),
+        "total": len(dead_letters),
+        "replay": dead_letter_replayer.stats()
+    })
+
+@app.route('/dead-letters/replay', methods=['POST'])
+def replay_dead_letters():
+    """Resubmit dead letters in the background at a controlled rate"""
+    if dead_letters is None:
+        return jsonify({"status": "error", "message": "Retries are disabled"}), 404
+    options = request.get_json(silent=True) or {}
+    try:
+        rate = float(options.get('rate', Config.DEAD_LETTER_REPLAY_RATE))
+        limit = int(options['limit']) if options.get('limit') else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if rate <= 0:
+        return jsonify({"status": "error", "message": "rate must be positive"}), 400
+    count = dead_letter_replayer.start(rate, limit)
+    if count is None:
+        return jsonify({"status": "error", "message": "A replay is already running"}), 409
+    return jsonify({
+        "status": "success",
+        "message": f"Replaying {count} dead letters at {rate}/s"
+    })
+
+def profile_options(options):
+    """seconds, sampling interval and report size from a /admin/profile body"""
+    seconds = float(options.get('seconds', 10))
+    interval = float(options.get('interval_ms', 5)) / 1000
+    top = int(options.get('top', 25))
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise ValueError(f"seconds must be between 0 and {MAX_PROFILE_SECONDS}")
+    if interval <= 0 or top <= 0:
+        raise ValueError("interval_ms and top must be positive")
+    return seconds, interval, top
+
+@app.route('/admin/profile', methods=['POST'])
+def profile_ingest():
+    """Sample the ingest path for a few seconds and report the hot functions"""
+    try:
+        seconds, interval, top = profile_options(request.get_json(silent=True) or {})
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if not ingest_profiler.start(seconds, interval):
+        return jsonify({"status": "error", "message": "A profile is already running"}), 409
+    ingest_profiler.join()
+    return jsonify(ingest_profiler.report(top))
+
 @app.route('/clear-requests', methods=['POST'])
 def clear_requests():
     """Clear all stored requests"""
-    global received_requests
-    received_requests = []
+    received_requests.clear()
     return jsonify({"status": "success", "message": "All requests cleared"})
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics of this process"""
+    return Response(metrics.registry.exposition(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for Dokploy"""
-    return jsonify({
+    return jsonify(health_info()), 200
+
+def health_info():
+    """Status and counters reported by /health"""
+    return {
         "status": "healthy",
         "redirect_url": REDIRECT_URL,
+        "targets": {name: target.url for name, target in router.targets.items()},
         "listen_port": LISTEN_PORT,
         "total_requests": len(received_requests),
+        "store": received_requests.stats(),
+        "stats": received_requests.counters.snapshot(),
+        "server": Config.SERVER_MODE,
+        # Under the pre-fork launcher, the forwarder, upstream, events, journal
+        # and retries sections are counters of this worker only
+        "worker": prefork.worker_index,
+        "async_forwarding": ASYNC_FORWARDING,
+        "forwarder": forward_queue.stats(),
+        "upstream": upstream_sessions.stats(),
+        "events": event_broker.stats(),
+        "journal": journal.stats() if journal else None,
+        "search": search_index.stats() if search_index else None,
+        "dashboard": dashboard_fragments.stats(),
+        "retries": retry_scheduler.stats() if retry_scheduler else None,
+        "dead_letters": len(dead_letters) if dead_letters is not None else None,
+        "dedup": duplicate_filter.stats() if duplicate_filter else None,
+        "admission": admission.stats(),
+        "circuits": breakers.stats() if breakers else None,
+        "batching": batch_forwarder.stats() if batch_forwarder else None,
         "timestamp": datetime.now().isoformat()
-    }), 200
+    }
 
 def main():
     """Main function to run the webhook"""
     logger.info(f"Starting webhook listener on {HOST}:{LISTEN_PORT}")
-    logger.info(f"Redirecting requests to {REDIRECT_URL}")
+    for name, target in router.targets.items():
+        logger.info(f"Redirecting requests to {target.url} ({name})")
     logger.info(f"Dashboard available at http://{HOST}:{LISTEN_PORT}/dashboard")
     
-    # For Dokploy, we need to ensure we bind to all interfaces
-    app.run(host='0.0.0.0', port=LISTEN_PORT, debug=Config.DEBUG)
+    if Config.WORKERS != 1 and hasattr(os, 'fork'):
+        # Workers must import the app after the fork, so hand over to a
+        # fresh interpreter running the pre-fork launcher
+        os.execv(sys.executable, [sys.executable, prefork.__file__])
+    elif Config.WORKERS != 1:
+        logger.warning("WORKERS is ignored on platforms without fork()")
+    
+    # async_app imports this module as `app`; reuse it when run as a script
+    sys.modules.setdefault('app', sys.modules[__name__])
+    serve()
+
+def serve(sock=None):
+    """Serve the app, on an inherited listening socket in pre-fork workers"""
+    if Config.SERVER_MODE == 'asyncio':
+        import async_app
+        async_app.run(LISTEN_PORT, sock)
+    elif sock is not None:
+        make_server('0.0.0.0', LISTEN_PORT, app, threaded=True, fd=sock.fileno()).serve_forever()
+    else:
+        # For Dokploy, we need to ensure we bind to all interfaces
+        app.run(host='0.0.0.0', port=LISTEN_PORT, debug=Config.DEBUG)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,768 @@
+"""
+Native asyncio server mode (SERVER_MODE=asyncio).
+
+Serves the same endpoints as the Flask app on an aiohttp event loop and
+forwards over non-blocking aiohttp client sessions, so thousands of webhooks
+can wait on slow upstreams at once without a thread each. The store, router,
+retries and dashboard template are shared with app.py.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+from jinja2 import Environment
+
+import app as webhook
+import metrics
+from config import Config
+from breaker import open_circuit_result
+from compression import (
+    ENCODINGS, MIN_COMPRESS_BYTES, Inflater, InvalidEncoding, accepts_gzip, compressible, gzip_job_body
+)
+from forwarder import combine_results, forward_headers
+from store import RequestRecord
+from streaming import CHUNK_SIZE, BodyTooLarge, is_large_body
+
+logger = logging.getLogger(__name__)
+
+dashboard_template = Environment(autoescape=True).from_string(webhook.HTML_TEMPLATE)
+
+# Spill file I/O runs here, off the event loop and away from the default
+# executor that aiohttp also uses for DNS lookups
+spill_io = ThreadPoolExecutor(max_workers=4, thread_name_prefix='spill-io')
+
+# SQLite store queries and dead-letter writes (JSONL file or SQLite table)
+# run here, so they don't stall every other request on the loop
+store_io = ThreadPoolExecutor(max_workers=4, thread_name_prefix='store-io')
+
+# Whether recording a forward result may block: the SQLite store writes it,
+# and a result out of retries is written to the dead-letter queue
+BLOCKING_RESULTS = Config.STORE_BACKEND == 'sqlite' or Config.RETRY_ENABLED
+
+
+async def run_blocking(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(store_io, function, *args)
+
+
+async def handle_forward_result(job, result):
+    if BLOCKING_RESULTS:
+        return await run_blocking(webhook.handle_forward_result, job, result)
+    return webhook.handle_forward_result(job, result)
+
+
+class AsyncUpstreamSessions:
+    """aiohttp ClientSession per upstream target, created on the event loop"""
+
+    def __init__(self, limit, connect_timeout, read_timeout):
+        self.limit = limit
+        self.timeout = (connect_timeout, read_timeout)
+        self._sessions = {}
+        self.requests = 0
+        self.in_flight = 0
+
+    def session_for(self, target):
+        session = self._sessions.get(target.name)
+        if session is None:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=target.pool_size or self.limit),
+                timeout=self.timeout_for(target)
+            )
+            self._sessions[target.name] = session
+        return session
+
+    def timeout_for(self, target):
+        timeout = target.timeout or self.timeout
+        if isinstance(timeout, (tuple, list)):
+            return aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        return aiohttp.ClientTimeout(total=timeout)
+
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+    def stats(self):
+        return {
+            'targets': len(self._sessions),
+            'limit': self.limit,
+            'requests': self.requests,
+            'in_flight': self.in_flight
+        }
+
+
+async def read_spilled(path):
+    """Yield a spilled body from disk chunk by chunk without blocking the loop"""
+    loop = asyncio.get_running_loop()
+    f = await loop.run_in_executor(spill_io, open, path, 'rb')
+    try:
+        while True:
+            chunk = await loop.run_in_executor(spill_io, f.read, CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        await loop.run_in_executor(spill_io, f.close)
+
+
+async def forward_request(job, target, sessions):
+    """Send a captured request to one upstream target and return a result dict"""
+    headers = job['headers']
+    sessions.in_flight += 1
+    started = time.perf_counter()
+    try:
+        session = sessions.session_for(target)
+        body = job.get('body')
+        compressed = gzip_job_body(job) if target.compress else None
+        if compressed is not None:
+            # Buffered body sent gzipped, Content-Encoding set in its headers
+            request = session.post(target.url, data=compressed[0], headers=compressed[1])
+        elif isinstance(body, AsyncStreamingBody):
+            request = session.post(target.url, data=body.chunks(), headers=body.headers_for(headers))
+        elif body is not None:
+            request = session.post(target.url, data=body, headers=headers)
+        elif job.get('body_path'):
+            # Large body spilled to disk, sent from the file in chunks
+            size = os.path.getsize(job['body_path'])
+            request = session.post(
+                target.url,
+                data=read_spilled(job['body_path']),
+                headers=dict(headers, **{'Content-Length': str(size)})
+            )
+        elif job['method'] == 'POST':
+            if job.get('json') is not None:
+                request = session.post(target.url, json=job['json'], headers=headers)
+            else:
+                request = session.post(target.url, data=job.get('data'), headers=headers)
+        else:
+            request = session.get(target.url, params=job.get('params'), headers=headers)
+        async with request as response:
+            content = await response.read()
+        sessions.requests += 1
+        logger.info(f"Forwarded {job['method']} request to {target.url}")
+        result = {
+            'status': 'forwarded',
+            'status_code': response.status,
+            'response_bytes': len(content),
+            'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        logger.error(f"Error forwarding request to {target.name}: {error}")
+        result = {
+            'status': 'error',
+            'error': error,
+            'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+    finally:
+        sessions.in_flight -= 1
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    metrics.observe_forward(target.name, started, result)
+    return result
+
+
+async def forward(job, sessions):
+    """Forward a job to all of its targets concurrently; open circuits fail fast"""
+    targets = [webhook.router.targets[name] for name in job['targets'] if name in webhook.router.targets]
+    breakers = webhook.breakers
+    results = {}
+    if breakers is not None:
+        for target in targets:
+            if not breakers.allow(target.name):
+                results[target.name] = open_circuit_result(target.name)
+        targets = [target for target in targets if target.name not in results]
+    for target, result in zip(targets, await asyncio.gather(
+            *(forward_request(job, target, sessions) for target in targets))):
+        if breakers is not None:
+            breakers.record(target.name, result)
+        results[target.name] = result
+    return combine_results(results)
+
+
+async def forward_in_background(job, sessions):
+    await handle_forward_result(job, await forward(job, sessions))
+
+
+class AsyncStreamingBody:
+    """asyncio counterpart of streaming.StreamingBody.
+
+    Reads a large body from the aiohttp request as it arrives, keeping a
+    preview in memory and writing every chunk to the spill file on the
+    spill-io executor. chunks() feeds the body to the upstream request while
+    it is still arriving; drain() reads whatever was not sent.
+    """
+
+    def __init__(self, content, length, path, max_bytes=0):
+        self.content = content
+        self.length = length
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.exceeded = False
+        self.preview = b''
+        self._file = None
+        self._done = False
+        self._sent_preview = False
+
+    async def _read(self, size=CHUNK_SIZE):
+        if self._done:
+            return b''
+        loop = asyncio.get_running_loop()
+        if self._file is None:
+            self._file = await loop.run_in_executor(spill_io, open, self.path, 'wb')
+        chunk = await self.content.read(size)
+        if not chunk:
+            await self._close()
+            return b''
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.exceeded = True
+            await self._close()
+            raise BodyTooLarge(f"Request body exceeds {self.max_bytes} bytes")
+        await loop.run_in_executor(spill_io, self._file.write, chunk)
+        return chunk
+
+    async def _close(self):
+        self._done = True
+        await asyncio.get_running_loop().run_in_executor(spill_io, self._file.close)
+
+    async def read_preview(self, preview_bytes):
+        while len(self.preview) < preview_bytes:
+            chunk = await self._read(preview_bytes - len(self.preview))
+            if not chunk:
+                break
+            self.preview += chunk
+
+    def headers_for(self, headers):
+        # Keep Content-Length when it is known so the upstream isn't sent chunked
+        if self.length is None:
+            return headers
+        return dict(headers, **{'Content-Length': str(self.length)})
+
+    async def chunks(self):
+        if not self._sent_preview:
+            self._sent_preview = True
+            if self.preview:
+                yield self.preview
+        while True:
+            chunk = await self._read()
+            if not chunk:
+                return
+            yield chunk
+
+    async def drain(self):
+        """Read the rest of the body into the spill file"""
+        if self.exceeded:
+            raise BodyTooLarge(f"Request body exceeds {self.max_bytes} bytes")
+        self._sent_preview = True
+        while await self._read():
+            pass
+
+
+class AsyncInflatingContent:
+    """request.content of a gzip / deflate body, read inflated"""
+
+    def __init__(self, content, inflater):
+        self.content = content
+        self.inflater = inflater
+        self._buffer = b''
+        self._eof = False
+
+    async def read(self, size=-1):
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            await self._fill()
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    async def exceeds(self, size):
+        """Whether the body inflates to more than size bytes (never, with
+        size 0); inflates at most one chunk beyond it to find out"""
+        while size and not self._eof and len(self._buffer) <= size:
+            await self._fill()
+        return bool(size) and len(self._buffer) > size
+
+    async def _fill(self):
+        data = await self.content.read(CHUNK_SIZE)
+        if data:
+            self._buffer += self.inflater.feed(data)
+        else:
+            self._buffer += self.inflater.finish()
+            self._eof = True
+
+
+async def finish_streamed_body(request_info, job, body):
+    """Read the rest of a streamed body to disk; later forwards send the file"""
+    await body.drain()
+    request_info.body_size = body.size
+    job.pop('body', None)
+    job['body_path'] = body.path
+
+
+async def webhook_handler(request):
+    """Handle both GET and POST requests and redirect them"""
+    started = time.perf_counter()
+    sessions = request.app['sessions']
+    rejection = webhook.admission.check(
+        request.remote,
+        request.headers,
+        # Accept-then-forward runs on the loop; retries still use the queue
+        max(len(request.app['forward_tasks']), webhook.queued_forwards()),
+        sessions.in_flight + webhook.upstream_sessions.in_flight
+    )
+    if rejection:
+        body, headers = webhook.rejected_response(rejection)
+        return web.json_response(body, status=rejection[0], headers=headers)
+    headers = dict(request.headers)
+    encoding = request.headers.get('Content-Encoding', '').strip().lower()
+    if encoding in ENCODINGS:
+        # The body is captured and forwarded inflated, as by the Flask app
+        headers = {
+            name: value for name, value in headers.items()
+            if name.lower() not in ('content-encoding', 'content-length')
+        }
+    url = str(request.url)
+    request_info = RequestRecord(
+        method=request.method,
+        url=url,
+        headers=headers,
+        ts=time.time(),
+        size=len(url) + sum(len(k) + len(v) for k, v in headers.items())
+    )
+
+    try:
+        job = {
+            'record': request_info,
+            'method': request.method,
+            'headers': forward_headers(headers)
+        }
+
+        if Config.MAX_CONTENT_LENGTH and (request.content_length or 0) > Config.MAX_CONTENT_LENGTH:
+            raise BodyTooLarge(f"Request body exceeds {Config.MAX_CONTENT_LENGTH} bytes")
+
+        streamed = None
+        received_at = started
+
+        content, length = request.content, request.content_length
+        large = is_large_body(length, request.headers.get('Transfer-Encoding'), Config.STREAM_THRESHOLD)
+        if request.method == 'POST' and encoding in ENCODINGS:
+            content = AsyncInflatingContent(
+                content, Inflater(encoding, Config.DECOMPRESS_MAX_RATIO, Config.MAX_CONTENT_LENGTH)
+            )
+            length = None
+            # A small compressed body may still inflate to a large one
+            large = large or await content.exceeds(Config.STREAM_THRESHOLD)
+
+        if request.method == 'POST' and large:
+            logger.info("Received POST request")
+            # Large body: keep a preview and stream the rest upstream
+            streamed = AsyncStreamingBody(
+                content,
+                length,
+                webhook.body_spill.new_path(),
+                Config.MAX_CONTENT_LENGTH
+            )
+            await streamed.read_preview(Config.BODY_PREVIEW_BYTES)
+            request_info.body = streamed.preview
+            request_info.body_path = streamed.path
+            request_info.body_size = length
+            request_info.size += len(streamed.preview)
+            job['body'] = streamed
+            received_at = time.perf_counter()
+        elif request.method == 'POST':
+            logger.info("Received POST request")
+            # Inflated as it is read, within the streaming threshold
+            body = await content.read() if encoding in ENCODINGS else await request.read()
+            received_at = time.perf_counter()
+            # The store keeps the original bytes; they are parsed only for display
+            request_info.body = body
+            request_info.size += len(body)
+            content_type = request.content_type
+            if webhook.FORWARD_PASSTHROUGH:
+                job['body'] = body
+            elif content_type == 'application/json' or (
+                    content_type.startswith('application/') and content_type.endswith('+json')):
+                job['json'] = json.loads(body) if body else None
+            else:
+                # Handle form data or raw data
+                job['data'] = body.decode(request.charset or 'utf-8', 'replace')
+        else:
+            logger.info("Received GET request")
+            params = dict(request.query)
+            request_info.query_params = params
+            job['params'] = params
+
+        dedup_key = None
+        if webhook.duplicate_filter is not None:
+            # The body as decoded; a GET has none
+            if streamed is not None:
+                body = None
+            elif request.method != 'POST':
+                body = b''
+            dedup_key = webhook.duplicate_filter.key(request.method, url, request.headers, body)
+
+        parsed_at = time.perf_counter()
+        metrics.PARSE_SECONDS.observe(parsed_at - started)
+        request_info.timings = {
+            'receive': webhook.elapsed_ms(started, received_at),
+            'parse': webhook.elapsed_ms(received_at, parsed_at)
+        }
+        targets = webhook.store_and_route(request_info, job, request.path, dedup_key)
+        request_info.timings['store'] = webhook.elapsed_ms(parsed_at)
+
+        # Only a single target forwarded right away can take the body as it
+        # arrives; otherwise it is read to disk first
+        if streamed is not None and (len(targets) != 1 or webhook.ASYNC_FORWARDING):
+            await finish_streamed_body(request_info, job, streamed)
+
+        # If there is no target for this request, just acknowledge receipt
+        if not targets:
+            if streamed is not None:
+                # Nothing will send the spilled body; the record keeps its preview
+                webhook.body_spill.detach(request_info)
+            request_info.timings['total'] = webhook.elapsed_ms(started)
+            return web.json_response(webhook.received_response(request.method, request_info))
+
+        # Batched delivery: sent upstream together with other requests
+        if webhook.batch_forwarder is not None and streamed is None:
+            request_info.timings['total'] = webhook.elapsed_ms(started)
+            body, status = webhook.submit_batched(request_info, job)
+            return web.json_response(body, status=status)
+
+        # Accept-then-forward: forward on the event loop after replying
+        if webhook.ASYNC_FORWARDING:
+            request_info.timings['total'] = webhook.elapsed_ms(started)
+            tasks = request.app['forward_tasks']
+            if len(tasks) >= Config.FORWARD_QUEUE_SIZE:
+                logger.warning("Forward queue full, request stored but not forwarded")
+                webhook.drop_stored(request_info, job, 'Forward queue full')
+                return web.json_response({
+                    "status": "error",
+                    "message": "Forward queue full",
+                    "request_id": request_info.id
+                }, status=503)
+            webhook.received_requests.set_forward(request_info, {'status': 'queued'})
+            task = asyncio.ensure_future(forward_in_background(job, sessions))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            return web.json_response({
+                "status": "accepted",
+                "message": f"{request.method} request queued for forwarding",
+                "request_id": request_info.id
+            }, status=202)
+
+        result = await forward(job, sessions)
+        if streamed is not None:
+            await finish_streamed_body(request_info, job, streamed)
+        request_info.timings['total'] = webhook.elapsed_ms(started)
+        result = await handle_forward_result(job, result)
+        return web.json_response(webhook.forward_response(request.method, targets, result))
+
+    except BodyTooLarge:
+        logger.warning("Request body over MAX_CONTENT_LENGTH rejected")
+        if request_info.id is not None:
+            webhook.body_spill.detach(request_info)
+            webhook.drop_stored(request_info, job, 'Request body too large')
+        else:
+            webhook.body_spill.remove(request_info)
+        return web.json_response({
+            "status": "error",
+            "message": "Request body too large"
+        }, status=413)
+
+    except InvalidEncoding as e:
+        logger.warning(str(e))
+        if request_info.id is not None:
+            webhook.body_spill.detach(request_info)
+            webhook.drop_stored(request_info, job, str(e))
+        else:
+            webhook.body_spill.remove(request_info)
+        return web.json_response({
+            "status": "error",
+            "message": "Request body could not be decompressed"
+        }, status=400)
+
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}")
+        return web.json_response({
+            "status": "error",
+            "message": str(e)
+        }, status=500)
+
+
+async def dashboard(request):
+    """Web interface to view and respond to requests"""
+    with metrics.DASHBOARD_SECONDS.time():
+        text = dashboard_template.render(**await run_blocking(webhook.dashboard_context))
+    etag = webhook.page_etag(text)
+    # Weak: the same page may be sent gzipped
+    headers = {'ETag': f'W/"{etag}"', 'Cache-Control': 'no-cache'}
+    if any(tag.value in (etag, '*') for tag in request.if_none_match or ()):
+        return web.Response(status=304, headers=headers)
+    return web.Response(text=text, content_type='text/html', headers=headers)
+
+
+async def metrics_endpoint(request):
+    """Prometheus metrics of this process"""
+    return web.Response(
+        body=metrics.registry.exposition().encode(),
+        headers={'Content-Type': metrics.CONTENT_TYPE}
+    )
+
+
+async def events(request):
+    """Server-Sent Events stream of newly stored requests"""
+    broker = webhook.event_broker
+    subscriber = broker.subscribe_async(asyncio.get_running_loop())
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    try:
+        await response.prepare(request)
+        await response.write(b"retry: 3000\n\n")
+        while True:
+            try:
+                message = await asyncio.wait_for(subscriber.get(), broker.keepalive_seconds)
+            except asyncio.TimeoutError:
+                message = ": keepalive\n\n"
+            await response.write(message.encode())
+    except ConnectionResetError:
+        pass
+    finally:
+        broker.unsubscribe(subscriber)
+    return response
+
+
+async def list_requests(request):
+    """Newest-first page of request summaries with cursor pagination"""
+    args = request.query
+    try:
+        limit = min(int(args.get('limit', Config.DASHBOARD_PAGE_SIZE)), webhook.MAX_PAGE_SIZE)
+        cursor = args.get('cursor')
+        method = args.get('method')
+        page = functools.partial(
+            webhook.received_requests.page,
+            before=int(cursor) if cursor else None,
+            limit=max(limit, 1),
+            method=method.upper() if method else None,
+            since=webhook.parse_time_arg(args.get('since')),
+            until=webhook.parse_time_arg(args.get('until'))
+        )
+    except ValueError as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=400)
+
+    records, next_cursor = await run_blocking(page)
+    return web.json_response({
+        "requests": [record.summary() for record in records],
+        "next_cursor": next_cursor,
+        "total_requests": await run_blocking(len, webhook.received_requests)
+    })
+
+
+async def search_requests(request):
+    """Newest-first summaries of the requests matching a search query"""
+    if webhook.search_index is None:
+        return web.json_response({"status": "error", "message": "Search is disabled"}, status=404)
+    args = request.query
+    try:
+        limit = min(int(args.get('limit', Config.DASHBOARD_PAGE_SIZE)), webhook.MAX_PAGE_SIZE)
+        cursor = args.get('cursor')
+        ids, next_cursor = webhook.search_index.search(
+            args.get('q', ''),
+            before=int(cursor) if cursor else None,
+            limit=max(limit, 1)
+        )
+    except ValueError as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=400)
+
+    return web.json_response({
+        "requests": await run_blocking(webhook.search_results, ids),
+        "next_cursor": next_cursor
+    })
+
+
+async def get_request(request):
+    """Full details of a single captured request"""
+    record = await run_blocking(webhook.received_requests.get, request.match_info['request_id'])
+    if record is None:
+        return web.json_response({"status": "error", "message": "Request not found"}, status=404)
+    return web.json_response(record.to_dict())
+
+
+async def respond_to_request(request):
+    """Send a custom response to a specific request"""
+    try:
+        data = await request.json()
+        response_text = data.get('response', '{}')
+        status_code = data.get('status_code', 200)
+
+        try:
+            response_data = json.loads(response_text)
+        except (TypeError, ValueError):
+            response_data = response_text
+
+        if await run_blocking(webhook.received_requests.get, request.match_info['request_id']) is not None:
+            return web.json_response(response_data, status=status_code)
+        return web.json_response({"status": "error", "message": "Request not found"}, status=404)
+
+    except Exception as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=500)
+
+
+async def list_dead_letters(request):
+    """Newest forwards that ran out of retry attempts"""
+    if webhook.dead_letters is None:
+        return web.json_response({"status": "error", "message": "Retries are disabled"}, status=404)
+    try:
+        limit = min(int(request.query.get('limit', 20)), webhook.MAX_PAGE_SIZE)
+    except ValueError as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=400)
+    return web.json_response({
+        "dead_letters": await run_blocking(webhook.dead_letters.list, max(limit, 0)),
+        "total": await run_blocking(len, webhook.dead_letters),
+        "replay": webhook.dead_letter_replayer.stats()
+    })
+
+
+async def replay_dead_letters(request):
+    """Resubmit dead letters in the background at a controlled rate"""
+    if webhook.dead_letters is None:
+        return web.json_response({"status": "error", "message": "Retries are disabled"}, status=404)
+    try:
+        options = await request.json()
+    except ValueError:
+        options = None
+    options = options or {}
+    try:
+        rate = float(options.get('rate', Config.DEAD_LETTER_REPLAY_RATE))
+        limit = int(options['limit']) if options.get('limit') else None
+    except (TypeError, ValueError) as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=400)
+    if rate <= 0:
+        return web.json_response({"status": "error", "message": "rate must be positive"}, status=400)
+    # Takes the entries off the dead-letter queue, rewriting it
+    count = await run_blocking(webhook.dead_letter_replayer.start, rate, limit)
+    if count is None:
+        return web.json_response({"status": "error", "message": "A replay is already running"}, status=409)
+    return web.json_response({
+        "status": "success",
+        "message": f"Replaying {count} dead letters at {rate}/s"
+    })
+
+
+async def profile_ingest(request):
+    """Sample the ingest path for a few seconds and report the hot functions"""
+    try:
+        options = await request.json()
+    except ValueError:
+        options = None
+    try:
+        seconds, interval, top = webhook.profile_options(options or {})
+    except (TypeError, ValueError) as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=400)
+    profiler = webhook.ingest_profiler
+    if not profiler.start(seconds, interval):
+        return web.json_response({"status": "error", "message": "A profile is already running"}, status=409)
+    while profiler.running:
+        await asyncio.sleep(0.1)
+    return web.json_response(profiler.report(top))
+
+
+async def clear_requests(request):
+    """Clear all stored requests"""
+    await run_blocking(webhook.received_requests.clear)
+    return web.json_response({"status": "success", "message": "All requests cleared"})
+
+
+async def health_check(request):
+    """Health check endpoint for Dokploy"""
+    info = await run_blocking(webhook.health_info)
+    info['async_upstream'] = request.app['sessions'].stats()
+    info['async_in_flight'] = len(request.app['forward_tasks'])
+    return web.json_response(info)
+
+
+async def close_sessions(application):
+    # Let accept-then-forward requests finish before closing their sessions
+    if application['forward_tasks']:
+        await asyncio.wait(list(application['forward_tasks']), timeout=Config.UPSTREAM_READ_TIMEOUT)
+    await application['sessions'].close()
+
+
+@web.middleware
+async def count_webhooks(request, handler):
+    """Count webhook requests by method and response status for /metrics"""
+    response = await handler(request)
+    if request.match_info.handler is webhook_handler:
+        metrics.REQUESTS.inc(request.method, str(response.status))
+    return response
+
+
+@web.middleware
+async def compress_responses(request, handler):
+    """gzip API and dashboard responses for clients that accept it"""
+    response = await handler(request)
+    if (not Config.COMPRESS_RESPONSES or not isinstance(response, web.Response) or response.body is None
+            or 'Content-Encoding' in response.headers or not compressible(response.content_type)):
+        return response
+    response.headers['Vary'] = 'Accept-Encoding'
+    if accepts_gzip(request.headers.get('Accept-Encoding')) and len(response.body) >= MIN_COMPRESS_BYTES:
+        response.enable_compression(web.ContentCoding.gzip)
+    return response
+
+
+webhook.ingest_profiler.entry_points.add(webhook_handler.__code__)
+
+
+def create_app():
+    """aiohttp application serving the webhook endpoints"""
+    application = web.Application(
+        client_max_size=Config.MAX_CONTENT_LENGTH,
+        middlewares=[count_webhooks, compress_responses]
+    )
+    application['sessions'] = AsyncUpstreamSessions(
+        Config.ASYNC_UPSTREAM_LIMIT,
+        Config.UPSTREAM_CONNECT_TIMEOUT,
+        Config.UPSTREAM_READ_TIMEOUT
+    )
+    application['forward_tasks'] = set()
+    application.on_cleanup.append(close_sessions)
+    # Registered before the catch-all webhook route, which is matched last
+    application.router.add_get('/dashboard', dashboard)
+    application.router.add_get('/events', events)
+    application.router.add_get('/api/requests', list_requests)
+    application.router.add_get('/api/requests/{request_id}', get_request)
+    application.router.add_get('/api/search', search_requests)
+    application.router.add_post('/respond/{request_id}', respond_to_request)
+    application.router.add_get('/api/dead-letters', list_dead_letters)
+    application.router.add_post('/dead-letters/replay', replay_dead_letters)
+    application.router.add_post('/admin/profile', profile_ingest)
+    application.router.add_post('/clear-requests', clear_requests)
+    application.router.add_get('/health', health_check)
+    application.router.add_get('/metrics', metrics_endpoint)
+    application.router.add_get('/', webhook_handler)
+    application.router.add_post('/', webhook_handler)
+    if webhook.router.uses_path:
+        # Sub-paths only when a route matches on the path; others stay 404
+        application.router.add_get('/{tail:.*}', webhook_handler)
+        application.router.add_post('/{tail:.*}', webhook_handler)
+    return application
+
+
+def run(port, sock=None):
+    """Serve the webhook on the asyncio event loop"""
+    logger.info("Using the asyncio server")
+    if sock is not None:
+        web.run_app(create_app(), sock=sock, access_log=None, print=None, auto_decompress=False)
+    else:
+        web.run_app(create_app(), host='0.0.0.0', port=port, access_log=None, print=None, auto_decompress=False)
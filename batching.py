@@ -0,0 +1,203 @@
+import gzip
+import itertools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import metrics
+from breaker import open_circuit_result
+from compression import GZIP_LEVEL, MIN_COMPRESS_BYTES
+from forwarder import combine_results
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json'
+}
+
+
+def batch_entry(job):
+    """JSON-serializable form of a captured request inside a batch"""
+    record = job['record']
+    entry = {
+        'id': job.get('request_id'),
+        'method': job['method'],
+        'url': record.url,
+        'ts': record.ts,
+        'headers': job['headers']
+    }
+    if job.get('json') is not None:
+        entry['json'] = job['json']
+    elif job.get('data') is not None:
+        entry['body'] = job['data']
+    elif job.get('body') is not None:
+        # Passthrough bytes: as JSON when they parse, else as text
+        data = record.data
+        entry['json' if isinstance(data, (dict, list)) else 'body'] = data
+    elif job.get('params') is not None:
+        entry['params'] = job['params']
+    return entry
+
+
+class _Batch:
+    __slots__ = ('jobs', 'lines', 'bytes', 'deadline')
+
+    def __init__(self, deadline):
+        self.jobs = []
+        self.lines = []
+        self.bytes = 0
+        self.deadline = deadline
+
+
+class BatchForwarder:
+    """Coalesces forwards per target into one NDJSON or JSON-array POST.
+
+    A target's batch is flushed once it holds max_size requests or
+    max_bytes of encoded requests, or max_delay seconds after its first
+    request arrived, whichever comes first. Flushes run on a small pool of
+    threads, so submitting never waits on an upstream, and at most
+    max_pending requests can be waiting or in flight at once. Each request
+    gets its own result, naming the batch that delivered it.
+    """
+
+    def __init__(self, router, sessions, max_size, max_bytes, max_delay, fmt, workers,
+                 max_pending, on_result, breakers=None):
+        self.router = router
+        self.sessions = sessions
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.format = fmt
+        self.max_pending = max_pending
+        self.on_result = on_result
+        self.breakers = breakers
+        self.pending = 0
+        self.batches = 0
+        self.delivered = 0
+        self._buffers = {}
+        self._ids = itertools.count(1)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-flush')
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, job):
+        """Add a job to the batch of each of its targets; False when too many are pending"""
+        line = json.dumps(batch_entry(job), default=str).encode()
+        full = []
+        with self._cond:
+            if self.pending + len(job['targets']) > self.max_pending:
+                return False
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='batch-deadlines', daemon=True)
+                self._thread.start()
+            for name in job['targets']:
+                batch = self._buffers.get(name)
+                if batch is None:
+                    batch = self._buffers[name] = _Batch(time.monotonic() + self.max_delay)
+                    self._cond.notify()
+                # One job per target, so each target's result is handled and retried on its own
+                batch.jobs.append(dict(job, targets=[name]))
+                batch.lines.append(line)
+                batch.bytes += len(line) + 1
+                self.pending += 1
+                if len(batch.jobs) >= self.max_size or batch.bytes >= self.max_bytes:
+                    full.append((name, self._buffers.pop(name)))
+        for name, batch in full:
+            self._executor.submit(self._flush, name, batch)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [name for name, batch in self._buffers.items() if batch.deadline <= now]
+                if not due:
+                    deadlines = [batch.deadline for batch in self._buffers.values()]
+                    self._cond.wait(min(deadlines) - now if deadlines else None)
+                    continue
+                batches = [(name, self._buffers.pop(name)) for name in due]
+            for name, batch in batches:
+                self._executor.submit(self._flush, name, batch)
+
+    def _flush(self, name, batch):
+        batch_id = f"{name}-{next(self._ids)}"
+        target = self.router.targets.get(name)
+        started = time.perf_counter()
+        if target is None:
+            result = {'status': 'error', 'error': f"Unknown target {name}"}
+        elif self.breakers is not None and not self.breakers.allow(name):
+            result = open_circuit_result(name)
+        else:
+            result = self._post(target, batch)
+            metrics.observe_forward(name, started, result)
+            if self.breakers is not None:
+                self.breakers.record(name, result)
+        metrics.BATCH_SIZE.observe(len(batch.jobs))
+        result.update(
+            batch=batch_id,
+            batch_size=len(batch.jobs),
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+            finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        )
+        for job in batch.jobs:
+            try:
+                self.on_result(job, combine_results({name: dict(result)}))
+            except Exception as e:
+                logger.error(f"Error recording batch result: {str(e)}")
+        with self._cond:
+            self.batches += 1
+            self.pending -= len(batch.jobs)
+            self.delivered += len(batch.jobs)
+
+    def _post(self, target, batch):
+        if self.format == 'json':
+            payload = b'[' + b','.join(batch.lines) + b']'
+        else:
+            payload = b'\n'.join(batch.lines) + b'\n'
+        headers = {'Content-Type': CONTENT_TYPES[self.format]}
+        if target.compress and len(payload) >= MIN_COMPRESS_BYTES:
+            payload = gzip.compress(payload, GZIP_LEVEL)
+            headers['Content-Encoding'] = 'gzip'
+        self.sessions.call_started()
+        try:
+            response = self.sessions.session_for(target).post(
+                target.url,
+                data=payload,
+                headers=headers,
+                timeout=self.sessions.timeout_for(target)
+            )
+            self.sessions.count_request()
+            logger.info(f"Forwarded batch of {len(batch.jobs)} requests to {target.url}")
+            return {'status': 'forwarded', 'status_code': response.status_code}
+        except Exception as e:
+            logger.error(f"Error forwarding batch to {target.name}: {str(e)}")
+            return {'status': 'error', 'error': str(e)}
+        finally:
+            self.sessions.call_finished()
+
+    def flush(self):
+        """Send every partial batch now, e.g. at shutdown, and wait for them"""
+        with self._cond:
+            batches = list(self._buffers.items())
+            self._buffers.clear()
+        futures = [self._executor.submit(self._flush, name, batch) for name, batch in batches]
+        for future in futures:
+            future.result()
+
+    def depth(self):
+        return self.pending
+
+    def stats(self):
+        return {
+            'format': self.format,
+            'max_size': self.max_size,
+            'max_delay': self.max_delay,
+            'pending': self.pending,
+            'batches': self.batches,
+            'delivered': self.delivered,
+            'average_size': round(self.delivered / self.batches, 1) if self.batches else 0
+        }
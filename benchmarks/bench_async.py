@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Flask and asyncio server modes side by side: many concurrent
+senders POST webhooks that are forwarded to a slow upstream, and we report
+throughput and p50/p99 latency for each mode.
+
+Both the webhook and the upstream (benchmarks/upstream.py with --latency)
+run as separate processes.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+UPSTREAM_SCRIPT = """
+import sys
+sys.path.insert(0, 'benchmarks')
+from upstream import make_upstream
+make_upstream('127.0.0.1', int(sys.argv[1]), float(sys.argv[2])).serve_forever()
+"""
+
+
+def wait_for(url, process):
+    for _ in range(100):
+        try:
+            requests.get(url)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{url} did not start")
+
+
+def start_webhook(mode, port, upstream_port):
+    env = dict(
+        os.environ,
+        SERVER_MODE=mode,
+        LISTEN_PORT=str(port),
+        REDIRECT_URL=f"http://127.0.0.1:{upstream_port}/webhook",
+        UPSTREAM_POOL_SIZE='100'
+    )
+    process = subprocess.Popen(
+        [sys.executable, 'app.py'], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_for(f"http://127.0.0.1:{port}/health", process)
+    return process
+
+
+async def send(session, url, count, latencies, errors, method='POST'):
+    payload = {"event": "bench", "id": 123}
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            if method == 'GET':
+                request = session.get(url, params=payload)
+            else:
+                request = session.post(url, json=payload)
+            async with request as response:
+                await response.read()
+                # 202 when forwarding happens after the reply (async or batched)
+                if not 200 <= response.status < 300:
+                    errors.append(response.status)
+        except aiohttp.ClientError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+
+
+async def load(url, senders, per_sender, method='POST'):
+    latencies = []
+    errors = []
+    connector = aiohttp.TCPConnector(limit=senders)
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            send(session, url, per_sender, latencies, errors, method) for _ in range(senders)
+        ))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'throughput': len(latencies) / elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[int(len(latencies) * 0.95)],
+        'p99': latencies[int(len(latencies) * 0.99)],
+        'errors': len(errors)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--senders', type=int, default=1000, help='concurrent senders')
+    parser.add_argument('--requests', type=int, default=5, help='requests per sender')
+    parser.add_argument('--latency', type=float, default=0.2, help='upstream latency in seconds')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--upstream-port', type=int, default=8091)
+    args = parser.parse_args()
+
+    upstream = subprocess.Popen(
+        [sys.executable, '-c', UPSTREAM_SCRIPT, str(args.upstream_port), str(args.latency)], cwd=ROOT
+    )
+    wait_for(f"http://127.0.0.1:{args.upstream_port}/", upstream)
+    print(f"{args.senders} senders x {args.requests} requests, upstream latency {args.latency}s")
+    try:
+        for mode in ('flask', 'asyncio'):
+            webhook = start_webhook(mode, args.port, args.upstream_port)
+            try:
+                result = asyncio.run(load(f"http://127.0.0.1:{args.port}/", args.senders, args.requests))
+            finally:
+                webhook.terminate()
+                webhook.wait()
+            print(
+                f"{mode:8s} {result['throughput']:8.0f} req/s  "
+                f"p50 {result['p50'] * 1000:7.0f} ms  p99 {result['p99'] * 1000:7.0f} ms  "
+                f"errors {result['errors']}"
+            )
+    finally:
+        upstream.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark gzip on typical JSON webhook payloads: compressed size and CPU
+time to compress and to inflate at levels 1, 6 and 9, then what it costs
+and saves end to end, through Flask's test client: handler CPU per
+gzip-encoded versus plain POST, and bytes and CPU per /api/requests and
+/dashboard response with and without Accept-Encoding: gzip.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from compression import inflate  # noqa: E402
+
+PAYLOADS_SCRIPT = """
+import json
+
+def github_push(i):
+    commits = [{
+        "id": "%040x" % (i * 7919 + n),
+        "tree_id": "%040x" % (i * 104729 + n),
+        "message": "Fix retry backoff when the upstream closes the connection (#%d)" % (i + n),
+        "timestamp": "2024-05-0%dT12:3%d:00Z" % (n + 1, n),
+        "url": "https://github.com/acme/widgets/commit/%040x" % (i * 7919 + n),
+        "author": {"name": "Dev %d" % n, "email": "dev%d@example.com" % n, "username": "dev%d" % n},
+        "added": [], "removed": [], "modified": ["src/forwarder.py", "README.md"]
+    } for n in range(3)]
+    return {
+        "ref": "refs/heads/main", "before": "%040x" % i, "after": "%040x" % (i + 1),
+        "repository": {
+            "id": 123456, "name": "widgets", "full_name": "acme/widgets", "private": False,
+            "owner": {"login": "acme", "id": 42, "type": "Organization", "site_admin": False},
+            "html_url": "https://github.com/acme/widgets", "default_branch": "main",
+            "created_at": 1589300000, "pushed_at": 1715000000 + i, "size": 2048,
+            "stargazers_count": 87, "watchers_count": 87, "language": "Python", "forks_count": 9
+        },
+        "pusher": {"name": "dev0", "email": "dev0@example.com"},
+        "sender": {"login": "dev0", "id": 1001, "type": "User", "site_admin": False},
+        "created": False, "deleted": False, "forced": False,
+        "commits": commits, "head_commit": commits[-1]
+    }
+
+def stripe_event(i):
+    return {
+        "id": "evt_%024d" % i, "object": "event", "api_version": "2023-10-16",
+        "created": 1715000000 + i, "type": "payment_intent.succeeded", "livemode": False,
+        "pending_webhooks": 1, "request": {"id": "req_%014d" % i, "idempotency_key": None},
+        "data": {"object": {
+            "id": "pi_%024d" % i, "object": "payment_intent", "amount": 2000 + i,
+            "amount_received": 2000 + i, "currency": "usd", "status": "succeeded",
+            "customer": "cus_%014d" % (i % 500), "description": "Order #%d" % i,
+            "payment_method": "pm_%024d" % i, "payment_method_types": ["card"],
+            "metadata": {"order_id": str(i), "channel": "web"}, "capture_method": "automatic",
+            "confirmation_method": "automatic", "latest_charge": "ch_%024d" % i
+        }}
+    }
+
+def slack_event(i):
+    return {
+        "token": "XXYYZZ", "team_id": "T0001", "api_app_id": "A0001", "type": "event_callback",
+        "event": {"type": "message", "channel": "C0%d" % (i % 9), "user": "U0%d" % (i % 50),
+                  "text": "deploy %d finished" % i, "ts": "1715000000.%06d" % i},
+        "event_id": "Ev%08d" % i, "event_time": 1715000000 + i
+    }
+
+PAYLOADS = {"github push": github_push, "stripe event": stripe_event, "slack message": slack_event}
+"""
+
+INGEST_SCRIPT = PAYLOADS_SCRIPT + """
+import gzip, logging, sys, time
+import app
+logging.disable(logging.WARNING)
+client = app.app.test_client()
+count = int(sys.argv[1])
+results = {}
+for encoding in ('identity', 'gzip'):
+    bodies = []
+    for i in range(count):
+        body = json.dumps(github_push(i)).encode()
+        bodies.append(gzip.compress(body, 6) if encoding == 'gzip' else body)
+    headers = {"Content-Type": "application/json"}
+    if encoding == 'gzip':
+        headers["Content-Encoding"] = "gzip"
+    start = time.process_time()
+    for body in bodies:
+        client.post('/', data=body, headers=headers)
+    results['ingest ' + encoding] = {
+        "cpu_ms": (time.process_time() - start) / count * 1000,
+        "bytes": sum(map(len, bodies)) / count
+    }
+for path in ('/api/requests?limit=100', '/dashboard'):
+    for accept in ('identity', 'gzip'):
+        start = time.process_time()
+        for _ in range(20):
+            response = client.get(path, headers={"Accept-Encoding": accept})
+        results[path + ' ' + accept] = {
+            "cpu_ms": (time.process_time() - start) / 20 * 1000,
+            "bytes": len(response.get_data())
+        }
+print(json.dumps(results))
+"""
+
+
+def time_per_call(function, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count
+
+
+def bench_codec(count):
+    namespace = {}
+    exec(PAYLOADS_SCRIPT, namespace)
+    print(f"{'payload':14s} {'level':>5s} {'bytes':>7s} {'gzip':>7s} {'ratio':>6s} "
+          f"{'compress':>10s} {'inflate':>10s}")
+    for name, make in namespace['PAYLOADS'].items():
+        body = json.dumps(make(1)).encode()
+        for level in (1, 6, 9):
+            compressed = gzip.compress(body, level)
+            compress = time_per_call(lambda: gzip.compress(body, level), count)
+            decompress = time_per_call(lambda: inflate(compressed, 'gzip', 100), count)
+            print(f"{name:14s} {level:5d} {len(body):7d} {len(compressed):7d} "
+                  f"{len(body) / len(compressed):5.1f}x {compress * 1e6:8.1f}us {decompress * 1e6:8.1f}us")
+
+
+def bench_app(count):
+    env = dict(os.environ, REDIRECT_URL='', STORE_BACKEND='memory', SEARCH_ENABLED='false')
+    output = subprocess.check_output([sys.executable, '-c', INGEST_SCRIPT, str(count)], cwd=ROOT, env=env)
+    results = json.loads(output.decode().strip().splitlines()[-1])
+    print(f"\n{'github push, no upstream':34s} {'bytes':>8s} {'CPU':>9s}")
+    for label, result in results.items():
+        print(f"{label:34s} {result['bytes']:8.0f} {result['cpu_ms']:6.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=2000, help='calls per codec measurement')
+    parser.add_argument('--requests', type=int, default=1000, help='webhooks posted through the app')
+    args = parser.parse_args()
+    bench_codec(args.count)
+    bench_app(args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark forwarding small POSTs: one connection per request (plain
+requests.post, as the forwarder used to do) versus the pooled keep-alive
+sessions.
+
+The Flask development server behind example_receiver.py closes every
+connection, so --upstream receiver only measures per-request client
+overhead; --upstream keepalive uses benchmarks/upstream.py, which keeps
+connections open like a production upstream.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import subprocess
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from forwarder import UpstreamSessions, forward_request  # noqa: E402
+from routing import Target  # noqa: E402
+
+RECEIVER_SCRIPT = """
+import logging, sys
+from werkzeug.serving import make_server
+from example_receiver import app
+logging.disable(logging.INFO)
+make_server('127.0.0.1', int(sys.argv[1]), app, threaded=True).serve_forever()
+"""
+
+KEEPALIVE_SCRIPT = """
+import sys
+sys.path.insert(0, 'benchmarks')
+from upstream import make_upstream
+make_upstream('127.0.0.1', int(sys.argv[1])).serve_forever()
+"""
+
+
+def start_receiver(port, upstream):
+    """Run the upstream in a separate process so it doesn't share our GIL"""
+    script = RECEIVER_SCRIPT if upstream == 'receiver' else KEEPALIVE_SCRIPT
+    process = subprocess.Popen([sys.executable, '-c', script, str(port)], cwd=ROOT)
+    url = f"http://127.0.0.1:{port}/"
+    for _ in range(50):
+        try:
+            requests.get(url)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("example_receiver did not start")
+
+
+def run_plain(url, count, payload):
+    for _ in range(count):
+        requests.post(url, json=payload)
+
+
+def run_pooled(url, count, payload, sessions):
+    logging.getLogger('forwarder').setLevel(logging.WARNING)
+    target = Target('bench', url)
+    for _ in range(count):
+        forward_request({
+            'method': 'POST',
+            'json': payload,
+            'headers': {'Content-Type': 'application/json'}
+        }, target, sessions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--upstream', choices=['receiver', 'keepalive'], default='receiver')
+    args = parser.parse_args()
+
+    receiver = start_receiver(args.port, args.upstream)
+    url = f"http://127.0.0.1:{args.port}/webhook"
+    payload = {"event": "bench", "id": 123}
+
+    start = time.perf_counter()
+    run_plain(url, args.count, payload)
+    plain = time.perf_counter() - start
+
+    sessions = UpstreamSessions(10, 5, 30)
+    start = time.perf_counter()
+    run_pooled(url, args.count, payload, sessions)
+    pooled = time.perf_counter() - start
+
+    print(f"requests.post per call: {args.count / plain:8.0f} req/s ({plain:.2f}s)")
+    print(f"pooled sessions:        {args.count / pooled:8.0f} req/s ({pooled:.2f}s)")
+    print(f"connection stats:       {sessions.stats()}")
+    receiver.terminate()
+
+
+if __name__ == '__main__':
+    main()
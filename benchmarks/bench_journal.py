@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark the request journal: webhook ingest throughput with the journal
+off and on, and the time to recover the store from a large journal.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+INGEST_SCRIPT = """
+import json, logging, sys, time
+import app
+logging.disable(logging.INFO)
+client = app.app.test_client()
+count = int(sys.argv[1])
+payload = {"event": "order.created", "order": {"id": 123, "items": [1, 2, 3]}}
+start = time.perf_counter()
+for _ in range(count):
+    client.post('/', json=payload)
+elapsed = time.perf_counter() - start
+if app.journal:
+    app.journal.close()
+print(json.dumps({"requests_per_second": count / elapsed}))
+"""
+
+
+def bench_ingest(count, journal_dir, journal_enabled):
+    env = dict(
+        os.environ,
+        REDIRECT_URL='',
+        JOURNAL_ENABLED=str(journal_enabled),
+        JOURNAL_DIR=journal_dir
+    )
+    output = subprocess.check_output(
+        [sys.executable, '-c', INGEST_SCRIPT, str(count)], cwd=ROOT, env=env
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])['requests_per_second']
+
+
+def bench_recovery(size_mb, journal_dir, max_requests):
+    from journal import Journal
+    from store import RequestRecord, RequestStore
+
+    # Appends outpace the writer here; none may be dropped
+    journal = Journal(journal_dir, 64 * 1024 * 1024, 1000, fsync=False, max_pending=1 << 30)
+    journal.start()
+    headers = {'Content-Type': 'application/json', 'User-Agent': 'Provider-Webhooks/1.0'}
+    payload = {"event": "order.created", "order": {"id": 0, "note": "x" * 600}}
+    written = 0
+    request_id = 0
+    while written < size_mb * 1024 * 1024:
+        request_id += 1
+        record = RequestRecord('POST', 'http://localhost:5000/', headers, time.time(), 800)
+        record.id = request_id
+        record.data = payload
+        journal.append_request(record)
+        written += 900
+    journal.close()
+
+    store = RequestStore(max_requests, 1024 * 1024 * 1024)
+    start = time.perf_counter()
+    Journal(journal_dir, 64 * 1024 * 1024, 1000).recover(store)
+    return request_id, time.perf_counter() - start, len(store)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=5000, help='requests per ingest run')
+    parser.add_argument('--recovery-mb', type=int, default=1024, help='journal size to recover')
+    parser.add_argument('--max-requests', type=int, default=10000, help='store capacity on recovery')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='journal-bench-')
+    try:
+        off = bench_ingest(args.count, os.path.join(workdir, 'off'), False)
+        on = bench_ingest(args.count, os.path.join(workdir, 'on'), True)
+        print(f"ingest, journal off: {off:8.0f} req/s")
+        print(f"ingest, journal on:  {on:8.0f} req/s")
+
+        entries, elapsed, restored = bench_recovery(
+            args.recovery_mb, os.path.join(workdir, 'recovery'), args.max_requests
+        )
+        print(f"recovery of ~{args.recovery_mb} MB ({entries} requests, {restored} kept): {elapsed:.2f}s")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark the memory footprint of the in-memory request store on 100k
+realistic provider webhooks (GitHub, Stripe and Slack payloads with their
+usual headers, signatures and delivery ids included).
+
+before: headers as a dict per record and the parsed JSON tree, as records
+        were stored before compaction
+after:  raw body bytes, header pairs shared through the store's header
+        table and bodies of STORE_COMPRESS_BYTES or more zlib-compressed
+
+Each layout is built in its own process; the footprint is the memory still
+allocated (tracemalloc) once the records are stored, divided by their
+number. The "view" column is the time to materialize one record for the API.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_async import ROOT  # noqa: E402
+from bench_compression import PAYLOADS_SCRIPT  # noqa: E402
+
+STORE_SCRIPT = PAYLOADS_SCRIPT + """
+import gc, hashlib, sys, time, tracemalloc, uuid
+from store import RequestRecord, RequestStore
+
+layout, count, compress_bytes = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+
+def provider_headers(name, i, body):
+    digest = hashlib.sha256(body).hexdigest()
+    common = [("Host", "hooks.example.com"), ("Accept", "*/*"), ("Content-Length", str(len(body))),
+              ("X-Forwarded-For", "140.82.115.%d" % (i % 250)), ("X-Forwarded-Proto", "https")]
+    if name == "github push":
+        return common + [
+            ("User-Agent", "GitHub-Hookshot/8e03811"), ("Content-Type", "application/json"),
+            ("X-Github-Event", "push"), ("X-Github-Delivery", str(uuid.UUID(int=i))),
+            ("X-Github-Hook-Id", "412887311"), ("X-Github-Hook-Installation-Target-Id", "123456"),
+            ("X-Github-Hook-Installation-Target-Type", "repository"),
+            ("X-Hub-Signature", "sha1=" + digest[:40]), ("X-Hub-Signature-256", "sha256=" + digest)]
+    if name == "stripe event":
+        return common + [
+            ("User-Agent", "Stripe/1.0 (+https://stripe.com/docs/webhooks)"),
+            ("Content-Type", "application/json; charset=utf-8"), ("Cache-Control", "no-cache"),
+            ("Stripe-Signature", "t=%d,v1=%s" % (1715000000 + i, digest))]
+    return common + [
+        ("User-Agent", "Slackbot 1.0 (+https://api.slack.com/robots)"), ("Content-Type", "application/json"),
+        ("Accept-Encoding", "gzip,deflate"), ("X-Slack-Request-Timestamp", str(1715000000 + i)),
+        ("X-Slack-Signature", "v0=" + digest)]
+
+# The raw requests, as they arrive on the wire, are not part of the footprint
+makers = list(PAYLOADS.items())
+wire = []
+for i in range(count):
+    name, make = makers[i % len(makers)]
+    body = json.dumps(make(i)).encode()
+    block = "\\r\\n".join("%s: %s" % pair for pair in provider_headers(name, i, body)).encode()
+    wire.append((block, body))
+
+gc.collect()
+tracemalloc.start()
+base = tracemalloc.get_traced_memory()[0]
+store = RequestStore(count, 1 << 40, layout == "after", compress_bytes)
+for i, (block, body) in enumerate(wire):
+    # Parsed from the raw request each time, as the server hands them over
+    headers = dict(line.split(": ", 1) for line in block.decode("latin-1").split("\\r\\n"))
+    record = RequestRecord("POST", "https://hooks.example.com/hook", headers, 1715000000.0 + i,
+                           len(body) + sum(len(k) + len(v) for k, v in headers.items()))
+    if layout == "before":
+        record.data = json.loads(body)
+    else:
+        record.body = body
+    store.add(record)
+headers = None
+gc.collect()
+used = tracemalloc.get_traced_memory()[0] - base
+tracemalloc.stop()
+# Without the collector, whose passes over a big heap would dominate
+gc.disable()
+records = store.page(limit=1000)[0]
+views = []
+for _ in range(3):
+    start = time.perf_counter()
+    for record in records:
+        json.dumps(record.to_dict())
+    views.append((time.perf_counter() - start) / len(records))
+view = min(views)
+print(json.dumps({
+    "bytes_per_record": used / count,
+    "payload_bytes": sum(len(body) for _, body in wire) / count,
+    "view_us": view * 1e6,
+    "stored_bytes": store.total_bytes / count
+}))
+"""
+
+
+def bench(layout, count, compress_bytes):
+    output = subprocess.check_output(
+        [sys.executable, '-c', STORE_SCRIPT, layout, str(count), str(compress_bytes)], cwd=ROOT
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--compress-bytes', type=int, default=1024)
+    args = parser.parse_args()
+
+    results = {layout: bench(layout, args.count, args.compress_bytes) for layout in ('before', 'after')}
+    print(f"{args.count} webhooks, average payload {results['before']['payload_bytes']:.0f} bytes")
+    print(f"{'layout':8s} {'per record':>12s} {'store size':>12s} {'view':>9s}")
+    for layout, result in results.items():
+        print(f"{layout:8s} {result['bytes_per_record']:10.0f} B {result['stored_bytes']:10.0f} B "
+              f"{result['view_us']:7.1f}us")
+    print(f"footprint: {results['after']['bytes_per_record'] / results['before']['bytes_per_record']:.0%} of before")
+
+
+if __name__ == '__main__':
+    main()
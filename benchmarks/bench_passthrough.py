@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark handler CPU time per forwarded 100 KB JSON POST with the body
+parsed and re-encoded (default) versus forwarded byte for byte
+(FORWARD_PASSTHROUGH=true).
+
+Each mode runs in its own process through Flask's test client, forwarding
+to the keep-alive upstream stand-in; CPU time is that of the webhook
+process, so the upstream's work is not counted.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_async import ROOT, UPSTREAM_SCRIPT, wait_for  # noqa: E402
+
+INGEST_SCRIPT = """
+import json, logging, sys, time
+import app
+logging.disable(logging.WARNING)
+client = app.app.test_client()
+count, size = int(sys.argv[1]), int(sys.argv[2])
+items = [{"id": i, "sku": "SKU-%06d" % i, "qty": i % 7, "price": i * 0.25} for i in range(size // 60)]
+body = json.dumps({"event": "order.created", "items": items}).encode()
+headers = {"Content-Type": "application/json"}
+for _ in range(10):
+    client.post('/', data=body, headers=headers)
+start = time.process_time()
+for _ in range(count):
+    client.post('/', data=body, headers=headers)
+cpu = time.process_time() - start
+print(json.dumps({"cpu_ms": cpu / count * 1000, "bytes": len(body)}))
+"""
+
+
+def bench(passthrough, count, size, upstream_port):
+    env = dict(
+        os.environ,
+        REDIRECT_URL=f"http://127.0.0.1:{upstream_port}/webhook",
+        FORWARD_PASSTHROUGH=str(passthrough),
+        STORE_MAX_REQUESTS='100'
+    )
+    output = subprocess.check_output(
+        [sys.executable, '-c', INGEST_SCRIPT, str(count), str(size)], cwd=ROOT, env=env
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--size', type=int, default=100 * 1024, help='approximate payload bytes')
+    parser.add_argument('--upstream-port', type=int, default=8093)
+    args = parser.parse_args()
+
+    upstream = subprocess.Popen(
+        [sys.executable, '-c', UPSTREAM_SCRIPT, str(args.upstream_port), '0'], cwd=ROOT
+    )
+    try:
+        wait_for(f"http://127.0.0.1:{args.upstream_port}/", upstream)
+        for passthrough in (False, True):
+            result = bench(passthrough, args.count, args.size, args.upstream_port)
+            label = 'passthrough' if passthrough else 'parse + re-encode'
+            print(f"{label:18s} {result['cpu_ms']:6.2f} ms CPU per {result['bytes'] // 1024} KB request")
+    finally:
+        upstream.terminate()
+
+
+if __name__ == '__main__':
+    main()
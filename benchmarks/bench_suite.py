@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Load and latency suite to compare runs against each other.
+
+Runs app.py against the keep-alive upstream stand-in (optionally slow or
+flaky) or against example_receiver.py, drives GET and POST load at each
+concurrency level and reports throughput, p50/p95/p99 latency, errors and
+the webhook's RSS. It then times /dashboard renders with 1k, 10k and 100k
+stored requests. Results are written as JSON; pass an earlier results file
+with --compare to print the change against it.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_async import ROOT, load, wait_for  # noqa: E402
+from bench_forward import RECEIVER_SCRIPT  # noqa: E402
+
+UPSTREAM_SCRIPT = """
+import sys
+sys.path.insert(0, 'benchmarks')
+from upstream import make_upstream
+make_upstream('127.0.0.1', int(sys.argv[1]), float(sys.argv[2]), float(sys.argv[3])).serve_forever()
+"""
+
+DASHBOARD_SCRIPT = """
+import json, logging, sys, time
+import app
+from store import RequestRecord
+logging.disable(logging.WARNING)
+client = app.app.test_client()
+size, renders = int(sys.argv[1]), int(sys.argv[2])
+now = time.time()
+for i in range(size):
+    record = RequestRecord('POST' if i % 3 else 'GET', 'http://127.0.0.1/hook',
+                           {'Content-Type': 'application/json'}, now - size + i, 200)
+    record.data = {'event': 'bench', 'id': i}
+    app.received_requests.add(record)
+client.get('/dashboard')
+times = []
+cpu = time.process_time()
+for _ in range(renders):
+    start = time.perf_counter()
+    response = client.get('/dashboard')
+    times.append(time.perf_counter() - start)
+cpu = (time.process_time() - cpu) / renders
+# Revalidation of an unchanged page by a browser holding its ETag
+etag = response.headers.get('ETag')
+start = time.perf_counter()
+status = client.get('/dashboard', headers={'If-None-Match': etag} if etag else {}).status_code
+not_modified = time.perf_counter() - start
+times.sort()
+print(json.dumps({'p50': times[len(times) // 2], 'max': times[-1], 'cpu': cpu, 'bytes': len(response.data),
+                  'revalidate': not_modified, 'revalidate_status': status}))
+"""
+
+
+def rss_kb(pid):
+    """Current and peak resident set size of a process (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(':', 1) for line in f)
+    except OSError:
+        return None, None
+    return int(fields['VmRSS'].split()[0]), int(fields['VmHWM'].split()[0])
+
+
+def start_upstream(args):
+    if args.upstream == 'receiver':
+        command = [sys.executable, '-c', RECEIVER_SCRIPT, str(args.upstream_port)]
+    else:
+        command = [
+            sys.executable, '-c', UPSTREAM_SCRIPT,
+            str(args.upstream_port), str(args.latency), str(args.error_rate)
+        ]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(f"http://127.0.0.1:{args.upstream_port}/webhook", process)
+    return process
+
+
+def start_webhook(args):
+    env = dict(
+        os.environ,
+        SERVER_MODE=args.mode,
+        LISTEN_PORT=str(args.port),
+        REDIRECT_URL=f"http://127.0.0.1:{args.upstream_port}/webhook",
+        UPSTREAM_POOL_SIZE='100'
+    )
+    process = subprocess.Popen(
+        [sys.executable, 'app.py'], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_for(f"http://127.0.0.1:{args.port}/health", process)
+    return process
+
+
+def run_load(args):
+    results = []
+    upstream = start_upstream(args)
+    try:
+        webhook = start_webhook(args)
+        try:
+            for concurrency in [int(n) for n in args.concurrency.split(',')]:
+                for method in ('GET', 'POST'):
+                    result = asyncio.run(load(
+                        f"http://127.0.0.1:{args.port}/", concurrency, args.requests, method
+                    ))
+                    result['rss_kb'], result['peak_rss_kb'] = rss_kb(webhook.pid)
+                    result.update(method=method, concurrency=concurrency)
+                    results.append(result)
+                    print(
+                        f"{method:4s} x{concurrency:<4d} {result['throughput']:8.0f} req/s  "
+                        f"p50 {result['p50'] * 1000:6.1f} ms  p95 {result['p95'] * 1000:6.1f} ms  "
+                        f"p99 {result['p99'] * 1000:6.1f} ms  errors {result['errors']}  "
+                        f"rss {(result['rss_kb'] or 0) // 1024} MB"
+                    )
+        finally:
+            webhook.terminate()
+            webhook.wait()
+    finally:
+        upstream.terminate()
+    return results
+
+
+def run_dashboard(args):
+    results = []
+    for size in [int(n) for n in args.dashboard_sizes.split(',')]:
+        env = dict(
+            os.environ,
+            REDIRECT_URL='',
+            STORE_BACKEND='memory',
+            STORE_MAX_REQUESTS=str(size),
+            STORE_MAX_BYTES=str(size * 1024)
+        )
+        output = subprocess.check_output(
+            [sys.executable, '-c', DASHBOARD_SCRIPT, str(size), str(args.renders)], cwd=ROOT, env=env
+        )
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        result['stored'] = size
+        results.append(result)
+        print(f"/dashboard with {size:>7d} stored  p50 {result['p50'] * 1000:7.1f} ms  "
+              f"max {result['max'] * 1000:7.1f} ms  CPU {result['cpu'] * 1000:7.1f} ms  {result['bytes'] // 1024} KB  "
+              f"revalidate {result['revalidate'] * 1000:5.1f} ms ({result['revalidate_status']})")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous):
+    """Print the change of each measurement against an earlier run"""
+    print(f"\nCompared with {previous['revision']} ({previous['started_at']}):")
+    earlier = {(r['method'], r['concurrency']): r for r in previous['load']}
+    for result in current['load']:
+        before = earlier.get((result['method'], result['concurrency']))
+        if before:
+            print(
+                f"{result['method']:4s} x{result['concurrency']:<4d} "
+                f"throughput {result['throughput'] / before['throughput'] - 1:+7.1%}  "
+                f"p99 {result['p99'] / before['p99'] - 1:+7.1%}"
+            )
+    earlier = {r['stored']: r for r in previous['dashboard']}
+    for result in current['dashboard']:
+        before = earlier.get(result['stored'])
+        if before:
+            print(f"/dashboard with {result['stored']:>7d} stored  p50 {result['p50'] / before['p50'] - 1:+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mode', choices=['flask', 'asyncio'], default='flask')
+    parser.add_argument('--upstream', choices=['keepalive', 'receiver'], default='keepalive')
+    parser.add_argument('--latency', type=float, default=0, help='upstream latency in seconds (keepalive)')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of upstream 500s (keepalive)')
+    parser.add_argument('--concurrency', default='1,10,100', help='comma-separated concurrent senders')
+    parser.add_argument('--requests', type=int, default=200, help='requests per sender')
+    parser.add_argument('--dashboard-sizes', default='1000,10000,100000')
+    parser.add_argument('--renders', type=int, default=5, help='timed renders per dashboard size')
+    parser.add_argument('--port', type=int, default=8094)
+    parser.add_argument('--upstream-port', type=int, default=8095)
+    parser.add_argument('--output', help='results file (default benchmarks/results/<time>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+    results = {
+        'started_at': started_at,
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'options': vars(args),
+        'load': run_load(args),
+        'dashboard': run_dashboard(args)
+    }
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f"{started_at.replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark ingest throughput of the pre-fork launcher with 1, 2, 4, ...
+workers and no upstream, to check that it scales with the worker count.
+
+Load comes from several client processes so the client isn't the
+bottleneck; run it on a machine with at least as many cores as the largest
+worker count plus the clients.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_async import ROOT, load, wait_for  # noqa: E402
+
+
+def start_workers(workers, port, mode, db_path):
+    env = dict(
+        os.environ,
+        WORKERS=str(workers),
+        SERVER_MODE=mode,
+        LISTEN_PORT=str(port),
+        REDIRECT_URL='',
+        STORE_BACKEND='sqlite',
+        SQLITE_PATH=db_path
+    )
+    process = subprocess.Popen(
+        [sys.executable, 'app.py'], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_for(f"http://127.0.0.1:{port}/health", process)
+    return process
+
+
+def client(args):
+    url, senders, per_sender = args
+    return asyncio.run(load(url, senders, per_sender))['throughput']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--mode', choices=['flask', 'asyncio'], default='asyncio')
+    parser.add_argument('--clients', type=int, default=4, help='load generator processes')
+    parser.add_argument('--senders', type=int, default=50, help='concurrent senders per client')
+    parser.add_argument('--requests', type=int, default=200, help='requests per sender')
+    parser.add_argument('--port', type=int, default=8092)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.mode} server, "
+          f"{args.clients}x{args.senders} senders x {args.requests} requests")
+    baseline = None
+    for workers in [int(n) for n in args.workers.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            server = start_workers(workers, args.port, args.mode, os.path.join(tmp, 'requests.db'))
+            try:
+                url = f"http://127.0.0.1:{args.port}/"
+                with multiprocessing.Pool(args.clients) as pool:
+                    throughput = sum(pool.map(client, [(url, args.senders, args.requests)] * args.clients))
+            finally:
+                server.terminate()
+                server.wait()
+                time.sleep(0.5)
+        baseline = baseline or throughput
+        print(f"{workers:3d} workers {throughput:8.0f} req/s  ({throughput / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
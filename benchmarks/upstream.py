@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Minimal HTTP/1.1 keep-alive upstream stand-in for benchmarks.
+
+Unlike the Flask development server used by example_receiver.py, this server
+keeps connections open between requests, like a production upstream would.
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    # Seconds to wait before replying, to simulate a slow upstream
+    latency = 0
+    # Fraction of requests answered with a 500, to simulate a flaky upstream
+    error_rate = 0
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if self.latency:
+            time.sleep(self.latency)
+        failed = self.error_rate and random.random() < self.error_rate
+        body = json.dumps({"status": "error" if failed else "received"}).encode()
+        self.send_response(500 if failed else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for bursts of concurrent connections from load tests
+    request_queue_size = 1024
+
+
+def make_upstream(host, port, latency=0, error_rate=0):
+    handler = type('UpstreamHandler', (UpstreamHandler,), {'latency': latency, 'error_rate': error_rate})
+    return UpstreamServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0, help="seconds to wait before each reply")
+    parser.add_argument('--error-rate', type=float, default=0, help="fraction of replies that are 500s")
+    args = parser.parse_args()
+    print(f"Upstream stand-in listening on http://{args.host}:{args.port}/")
+    make_upstream(args.host, args.port, args.latency, args.error_rate).serve_forever()
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Circuit breaker of one upstream target.
+
+    Closed, it keeps the outcome of the last `window` calls and opens once
+    at least `min_calls` of them show an error rate (errors and 5xx) or a
+    rate of calls slower than `slow_ms` over its threshold. Open, calls
+    fail fast for `open_seconds`; then it turns half-open and lets a single
+    probe through, closing again if the probe succeeds in time and
+    reopening otherwise.
+    """
+
+    def __init__(self, name, window, min_calls, error_rate, slow_ms, slow_rate, open_seconds):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_ms = slow_ms
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+        self._probing = False
+        # (failed, slow) per call, newest on the right
+        self._calls = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go upstream now; False means fail fast"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, result):
+        """Feed back the result of a call that allow() let through"""
+        failed = result['status'] == 'error' or result.get('status_code', 0) >= 500
+        slow = bool(self.slow_ms) and result.get('elapsed_ms', 0) > self.slow_ms
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if failed or slow:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._calls.clear()
+                return
+            if self.state == OPEN:
+                # A call started before the circuit opened
+                return
+            self._calls.append((failed, slow))
+            calls = len(self._calls)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for call_failed, _ in self._calls if call_failed)
+            slow_calls = sum(1 for _, call_slow in self._calls if call_slow)
+            if failures / calls >= self.error_rate or (self.slow_ms and slow_calls / calls >= self.slow_rate):
+                self._open()
+
+    def retry_after(self):
+        """Seconds until the circuit lets a probe through, 0 unless open"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0
+            return max(self.open_seconds - (time.monotonic() - self.opened_at), 0)
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self._calls.clear()
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._calls)
+            return {
+                'state': self.state,
+                'calls': calls,
+                'error_rate': round(sum(1 for failed, _ in self._calls if failed) / calls, 3) if calls else 0,
+                'slow_rate': round(sum(1 for _, slow in self._calls if slow) / calls, 3) if calls else 0,
+                'open_for': round(max(self.open_seconds - (time.monotonic() - self.opened_at), 0), 1)
+                if self.state == OPEN else None,
+                'trips': self.trips,
+                'rejected': self.rejected
+            }
+
+
+class CircuitBreakers:
+    """A CircuitBreaker per upstream target, created on first use"""
+
+    def __init__(self, window, min_calls, error_rate, slow_ms, slow_rate, open_seconds):
+        self.settings = (window, min_calls, error_rate, slow_ms, slow_rate, open_seconds)
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(name, CircuitBreaker(name, *self.settings))
+        return breaker
+
+    def allow(self, name):
+        return self.get(name).allow()
+
+    def record(self, name, result):
+        self.get(name).record(result)
+
+    def retry_after(self, names):
+        """Seconds until every named circuit lets a probe through"""
+        return max((self.get(name).retry_after() for name in names), default=0)
+
+    def states(self):
+        """Circuit state by target name"""
+        return {name: breaker.state for name, breaker in list(self._breakers.items())}
+
+    def stats(self):
+        return {name: breaker.stats() for name, breaker in list(self._breakers.items())}
+
+
+def open_circuit_result(name):
+    """Result of a call failed fast because the target's circuit is open"""
+    metrics.FORWARDS.inc(name, 'circuit_open')
+    return {
+        'status': 'error',
+        'error': 'Circuit open, upstream not called',
+        'circuit_open': True,
+        'elapsed_ms': 0,
+        'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
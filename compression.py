@@ -0,0 +1,203 @@
+import gzip
+import json
+import zlib
+
+from werkzeug.wsgi import get_input_stream
+
+from streaming import CHUNK_SIZE, BodyTooLarge
+
+# Content-Encoding values of request bodies that are inflated on arrival
+ENCODINGS = frozenset(['gzip', 'x-gzip', 'deflate'])
+
+# Output allowed before the expansion ratio is enforced, so small bodies
+# that compress extremely well are not mistaken for bombs
+RATIO_SLACK = 1024 * 1024
+
+# Bodies smaller than this are sent as they are: gzip would barely help
+MIN_COMPRESS_BYTES = 1024
+
+# zlib level for compressed responses and forwards (1 fastest .. 9 smallest)
+GZIP_LEVEL = 6
+
+# Response types worth compressing
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/x-ndjson')
+
+
+class InvalidEncoding(Exception):
+    """A request body did not decode with its Content-Encoding"""
+
+
+class Inflater:
+    """Incremental gzip / deflate decoder with a decompression-bomb guard.
+
+    Output is produced at most CHUNK_SIZE bytes at a time and counted as it
+    is produced, so inflating stops with BodyTooLarge as soon as it goes
+    over max_bytes or over max_ratio times the compressed input, without
+    ever holding the whole expanded body.
+    """
+
+    def __init__(self, encoding, max_ratio, max_bytes=0):
+        self.encoding = encoding
+        self.max_ratio = max_ratio
+        self.max_bytes = max_bytes
+        self.compressed = 0
+        self.size = 0
+        self._decoder = None
+
+    def feed(self, data):
+        """Inflate the next piece of the compressed body"""
+        if not data:
+            return b''
+        if self._decoder is None:
+            self._decoder = zlib.decompressobj(self._wbits(data))
+        self.compressed += len(data)
+        output = []
+        try:
+            while data:
+                chunk = self._decoder.decompress(data, CHUNK_SIZE)
+                self._count(chunk)
+                output.append(chunk)
+                data = self._decoder.unconsumed_tail
+        except zlib.error as e:
+            raise InvalidEncoding(f"Request body is not valid {self.encoding}: {e}")
+        return b''.join(output)
+
+    def finish(self):
+        """Whatever the decoder still buffers once the input has ended"""
+        if self._decoder is None:
+            return b''
+        try:
+            chunk = self._decoder.flush()
+        except zlib.error as e:
+            raise InvalidEncoding(f"Request body is not valid {self.encoding}: {e}")
+        self._count(chunk)
+        return chunk
+
+    def _wbits(self, data):
+        if self.encoding != 'deflate':
+            return 16 + zlib.MAX_WBITS
+        # "deflate" is meant to be zlib-wrapped, but raw deflate is common too
+        if len(data) >= 2 and data[0] & 0x0F == 8 and (data[0] << 8 | data[1]) % 31 == 0:
+            return zlib.MAX_WBITS
+        return -zlib.MAX_WBITS
+
+    def _count(self, chunk):
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise BodyTooLarge(f"Decompressed request body exceeds {self.max_bytes} bytes")
+        if self.max_ratio and self.size > max(self.compressed * self.max_ratio, RATIO_SLACK):
+            raise BodyTooLarge(f"Request body expands more than {self.max_ratio} times")
+
+
+def inflate(data, encoding, max_ratio, max_bytes=0):
+    """Decode a whole compressed body held in memory"""
+    inflater = Inflater(encoding, max_ratio, max_bytes)
+    return inflater.feed(data) + inflater.finish()
+
+
+class InflatingReader:
+    """File-like view of a compressed stream that reads inflated bytes"""
+
+    def __init__(self, stream, inflater):
+        self.stream = stream
+        self.inflater = inflater
+        self._buffer = b''
+        self._eof = False
+
+    def read(self, size=-1):
+        while not self._eof and (size is None or size < 0 or len(self._buffer) < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    def readline(self, size=-1):
+        """Read up to and including the next newline, inflating no further
+        than needed to find it"""
+        searched = 0
+        while True:
+            end = self._buffer.find(b'\n', searched) + 1
+            if end or self._eof or (size is not None and 0 <= size <= len(self._buffer)):
+                break
+            searched = len(self._buffer)
+            self._fill()
+        end = end or len(self._buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        line, self._buffer = self._buffer[:end], self._buffer[end:]
+        return line
+
+    def exceeds(self, size):
+        """Whether the body inflates to more than size bytes (never, with
+        size 0); inflates at most one chunk beyond it to find out"""
+        while size and not self._eof and len(self._buffer) <= size:
+            self._fill()
+        return bool(size) and len(self._buffer) > size
+
+    def _fill(self):
+        data = self.stream.read(CHUNK_SIZE)
+        if data:
+            self._buffer += self.inflater.feed(data)
+        else:
+            self._buffer += self.inflater.finish()
+            self._eof = True
+
+
+class DecompressRequests:
+    """WSGI middleware inflating gzip / deflate request bodies as they are read.
+
+    The body becomes a stream of unknown length (the compressed length is
+    kept as `webhook.compressed_length`), and Content-Encoding is dropped
+    so the decoded body is captured and forwarded as is. Since the decoded
+    size is unknown, handlers ask the reader whether it `exceeds()` the
+    streaming threshold rather than buffering it whole.
+    """
+
+    def __init__(self, app, max_ratio, max_bytes=0):
+        self.app = app
+        self.max_ratio = max_ratio
+        self.max_bytes = max_bytes
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if encoding in ENCODINGS:
+            stream = get_input_stream(environ)
+            environ['wsgi.input'] = InflatingReader(stream, Inflater(encoding, self.max_ratio, self.max_bytes))
+            environ['wsgi.input_terminated'] = True
+            environ['webhook.compressed_length'] = environ.pop('CONTENT_LENGTH', None)
+            del environ['HTTP_CONTENT_ENCODING']
+        return self.app(environ, start_response)
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows a gzip response"""
+    for coding in (accept_encoding or '').lower().split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def compressible(content_type):
+    return (content_type or '').startswith(COMPRESSIBLE_TYPES)
+
+
+def gzip_job_body(job):
+    """(compressed body, headers) to forward a buffered POST body gzipped, or None"""
+    if job['method'] != 'POST':
+        return None
+    headers = dict(job['headers'])
+    if job.get('json') is not None:
+        raw = json.dumps(job['json']).encode()
+        headers['Content-Type'] = 'application/json'
+    elif isinstance(job.get('body'), bytes):
+        raw = job['body']
+    elif job.get('data'):
+        raw = job['data'].encode()
+    else:
+        return None
+    if len(raw) < MIN_COMPRESS_BYTES:
+        return None
+    headers['Content-Encoding'] = 'gzip'
+    return gzip.compress(raw, GZIP_LEVEL), headers
@@ -15,4 +15,166 @@ class Config:
     DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
     
     # Host to bind to (0.0.0.0 means accessible from outside localhost)
-    HOST = os.environ.get('HOST', '0.0.0.0')
\ No newline at end of file
+    HOST = os.environ.get('HOST', '0.0.0.0')
+    
+    # Accept-then-forward mode: acknowledge with 202 and forward in the background
+    ASYNC_FORWARDING = os.environ.get('ASYNC_FORWARDING', 'False').lower() == 'true'
+    
+    # Maximum number of requests waiting to be forwarded in async mode
+    FORWARD_QUEUE_SIZE = int(os.environ.get('FORWARD_QUEUE_SIZE', 1000))
+    
+    # Number of forwarder worker threads in async mode
+    FORWARD_WORKERS = int(os.environ.get('FORWARD_WORKERS', 4))
+    
+    # Forward POST bodies byte for byte instead of parsing and re-encoding them
+    FORWARD_PASSTHROUGH = os.environ.get('FORWARD_PASSTHROUGH', 'False').lower() == 'true'
+    
+    # Largest accepted request body in bytes (0 = no limit); larger ones get a 413
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 100 * 1024 * 1024))
+    
+    # Bodies above this size (or chunked) are streamed upstream instead of buffered
+    STREAM_THRESHOLD = int(os.environ.get('STREAM_THRESHOLD', 1024 * 1024))
+    
+    # Bytes of a streamed body kept in the capture store
+    BODY_PREVIEW_BYTES = int(os.environ.get('BODY_PREVIEW_BYTES', 64 * 1024))
+    
+    # Directory holding the full streamed bodies
+    BODY_SPILL_DIR = os.environ.get('BODY_SPILL_DIR', 'bodies')
+    
+    # gzip / deflate request bodies are inflated on arrival; one expanding more
+    # than this many times its compressed size gets a 413 (0 = no ratio limit)
+    DECOMPRESS_MAX_RATIO = int(os.environ.get('DECOMPRESS_MAX_RATIO', 100))
+    
+    # gzip API and dashboard responses for clients sending Accept-Encoding: gzip
+    COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'True').lower() == 'true'
+    
+    # gzip forwarded POST bodies by default; a route's "compress" key overrides it
+    FORWARD_GZIP = os.environ.get('FORWARD_GZIP', 'False').lower() == 'true'
+    
+    # Keep-alive connections kept per upstream target
+    UPSTREAM_POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', 10))
+    
+    # Seconds to wait when connecting to / reading from the upstream target
+    UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 5))
+    UPSTREAM_READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 30))
+    
+    # Capacity of the in-memory request store; oldest requests are evicted first
+    STORE_MAX_REQUESTS = int(os.environ.get('STORE_MAX_REQUESTS', 10000))
+    STORE_MAX_BYTES = int(os.environ.get('STORE_MAX_BYTES', 100 * 1024 * 1024))
+    
+    # Keep stored requests compact: header pairs shared between records, and
+    # bodies of STORE_COMPRESS_BYTES or more zlib-compressed (0 = never)
+    STORE_COMPACT = os.environ.get('STORE_COMPACT', 'True').lower() == 'true'
+    STORE_COMPRESS_BYTES = int(os.environ.get('STORE_COMPRESS_BYTES', 1024))
+    
+    # Number of requests rendered per dashboard / API page
+    DASHBOARD_PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE', 50))
+    
+    # Events buffered per live dashboard connection before new ones are dropped
+    EVENTS_BUFFER_SIZE = int(os.environ.get('EVENTS_BUFFER_SIZE', 100))
+    
+    # Inverted index over captured headers, query params and JSON payloads
+    # behind /api/search, and the terms indexed per request at most
+    SEARCH_ENABLED = os.environ.get('SEARCH_ENABLED', 'False').lower() == 'true'
+    SEARCH_MAX_TERMS = int(os.environ.get('SEARCH_MAX_TERMS', 200))
+    
+    # Requests waiting to be indexed before new ones are left out of the index
+    SEARCH_QUEUE_SIZE = int(os.environ.get('SEARCH_QUEUE_SIZE', 10000))
+    
+    # Optional on-disk journal of captured requests, replayed on startup
+    JOURNAL_ENABLED = os.environ.get('JOURNAL_ENABLED', 'False').lower() == 'true'
+    JOURNAL_DIR = os.environ.get('JOURNAL_DIR', 'journal')
+    
+    # Journal segment size before rotating, and number of segments kept
+    JOURNAL_SEGMENT_BYTES = int(os.environ.get('JOURNAL_SEGMENT_BYTES', 64 * 1024 * 1024))
+    JOURNAL_MAX_SEGMENTS = int(os.environ.get('JOURNAL_MAX_SEGMENTS', 16))
+    
+    # fsync each group commit (disable to trade durability for throughput)
+    JOURNAL_FSYNC = os.environ.get('JOURNAL_FSYNC', 'True').lower() == 'true'
+    
+    # Journal entries queued for the writer before new ones are dropped
+    JOURNAL_MAX_PENDING = int(os.environ.get('JOURNAL_MAX_PENDING', 10000))
+    
+    # Request store backend: 'memory' or 'sqlite'
+    STORE_BACKEND = os.environ.get('STORE_BACKEND', 'memory').lower()
+    
+    # SQLite database file, capacity and insert batch size for the sqlite backend
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', 'requests.db')
+    SQLITE_MAX_REQUESTS = int(os.environ.get('SQLITE_MAX_REQUESTS', 1000000))
+    SQLITE_BATCH_SIZE = int(os.environ.get('SQLITE_BATCH_SIZE', 500))
+    
+    # Retry failed forwards with exponential backoff and jitter
+    RETRY_ENABLED = os.environ.get('RETRY_ENABLED', 'False').lower() == 'true'
+    RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', 5))
+    RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', 1))
+    RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', 300))
+    
+    # File and capacity of the dead-letter queue for forwards out of attempts
+    DEAD_LETTER_PATH = os.environ.get('DEAD_LETTER_PATH', 'dead_letters.jsonl')
+    DEAD_LETTER_MAX = int(os.environ.get('DEAD_LETTER_MAX', 10000))
+    
+    # Default dead-letter replay rate (requests per second)
+    DEAD_LETTER_REPLAY_RATE = float(os.environ.get('DEAD_LETTER_REPLAY_RATE', 10))
+    
+    # Routing table for fan-out to several targets, as JSON or a JSON file
+    # (overrides REDIRECT_URL), e.g.
+    # [{"name": "billing", "url": "http://billing/hook", "path": "^/billing",
+    #   "headers": {"X-Event": "^invoice\\."}, "json": {"data.type": "paid"},
+    #   "timeout": 10, "pool_size": 20}]
+    ROUTES = os.environ.get('ROUTES', '')
+    ROUTES_FILE = os.environ.get('ROUTES_FILE', '')
+    
+    # Threads used to forward to several targets concurrently
+    FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS', 16))
+    
+    # Batched delivery: coalesce forwards per target into one POST of up to
+    # BATCH_MAX_SIZE requests / BATCH_MAX_BYTES, sent at most BATCH_MAX_DELAY
+    # seconds after its first request, as 'ndjson' or a 'json' array
+    BATCH_ENABLED = os.environ.get('BATCH_ENABLED', 'False').lower() == 'true'
+    BATCH_FORMAT = os.environ.get('BATCH_FORMAT', 'ndjson').lower()
+    BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 100))
+    BATCH_MAX_BYTES = int(os.environ.get('BATCH_MAX_BYTES', 1024 * 1024))
+    BATCH_MAX_DELAY = float(os.environ.get('BATCH_MAX_DELAY', 1))
+    BATCH_FLUSH_WORKERS = int(os.environ.get('BATCH_FLUSH_WORKERS', 2))
+    
+    # Per-source token buckets: requests a second and burst size (0 = no
+    # limit); sources are client addresses, or values of RATE_LIMIT_HEADER
+    RATE_LIMIT = float(os.environ.get('RATE_LIMIT', 0))
+    RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', 20))
+    RATE_LIMIT_HEADER = os.environ.get('RATE_LIMIT_HEADER', '')
+    RATE_LIMIT_MAX_SOURCES = int(os.environ.get('RATE_LIMIT_MAX_SOURCES', 10000))
+    
+    # Shed load with 503 once this many forwards are queued or upstream calls
+    # are in flight (0 = never), asking senders to retry after SHED_RETRY_AFTER
+    SHED_QUEUE_DEPTH = int(os.environ.get('SHED_QUEUE_DEPTH', 0))
+    SHED_IN_FLIGHT = int(os.environ.get('SHED_IN_FLIGHT', 0))
+    SHED_RETRY_AFTER = int(os.environ.get('SHED_RETRY_AFTER', 5))
+    
+    # Acknowledge repeated deliveries without forwarding them again: keyed on
+    # DEDUP_HEADER, or on a hash of method, URL and body when it is empty
+    DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', 'False').lower() == 'true'
+    DEDUP_HEADER = os.environ.get('DEDUP_HEADER', 'Idempotency-Key')
+    DEDUP_TTL = float(os.environ.get('DEDUP_TTL', 300))
+    DEDUP_MAX_KEYS = int(os.environ.get('DEDUP_MAX_KEYS', 100000))
+    
+    # Per-target circuit breaker: opens when, over the last BREAKER_WINDOW calls
+    # (and at least BREAKER_MIN_CALLS), the error rate reaches BREAKER_ERROR_RATE
+    # or the share of calls slower than BREAKER_SLOW_MS (0 = ignore latency)
+    # reaches BREAKER_SLOW_RATE; a probe is let through after BREAKER_OPEN_SECONDS
+    BREAKER_ENABLED = os.environ.get('BREAKER_ENABLED', 'False').lower() == 'true'
+    BREAKER_WINDOW = int(os.environ.get('BREAKER_WINDOW', 20))
+    BREAKER_MIN_CALLS = int(os.environ.get('BREAKER_MIN_CALLS', 10))
+    BREAKER_ERROR_RATE = float(os.environ.get('BREAKER_ERROR_RATE', 0.5))
+    BREAKER_SLOW_MS = float(os.environ.get('BREAKER_SLOW_MS', 0))
+    BREAKER_SLOW_RATE = float(os.environ.get('BREAKER_SLOW_RATE', 0.5))
+    BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', 30))
+    
+    # Server implementation: 'flask' (threaded) or 'asyncio' (aiohttp event loop)
+    SERVER_MODE = os.environ.get('SERVER_MODE', 'flask').lower()
+    
+    # Maximum concurrent upstream connections per target in asyncio mode
+    ASYNC_UPSTREAM_LIMIT = int(os.environ.get('ASYNC_UPSTREAM_LIMIT', 1000))
+    
+    # Worker processes sharing the listening socket (0 = one per CPU core);
+    # more than one implies the sqlite store backend
+    WORKERS = int(os.environ.get('WORKERS', 1))
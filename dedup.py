@@ -0,0 +1,78 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class DuplicateFilter:
+    """Recently seen request keys and the request that first sent each.
+
+    A key is a 16-byte digest of the idempotency header when one is
+    configured, or of the method, URL and body otherwise. Keys are kept in
+    the order they were first seen and all live for the same TTL, so
+    expired ones are always at the front: a lookup is one dict probe, and
+    memory is capped at max_keys entries by dropping the oldest key.
+    """
+
+    def __init__(self, header, ttl, max_keys):
+        self.header = header
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.duplicates = 0
+        self.evicted = 0
+        # digest -> (id of the first request, expiry time)
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, method, url, headers, body):
+        """Digest identifying a request, or None if it is not deduplicated.
+
+        With an idempotency header, requests without it are never
+        duplicates; a streamed body (body None) is only keyed by header.
+        """
+        if self.header:
+            value = headers.get(self.header)
+            if not value:
+                return None
+            return hashlib.blake2b(value.encode('utf-8', 'surrogateescape'), digest_size=16).digest()
+        if body is None:
+            return None
+        digest = hashlib.blake2b(f"{method} {url}\n".encode('utf-8', 'surrogateescape'), digest_size=16)
+        digest.update(body)
+        return digest.digest()
+
+    def claim(self, key, request_id):
+        """Id of the request that first sent key, or None after recording request_id as that request"""
+        now = time.monotonic()
+        with self._lock:
+            while self._keys:
+                oldest, (_, expires) = next(iter(self._keys.items()))
+                if expires > now:
+                    break
+                del self._keys[oldest]
+            original = self._keys.get(key)
+            if original is not None:
+                self.duplicates += 1
+                return original[0]
+            self._keys[key] = (request_id, now + self.ttl)
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+                self.evicted += 1
+            return None
+
+    def release(self, key, request_id):
+        """Forget key if request_id still holds it, e.g. when that request was turned away"""
+        with self._lock:
+            original = self._keys.get(key)
+            if original is not None and original[0] == request_id:
+                del self._keys[key]
+
+    def stats(self):
+        return {
+            'keyed_by': self.header or 'body hash',
+            'keys': len(self._keys),
+            'max_keys': self.max_keys,
+            'ttl': self.ttl,
+            'duplicates': self.duplicates,
+            'evicted': self.evicted
+        }
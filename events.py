@@ -0,0 +1,103 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSubscriber:
+    """Subscriber buffer read on an event loop.
+
+    Publishers on other threads hand events to the loop with
+    call_soon_threadsafe, so waiting for events never ties up an executor
+    thread.
+    """
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put_nowait(self, message):
+        if self.queue.full():
+            raise queue.Full
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    def get(self):
+        return self.queue.get()
+
+
+class EventBroker:
+    """Fans out new-request summaries to Server-Sent Events subscribers.
+
+    Every subscriber gets its own bounded buffer; when a slow client falls
+    behind, further events for it are dropped instead of piling up in memory.
+    """
+
+    def __init__(self, buffer_size, keepalive_seconds=15):
+        self.buffer_size = buffer_size
+        self.keepalive_seconds = keepalive_seconds
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.buffer_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def subscribe_async(self, loop):
+        subscriber = AsyncSubscriber(loop, self.buffer_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event_type, payload):
+        """Serialize once and offer the event to every subscriber"""
+        if not self._subscribers:
+            return
+        message = f"event: {event_type}\ndata: {json.dumps(payload)}\n\n"
+        with self._lock:
+            subscribers = list(self._subscribers)
+        self.published += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                self.dropped += 1
+            except RuntimeError:
+                # The subscriber's event loop has already closed
+                self.unsubscribe(subscriber)
+
+    def stream(self, subscriber):
+        """Generator of SSE messages for one subscriber, with keepalive comments"""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    yield subscriber.get(timeout=self.keepalive_seconds)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        return {
+            'subscribers': len(self._subscribers),
+            'buffer_size': self.buffer_size,
+            'published': self.published,
+            'dropped': self.dropped
+        }
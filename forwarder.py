@@ -0,0 +1,368 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import get_environ_proxies
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import metrics
+from breaker import open_circuit_result
+from compression import gzip_job_body
+
+logger = logging.getLogger(__name__)
+
+# Headers that describe the incoming connection rather than the request;
+# the HTTP client sets its own when forwarding
+HOP_BY_HOP_HEADERS = frozenset([
+    'host', 'content-length', 'connection', 'transfer-encoding', 'keep-alive',
+    'proxy-connection', 'te', 'trailer', 'upgrade'
+])
+
+# Sockets opened by the upstream pools (reconnects of dropped keep-alive
+# connections included), used to report connection reuse
+connection_stats = {'opened': 0}
+_connection_stats_lock = threading.Lock()
+
+
+def _count_connection():
+    with _connection_stats_lock:
+        connection_stats['opened'] += 1
+
+
+def upstream_failed(result):
+    """Whether a forward result is a failure: no response, or a 5xx one"""
+    return result['status'] != 'forwarded' or result.get('status_code', 0) >= 500
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        super().connect()
+        _count_connection()
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        super().connect()
+        _count_connection()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools count the sockets they open"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool
+        }
+
+
+class UpstreamSessions:
+    """Keep-alive requests.Session per upstream target with a sized connection pool"""
+
+    def __init__(self, pool_size, connect_timeout, read_timeout):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        # Upstream calls currently waiting on a target
+        self.in_flight = 0
+
+    def session_for(self, target):
+        """Return the shared session (and connection pool) of a target"""
+        session = self._sessions.get(target.name)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(target.name)
+                if session is None:
+                    session = requests.Session()
+                    # Resolve proxy settings once instead of scanning the
+                    # environment on every forwarded request
+                    session.trust_env = False
+                    session.proxies = get_environ_proxies(target.url)
+                    adapter = _PooledAdapter(
+                        pool_connections=1,
+                        pool_maxsize=target.pool_size or self.pool_size,
+                        max_retries=0
+                    )
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._sessions[target.name] = session
+        return session
+
+    def timeout_for(self, target):
+        return target.timeout or self.timeout
+
+    def call_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def call_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def count_request(self):
+        """Count an upstream call that got a response"""
+        with self._lock:
+            self.requests += 1
+
+    def stats(self):
+        """Connection reuse counters across all target pools"""
+        opened = connection_stats['opened']
+        return {
+            'targets': len(self._sessions),
+            'pool_size': self.pool_size,
+            'requests': self.requests,
+            'in_flight': self.in_flight,
+            'new_connections': opened,
+            'reused_connections': max(self.requests - opened, 0)
+        }
+
+
+def forward_headers(headers):
+    """Incoming headers to send upstream, without the hop-by-hop ones"""
+    return {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+
+
+def forward_request(job, target, sessions):
+    """Send a captured request to one upstream target and return a result dict"""
+    started = time.perf_counter()
+    compressed = gzip_job_body(job) if target.compress else None
+    sessions.call_started()
+    try:
+        session = sessions.session_for(target)
+        if compressed is not None:
+            # Buffered body sent gzipped, Content-Encoding set in its headers
+            response = session.post(
+                target.url,
+                data=compressed[0],
+                headers=compressed[1],
+                timeout=sessions.timeout_for(target)
+            )
+        elif job.get('body') is not None:
+            # Passthrough: the original bytes, Content-Type included in headers
+            response = session.post(
+                target.url,
+                data=job['body'],
+                headers=job['headers'],
+                timeout=sessions.timeout_for(target)
+            )
+        elif job.get('body_path'):
+            # Large body spilled to disk: stream it from the file
+            with open(job['body_path'], 'rb') as body:
+                response = session.post(
+                    target.url,
+                    data=body,
+                    headers=job['headers'],
+                    timeout=sessions.timeout_for(target)
+                )
+        elif job['method'] == 'POST':
+            response = session.post(
+                target.url,
+                json=job.get('json'),
+                data=job.get('data'),
+                headers=job['headers'],
+                timeout=sessions.timeout_for(target)
+            )
+        else:
+            response = session.get(
+                target.url,
+                params=job.get('params'),
+                headers=job['headers'],
+                timeout=sessions.timeout_for(target)
+            )
+        sessions.count_request()
+        logger.info(f"Forwarded {job['method']} request to {target.url}")
+        result = {
+            'status': 'forwarded',
+            'status_code': response.status_code,
+            'response_bytes': len(response.content),
+            'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+    except Exception as e:
+        logger.error(f"Error forwarding request to {target.name}: {str(e)}")
+        result = {
+            'status': 'error',
+            'error': str(e),
+            'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+    finally:
+        sessions.call_finished()
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    metrics.observe_forward(target.name, started, result)
+    return result
+
+
+def combine_results(results):
+    """Overall forward result from the per-target results"""
+    if not results:
+        # None of the job's targets is configured any more, e.g. a dead
+        # letter replayed after its routes were removed
+        return {
+            'status': 'error',
+            'error': 'No configured target to forward to',
+            'targets': {},
+            'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+    forwarded = [r for r in results.values() if r['status'] == 'forwarded']
+    if len(forwarded) == len(results):
+        status = 'forwarded'
+    elif forwarded:
+        status = 'partial'
+    else:
+        status = 'error'
+    combined = {
+        'status': status,
+        'targets': results,
+        'finished_at': max(r['finished_at'] for r in results.values())
+    }
+    status_codes = [r['status_code'] for r in forwarded]
+    if status_codes:
+        combined['status_code'] = max(status_codes)
+        combined['response_bytes'] = sum(r.get('response_bytes', 0) for r in forwarded)
+    # Targets are forwarded concurrently, so the slowest one is the forward time
+    elapsed = [r['elapsed_ms'] for r in results.values() if 'elapsed_ms' in r]
+    if elapsed:
+        combined['elapsed_ms'] = max(elapsed)
+    # Set when the requests went upstream inside batches (batching.py)
+    batches = [r['batch'] for r in results.values() if 'batch' in r]
+    if batches:
+        combined['batch'] = ', '.join(batches)
+    errors = [r['error'] for r in results.values() if 'error' in r]
+    if errors:
+        if len(results) > 1:
+            errors = [f"{name}: {r['error']}" for name, r in results.items() if 'error' in r]
+        combined['error'] = '; '.join(errors)
+    return combined
+
+
+class FanOutForwarder:
+    """Forwards each job to all of its targets concurrently.
+
+    With several targets the total latency is that of the slowest target
+    rather than the sum; a single target is forwarded on the calling thread.
+    Targets whose circuit breaker is open fail fast without being called.
+    """
+
+    def __init__(self, router, sessions, workers, breakers=None):
+        self.router = router
+        self.sessions = sessions
+        self.breakers = breakers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fan-out')
+
+    def __call__(self, job):
+        names = job.get('targets') or list(self.router.targets)
+        targets = [self.router.targets[name] for name in names if name in self.router.targets]
+        results = {}
+        if self.breakers is not None:
+            for target in targets:
+                if not self.breakers.allow(target.name):
+                    results[target.name] = open_circuit_result(target.name)
+            targets = [target for target in targets if target.name not in results]
+        if len(targets) == 1:
+            target = targets[0]
+            results[target.name] = self._forward(job, target)
+        else:
+            futures = {
+                target.name: self._executor.submit(self._forward, job, target)
+                for target in targets
+            }
+            results.update((name, future.result()) for name, future in futures.items())
+        return combine_results(results)
+
+    def _forward(self, job, target):
+        result = forward_request(job, target, self.sessions)
+        if self.breakers is not None:
+            self.breakers.record(target.name, result)
+        return result
+
+
+class ForwardQueue:
+    """Bounded in-process queue drained by a pool of forwarder threads"""
+
+    def __init__(self, maxsize, workers, forward, on_result):
+        self.maxsize = maxsize
+        self.forward = forward
+        self.on_result = on_result
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+        self.forwarded = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f'forwarder-{i + 1}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Started {self.workers} forwarder workers")
+
+    def submit(self, job):
+        """Queue a job without blocking; returns False when the queue is full"""
+        self.start()
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def holds_body(self, path):
+        """Whether a queued job still needs a spilled body"""
+        with self._queue.mutex:
+            return any(job.get('body_path') == path for job in self._queue.queue)
+
+    def stats(self):
+        return {
+            'queue_depth': self.depth(),
+            'queue_size': self.maxsize,
+            # Configured pool size; the threads start with the first submit
+            'workers': self.workers,
+            'started': bool(self._threads),
+            'forwarded': self.forwarded,
+            'failed': self.failed,
+            'rejected': self.rejected
+        }
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                result = self.forward(job)
+                with self._lock:
+                    if upstream_failed(result):
+                        self.failed += 1
+                    else:
+                        self.forwarded += 1
+                self.on_result(job, result)
+            except Exception as e:
+                logger.error(f"Forwarder worker error: {str(e)}")
+            finally:
+                self._queue.task_done()
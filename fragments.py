@@ -0,0 +1,52 @@
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """HTML fragments of captured requests, each rendered once.
+
+    Captured requests only change when their forward result does, so a
+    fragment is kept with the result it was rendered from and re-rendered
+    only once that differs. Fragments are dropped with their record when the
+    store evicts or clears it, and least recently rendered first beyond
+    max_entries, as only the newest requests are rendered server-side.
+    """
+
+    def __init__(self, render, max_entries):
+        self.render = render
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # record id -> (forward result rendered, html)
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, record):
+        """HTML of a record, rendered now only if its cached copy is missing or stale"""
+        cached = self._fragments.get(record.id)
+        if cached is not None and cached[0] == record.forward:
+            self.hits += 1
+            return cached[1]
+        html = self.render(record)
+        with self._lock:
+            self.misses += 1
+            self._fragments[record.id] = (record.forward, html)
+            self._fragments.move_to_end(record.id)
+            if len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+        return html
+
+    def discard(self, record):
+        with self._lock:
+            self._fragments.pop(record.id, None)
+
+    def clear(self, last_id=None):
+        with self._lock:
+            self._fragments.clear()
+
+    def stats(self):
+        return {
+            'fragments': len(self._fragments),
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -0,0 +1,260 @@
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+
+from store import RequestRecord
+
+logger = logging.getLogger(__name__)
+
+# Entry header: payload length, CRC32 of the payload, entry type
+HEADER = struct.Struct('>IIB')
+
+ENTRY_REQUEST = 1
+ENTRY_FORWARD = 2
+ENTRY_CLEAR = 3
+
+SEGMENT_PATTERN = re.compile(r'^segment-(\d{8})\.log$')
+
+
+class Journal:
+    """Segmented append-only on-disk journal of captured requests.
+
+    Appends only queue the entry (requests as the record itself); a single
+    writer thread serializes everything queued since its last pass, writes
+    it and fsyncs once (group commit), so request threads never wait on the
+    disk or the encoding. At most max_pending entries are queued; beyond
+    that, requests and forward results are dropped and counted instead of
+    piling up in memory. Segments rotate at segment_bytes and only the
+    newest max_segments are kept.
+    """
+
+    def __init__(self, directory, segment_bytes, max_segments, fsync=True, max_pending=10000):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.fsync = fsync
+        self.max_pending = max_pending
+        self.appended = 0
+        self.dropped = 0
+        self.commits = 0
+        self._pending = []
+        self._cond = threading.Condition()
+        self._file = None
+        self._segment_number = 0
+        self._segment_size = 0
+        self._thread = None
+        self._closing = False
+        os.makedirs(directory, exist_ok=True)
+
+    # Writing
+
+    def start(self):
+        """Open the newest segment (or a fresh one if it is full) and start
+        the writer thread"""
+        segments = self._segments()
+        if segments and os.path.getsize(segments[-1][1]) < self.segment_bytes:
+            # Keep appending where the last run stopped, so restarts don't
+            # use up the retained segments
+            self._segment_number, path = segments[-1]
+            self._reopen(path)
+        else:
+            self._segment_number = segments[-1][0] if segments else 0
+            self._rotate()
+        self._thread = threading.Thread(target=self._run, name='journal-writer', daemon=True)
+        self._thread.start()
+
+    def append(self, entry_type, payload):
+        with self._cond:
+            # Clears are always kept: dropping one would bring cleared
+            # requests back on recovery
+            if len(self._pending) >= self.max_pending and entry_type != ENTRY_CLEAR:
+                self.dropped += 1
+                return
+            self._pending.append((entry_type, payload))
+            self._cond.notify()
+
+    def append_request(self, record):
+        # Serialized on the writer thread
+        self.append(ENTRY_REQUEST, record)
+
+    def append_forward(self, record):
+        self.append(ENTRY_FORWARD, {'id': record.id, 'forward': record.forward})
+
+    def append_clear(self, last_id):
+        self.append(ENTRY_CLEAR, {'last_id': last_id})
+
+    def close(self):
+        """Write out everything still queued and stop the writer"""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                batch, self._pending = self._pending, []
+                closing = self._closing
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    logger.error(f"Error writing journal: {str(e)}")
+            if closing:
+                self._file.close()
+                return
+
+    def _write_batch(self, batch):
+        for entry_type, payload in batch:
+            if entry_type == ENTRY_REQUEST:
+                payload = payload.to_state()
+            data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+            if entry_type == ENTRY_CLEAR:
+                # Everything before a clear is obsolete: start over in a new
+                # segment and drop the older ones
+                self._rotate()
+                self._write_entry(entry_type, data)
+                for _, path in self._segments()[:-1]:
+                    os.remove(path)
+                continue
+            if self._segment_size >= self.segment_bytes:
+                self._rotate()
+            self._write_entry(entry_type, data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.appended += len(batch)
+        self.commits += 1
+
+    def _write_entry(self, entry_type, data):
+        self._file.write(HEADER.pack(len(data), zlib.crc32(data), entry_type))
+        self._file.write(data)
+        self._segment_size += HEADER.size + len(data)
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+        self._segment_number += 1
+        path = os.path.join(self.directory, f"segment-{self._segment_number:08d}.log")
+        self._file = open(path, 'ab')
+        self._segment_size = 0
+        segments = self._segments()
+        for _, old_path in segments[:max(len(segments) - self.max_segments, 0)]:
+            os.remove(old_path)
+
+    def _reopen(self, path):
+        """Open a segment for appending, cutting off a torn last entry"""
+        end = 0
+        if os.path.getsize(path):
+            with open(path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    for offset, _, _ in self._entries(view, 0, decode=True):
+                        end = offset + HEADER.size + HEADER.unpack_from(view, offset)[0]
+        self._file = open(path, 'ab')
+        self._file.truncate(end)
+        self._segment_size = end
+
+    def _segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                segments.append((int(match.group(1)), os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    # Recovery
+
+    def recover(self, store):
+        """Rebuild store from the journal; call before start().
+
+        A first pass only hops from header to header to find the last clear
+        marker and count the requests after it, so the second pass can skip
+        requests the store would evict anyway without decoding them.
+        """
+        segments = []
+        for _, path in self._segments():
+            if os.path.getsize(path) == 0:
+                continue
+            with open(path, 'rb') as f:
+                segments.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        try:
+            start_segment, start_offset, request_count = 0, 0, 0
+            for index, view in enumerate(segments):
+                for offset, entry_type, _ in self._entries(view, 0, decode=False):
+                    if entry_type == ENTRY_CLEAR:
+                        start_segment, start_offset, request_count = index, offset, 0
+                    elif entry_type == ENTRY_REQUEST:
+                        request_count += 1
+
+            skip = max(request_count - store.max_requests, 0)
+            restored = 0
+            for index in range(start_segment, len(segments)):
+                offset = start_offset if index == start_segment else 0
+                for _, entry_type, payload in self._entries(segments[index], offset, decode=True, skip=skip):
+                    if entry_type == ENTRY_REQUEST:
+                        if payload is None:
+                            skip -= 1
+                            continue
+                        store.restore(RequestRecord.from_state(payload))
+                        restored += 1
+                    elif entry_type == ENTRY_FORWARD:
+                        record = store.get(payload['id'])
+                        if record is not None:
+                            record.forward = payload['forward']
+                            store.counters.record_forward(payload['forward'])
+                    elif entry_type == ENTRY_CLEAR:
+                        store.reserve_ids(payload['last_id'])
+            logger.info(f"Recovered {restored} requests from journal in {self.directory}")
+            return restored
+        finally:
+            for view in segments:
+                view.close()
+
+    def _entries(self, view, offset, decode, skip=0):
+        """Yield (offset, type, payload) up to the end or first damaged entry.
+
+        Payloads are only decoded (and checksummed) when decode is set, and
+        the first `skip` request entries are yielded with a None payload.
+        """
+        end = len(view)
+        while offset + HEADER.size <= end:
+            length, crc, entry_type = HEADER.unpack_from(view, offset)
+            data_start = offset + HEADER.size
+            if data_start + length > end:
+                logger.warning(f"Truncated journal entry at offset {offset}")
+                return
+            payload = None
+            if decode and not (entry_type == ENTRY_REQUEST and skip > 0):
+                data = view[data_start:data_start + length]
+                if zlib.crc32(data) != crc:
+                    logger.warning(f"Corrupt journal entry at offset {offset}")
+                    return
+                payload = json.loads(data)
+            elif entry_type == ENTRY_REQUEST:
+                skip -= 1
+            yield offset, entry_type, payload
+            offset = data_start + length
+
+    def stats(self):
+        return {
+            'directory': self.directory,
+            'segments': len(self._segments()),
+            'segment': self._segment_number,
+            'appended': self.appended,
+            'commits': self.commits,
+            'pending': len(self._pending),
+            'dropped': self.dropped
+        }
@@ -0,0 +1,182 @@
+import bisect
+import threading
+import time
+
+# Upper bounds in seconds, from parsing a small body to a slow upstream
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels.
+
+    An observation is a bisect plus two increments under an uncontended
+    lock; the cumulative counts Prometheus expects are only built when
+    /metrics is scraped.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        for labels, values in series:
+            count = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), values):
+                count += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, labels, [('le', le)]), count
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), values[-1]
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), count
+
+
+class Gauge:
+    """Value read from a callback when /metrics is scraped"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, read):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def samples(self):
+        yield self.name, '', self.read()
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Registry:
+    """Metrics exposed by /metrics, in registration order"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def exposition(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception:
+                # A gauge whose source is unavailable is left out of the scrape
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{labels} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    'webhook_requests_total', 'Webhook requests handled, by method and response status',
+    ('method', 'status')
+))
+FORWARDS = registry.register(Counter(
+    'webhook_forwards_total', 'Forwards to an upstream target, by outcome (error or status class)',
+    ('target', 'outcome')
+))
+REJECTED = registry.register(Counter(
+    'webhook_rejected_total', 'Webhook requests turned away before their body was read, by reason',
+    ('reason',)
+))
+PARSE_SECONDS = registry.register(Histogram(
+    'webhook_ingest_parse_seconds', 'Time spent reading and parsing an incoming request'
+))
+STORE_SECONDS = registry.register(Histogram(
+    'webhook_store_seconds', 'Time spent adding a captured request to the store'
+))
+FORWARD_SECONDS = registry.register(Histogram(
+    'webhook_forward_seconds', 'Upstream forward latency per target', ('target',)
+))
+BATCH_SIZE = registry.register(Histogram(
+    'webhook_batch_size', 'Requests per batched upstream delivery',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+))
+DASHBOARD_SECONDS = registry.register(Histogram(
+    'webhook_dashboard_render_seconds', 'Time spent rendering /dashboard'
+))
+
+
+def observe_forward(target, started, result):
+    """Record the latency and outcome of one forward to a target"""
+    FORWARD_SECONDS.observe(time.perf_counter() - started, target)
+    status_code = result.get('status_code')
+    FORWARDS.inc(target, f"{status_code // 100}xx" if status_code else result['status'])
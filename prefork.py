@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Pre-fork launcher: WORKERS processes serving one listening socket.
+
+The master binds the socket and forks the workers before the app is
+imported, so every worker builds its own store, threads and connection
+pools. Captured requests live in the shared SQLite store, with ids handed
+out by a counter in shared memory, and so do dead letters, so /dashboard
+and the API give the same answers whichever worker serves them. Forwarder,
+retry and event counters in /health belong to the worker that answers.
+Workers that die are restarted.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Set in the master before forking; the app reads them when imported by a worker
+shared_ids = None
+worker_index = None
+
+
+def run_worker(index, sock):
+    global worker_index
+    worker_index = index
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    import app
+    try:
+        app.serve(sock)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        app.received_requests.close()
+
+
+def spawn(index, sock):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(index, sock)
+        except Exception as e:
+            logger.error(f"Worker {index} failed: {str(e)}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    global shared_ids
+    workers = Config.WORKERS or os.cpu_count() or 1
+    if Config.STORE_BACKEND != 'sqlite':
+        logger.warning("Several workers need a shared store, using the sqlite store backend")
+        Config.STORE_BACKEND = 'sqlite'
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('0.0.0.0', Config.LISTEN_PORT))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+    shared_ids = multiprocessing.Value('q', 0)
+
+    logger.info(f"Starting {workers} workers on port {Config.LISTEN_PORT}")
+    children = {spawn(index, sock): index for index in range(1, workers + 1)}
+
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        logger.warning(f"Worker {index} exited with status {status}, restarting it")
+        time.sleep(1)
+        children[spawn(index, sock)] = index
+    sock.close()
+
+
+if __name__ == '__main__':
+    # The app imports this module as `prefork`; reuse it when run as a script
+    sys.modules.setdefault('prefork', sys.modules[__name__])
+    main()
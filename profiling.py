@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class IngestProfiler:
+    """Statistical profiler of the ingest path, switched on on demand.
+
+    While running, a background thread samples the stack of every thread
+    each `interval` seconds and keeps the samples taken inside one of the
+    `entry_points` (the webhook handlers). Nothing is traced, so request
+    threads pay no overhead; the report counts, per function, the samples
+    where it was running (self) or on the stack (total).
+    """
+
+    def __init__(self):
+        # Code objects of the functions that make up the ingest path
+        self.entry_points = set()
+        self.samples = 0
+        self.started_at = None
+        self.seconds = 0
+        self._self = Counter()
+        self._total = Counter()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds, interval):
+        """Start a profiling window; returns False if one is already running"""
+        with self._lock:
+            if self.running:
+                return False
+            self.samples = 0
+            self._self.clear()
+            self._total.clear()
+            self.started_at = time.time()
+            self.seconds = seconds
+            self._thread = threading.Thread(
+                target=self._run, args=(seconds, interval), name='ingest-profiler', daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def join(self):
+        self._thread.join()
+
+    def _run(self, seconds, interval):
+        own = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._sample(frame)
+            time.sleep(interval)
+
+    def _sample(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            if frame.f_code in self.entry_points:
+                break
+            frame = frame.f_back
+        else:
+            # Not handling a webhook
+            return
+        self.samples += 1
+        self._self[stack[0]] += 1
+        for code in set(stack):
+            self._total[code] += 1
+
+    def report(self, top=25):
+        """Hot functions of the last profiling window, most self samples first"""
+        samples = self.samples or 1
+        functions = [
+            {
+                'function': describe(code),
+                'self': count,
+                'self_percent': round(count * 100 / samples, 1),
+                'total': self._total[code],
+                'total_percent': round(self._total[code] * 100 / samples, 1)
+            }
+            for code, count in self._self.most_common(top)
+        ]
+        return {
+            'started_at': self.started_at,
+            'seconds': self.seconds,
+            'running': self.running,
+            'samples': self.samples,
+            'functions': functions
+        }
+
+
+def describe(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
@@ -0,0 +1,265 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Job fields that are persisted with a dead letter (the record itself is not)
+JOB_FIELDS = (
+    'request_id', 'method', 'targets', 'headers', 'json', 'data', 'body', 'body_path',
+    'params', 'attempt'
+)
+
+
+def dead_letter_entry(job, result):
+    """JSON-serializable dead letter for a job that ran out of attempts"""
+    entry = {field: job.get(field) for field in JOB_FIELDS}
+    if entry['body'] is not None:
+        # Raw passthrough bytes survive the JSON round trip via surrogate escapes
+        entry['body'] = entry['body'].decode('utf-8', 'surrogateescape')
+    entry['error'] = result.get('error') or f"HTTP {result.get('status_code')}"
+    entry['failed_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return entry
+
+
+def failed_targets(result):
+    """Names of the targets whose forward should be retried"""
+    return [
+        name for name, target_result in result.get('targets', {}).items()
+        if target_result['status'] == 'error' or target_result.get('status_code', 0) >= 500
+    ]
+
+
+def circuit_open_only(result, names):
+    """Whether the named targets all failed fast on an open circuit, without
+    an upstream call"""
+    return all(result['targets'][name].get('circuit_open') for name in names)
+
+
+class RetryScheduler:
+    """Delay queue for failed forwards, with exponential backoff and jitter.
+
+    Pending retries live in a single heap ordered by due time and one timer
+    thread sleeps until the earliest one is due, so 100k pending retries cost
+    100k heap entries rather than 100k threads or timers.
+    """
+
+    def __init__(self, submit, max_attempts, base_delay, max_delay, dead_letters):
+        self.submit = submit
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.dead_letters = dead_letters
+        self.retried = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, job, result, wait=None):
+        """Schedule the next attempt of a failed job.
+
+        With `wait`, the seconds until the open circuits of its targets let
+        calls through again, the job was not sent upstream at all: it is
+        retried once they do, without spending an attempt.
+
+        Returns the delay in seconds, or None when the job ran out of
+        attempts and was moved to the dead-letter queue.
+        """
+        attempt = job.get('attempt', 1)
+        if wait is not None:
+            # Spread over a base delay, as only one probe gets through
+            delay = wait + random.uniform(0, max(self.base_delay, 1))
+        elif attempt >= self.max_attempts:
+            self.dead_letters.add(job, result)
+            return None
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+            delay = random.uniform(delay / 2, delay)
+            job['attempt'] = attempt + 1
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='retry-scheduler', daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), job))
+            if self._heap[0][2] is job:
+                self._cond.notify()
+        return delay
+
+    def pending(self):
+        return len(self._heap)
+
+    def holds_body(self, path):
+        """Whether a pending retry still needs a spilled body"""
+        with self._cond:
+            return any(job.get('body_path') == path for _, _, job in self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                due = []
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+            for job in due:
+                if self.submit(job):
+                    self.retried += 1
+                else:
+                    # Forward queue is full: try again shortly without
+                    # spending an attempt
+                    with self._cond:
+                        heapq.heappush(self._heap, (time.monotonic() + 1, next(self._seq), job))
+
+    def stats(self):
+        return {
+            'pending': self.pending(),
+            'retried': self.retried,
+            'max_attempts': self.max_attempts
+        }
+
+
+class DeadLetterQueue:
+    """Forwards that ran out of retries, persisted as JSON lines.
+
+    New dead letters are appended to the file; it is rewritten when entries
+    are removed (replayed). The oldest entries are dropped beyond
+    max_entries, and the file is compacted once it holds twice that many
+    lines, so the rewrite is amortized over max_entries appends.
+    """
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        # Lines in the file, including entries already dropped from memory
+        self._file_lines = 0
+        self._load()
+
+    def add(self, job, result):
+        entry = dead_letter_entry(job, result)
+        with self._lock:
+            entry['id'] = next(self._seq)
+            self._entries[entry['id']] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self._file_lines >= 2 * self.max_entries:
+                self._rewrite()
+            else:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(entry) + '\n')
+                self._file_lines += 1
+        logger.warning(f"Request {entry['request_id']} moved to dead-letter queue: {entry['error']}")
+
+    def take(self, limit=None):
+        """Remove and return the oldest entries"""
+        with self._lock:
+            count = len(self._entries) if limit is None else min(limit, len(self._entries))
+            taken = [self._entries.popitem(last=False)[1] for _ in range(count)]
+            if taken:
+                self._rewrite()
+        return taken
+
+    def list(self, limit=20):
+        """Newest entries first"""
+        with self._lock:
+            return list(itertools.islice(reversed(self._entries.values()), limit))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def holds_body(self, path):
+        """Whether a dead letter still needs a spilled body"""
+        with self._lock:
+            return any(entry.get('body_path') == path for entry in self._entries.values())
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._entries[entry['id']] = entry
+                self._file_lines += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self._entries:
+            self._seq = itertools.count(max(self._entries) + 1)
+        logger.info(f"Loaded {len(self._entries)} dead letters from {self.path}")
+
+    def _rewrite(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp_path, self.path)
+        self._file_lines = len(self._entries)
+
+
+class DeadLetterReplayer:
+    """Resubmits dead letters in the background at a controlled rate"""
+
+    def __init__(self, dead_letters, submit):
+        self.dead_letters = dead_letters
+        self.submit = submit
+        self.replayed = 0
+        self.remaining = 0
+        self._entries = []
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, rate, limit=None):
+        """Start replaying; returns the number of entries, or None if a
+        replay is already running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return None
+            entries = self.dead_letters.take(limit)
+            self._entries = entries
+            self.remaining = len(entries)
+            self._thread = threading.Thread(
+                target=self._run, args=(entries, rate), name='dead-letter-replay', daemon=True
+            )
+            self._thread.start()
+            return len(entries)
+
+    def _run(self, entries, rate):
+        interval = 1.0 / rate
+        for index, entry in enumerate(entries):
+            started = time.monotonic()
+            job = {field: entry.get(field) for field in JOB_FIELDS}
+            if job['body'] is not None:
+                job['body'] = job['body'].encode('utf-8', 'surrogateescape')
+            job['attempt'] = 1
+            while not self.submit(job):
+                time.sleep(interval)
+            self._entries = entries[index + 1:]
+            self.replayed += 1
+            self.remaining -= 1
+            time.sleep(max(interval - (time.monotonic() - started), 0))
+        logger.info(f"Replayed {len(entries)} dead letters")
+
+    def holds_body(self, path):
+        """Whether a dead letter waiting to be replayed still needs a spilled body"""
+        return any(entry.get('body_path') == path for entry in self._entries)
+
+    def stats(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'remaining': self.remaining,
+            'replayed': self.replayed
+        }
@@ -0,0 +1,130 @@
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGET = 'default'
+
+
+class Target:
+    """An upstream target with its own connection pool size, timeout and compression"""
+
+    __slots__ = ('name', 'url', 'timeout', 'pool_size', 'compress', 'matchers')
+
+    def __init__(self, name, url, timeout=None, pool_size=None, compress=False, matchers=()):
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.compress = compress
+        self.matchers = tuple(matchers)
+
+    def matches(self, method, path, headers, data):
+        for matcher in self.matchers:
+            if not matcher(method, path, headers, data):
+                return False
+        return True
+
+
+def _method_matcher(methods):
+    methods = frozenset(m.upper() for m in methods)
+    return lambda method, path, headers, data: method in methods
+
+
+def _path_matcher(pattern):
+    regex = re.compile(pattern)
+    return lambda method, path, headers, data: regex.search(path) is not None
+
+
+def _header_matcher(name, pattern):
+    # Header names are case-insensitive; Router.match lower-cases the request's
+    name = name.lower()
+    regex = re.compile(pattern)
+    return lambda method, path, headers, data: regex.search(headers.get(name, '')) is not None
+
+
+def _json_matcher(field, expected):
+    keys = tuple(field.split('.'))
+
+    def match(method, path, headers, data):
+        value = data
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                return False
+            value = value[key]
+        return value == expected
+    return match
+
+
+def compile_route(route, defaults, compress=False):
+    """Turn one routing-table entry into a Target with precompiled matchers.
+
+    Entry keys: name, url, and optionally methods (list), path (regex on the
+    request path), headers ({name: regex}), json ({dotted.field: value}),
+    timeout (seconds), pool_size and compress (gzip forwarded bodies,
+    defaulting to FORWARD_GZIP).
+    """
+    matchers = []
+    if route.get('methods'):
+        matchers.append(_method_matcher(route['methods']))
+    if route.get('path'):
+        matchers.append(_path_matcher(route['path']))
+    for name, pattern in (route.get('headers') or {}).items():
+        matchers.append(_header_matcher(name, pattern))
+    for field, expected in (route.get('json') or {}).items():
+        matchers.append(_json_matcher(field, expected))
+    timeout = route.get('timeout')
+    return Target(
+        route['name'],
+        route['url'],
+        timeout=(defaults[0], float(timeout)) if timeout else None,
+        pool_size=route.get('pool_size'),
+        compress=bool(route.get('compress', compress)),
+        matchers=matchers
+    )
+
+
+class Router:
+    """Routing table compiled once at startup.
+
+    Without routes, every request goes to the single REDIRECT_URL target.
+    """
+
+    def __init__(self, routes, redirect_url, default_timeout, compress=False):
+        self.targets = {}
+        for route in routes:
+            target = compile_route(route, default_timeout, compress)
+            if target.name in self.targets:
+                raise ValueError(f"Duplicate route name: {target.name}")
+            self.targets[target.name] = target
+        if not self.targets and redirect_url:
+            self.targets[DEFAULT_TARGET] = Target(DEFAULT_TARGET, redirect_url, compress=compress)
+        self._targets = tuple(self.targets.values())
+        # Whether matching needs the parsed request body
+        self.uses_data = any(route.get('json') for route in routes)
+        # Whether requests to sub-paths are accepted, for path rules to match
+        self.uses_path = any(route.get('path') for route in routes)
+        self._uses_headers = any(route.get('headers') for route in routes)
+
+    def match(self, method, path, headers, data):
+        """Names of the targets a request should be forwarded to"""
+        if self._uses_headers:
+            headers = {name.lower(): value for name, value in headers.items()}
+        return [
+            target.name for target in self._targets
+            if target.matches(method, path, headers, data)
+        ]
+
+
+def load_routes(routes_json, routes_file):
+    """Read the routing table from ROUTES (JSON) or ROUTES_FILE"""
+    if routes_file:
+        with open(routes_file) as f:
+            routes = json.load(f)
+    elif routes_json:
+        routes = json.loads(routes_json)
+    else:
+        return []
+    logger.info(f"Loaded {len(routes)} routes")
+    return routes
@@ -0,0 +1,262 @@
+import bisect
+import json
+import logging
+import queue
+import re
+import threading
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Words of a name or value: runs of letters and digits
+WORD = re.compile(r'[^\W_]+')
+
+# Leading characters of a string value that are indexed
+MAX_VALUE_CHARS = 256
+
+# Records read per store page when indexing the requests stored at startup
+BACKFILL_PAGE = 1000
+
+
+def flatten(value, path=''):
+    """(dotted.path, scalar) pairs of a parsed JSON payload; list items share their list's path"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{path}.{key}" if path else str(key))
+    elif isinstance(value, list):
+        for item in value:
+            yield from flatten(item, path)
+    else:
+        yield path, value
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value[:MAX_VALUE_CHARS].lower()
+    return json.dumps(value)
+
+
+def record_terms(record, max_terms):
+    """Index terms of a captured request.
+
+    Every header, query parameter and JSON field gives an exact
+    `name=value` term plus the words of its name and value; the method and
+    URL give words too. Non-JSON bodies are indexed by their words. Terms
+    are kept in the order they are found (a dict, not a set), so the same
+    ones are cut off beyond max_terms on every run.
+    """
+    fields = list(record.headers.items())
+    if record.query_params:
+        fields.extend(record.query_params.items())
+    data = record.data
+    if isinstance(data, (dict, list)):
+        fields.extend(flatten(data))
+    terms = dict.fromkeys([record.method.lower()])
+    terms.update(dict.fromkeys(WORD.findall(record.url.lower())))
+    if isinstance(data, str):
+        terms.update(dict.fromkeys(WORD.findall(_text(data))))
+    for name, value in fields:
+        name, value = name.lower(), _text(value)
+        terms[f"{name}={value}"] = None
+        terms.update(dict.fromkeys(WORD.findall(name)))
+        terms.update(dict.fromkeys(WORD.findall(value)))
+        if len(terms) >= max_terms:
+            break
+    return list(terms)[:max_terms]
+
+
+def query_terms(query):
+    """Terms a search query requires: `name=value` pairs as is, other text by word"""
+    terms = []
+    for part in query.lower().split():
+        if '=' in part.strip('='):
+            terms.append(part)
+        else:
+            terms.extend(WORD.findall(part))
+    return terms
+
+
+class SearchIndex:
+    """Inverted index from terms to the ids of captured requests.
+
+    Records are indexed by a background thread fed from the store's
+    on_add callback, so ingest only pays for a queue put. The queue holds
+    at most queue_size records; when indexing falls behind, further
+    records are dropped (left out of the index) and counted. Ids grow
+    monotonically, so each posting list is an array of ids in ascending
+    order, and since the store only ever drops its oldest records (on
+    eviction or clear) pruning is a watermark: ids at or below `floor` are
+    gone. Their postings are trimmed lazily by searches and swept once the
+    dropped ids outnumber the live ones.
+    """
+
+    def __init__(self, store, max_terms=200, queue_size=10000):
+        self.store = store
+        self.max_terms = max_terms
+        self.floor = 0
+        self.indexed = 0
+        self.dropped = 0
+        # Highest id indexed at startup; on_add may repeat some of them
+        self._backfilled = 0
+        self._postings = {}
+        # Ids below the floor whose postings are not swept yet
+        self._pruned = 0
+        # Highest evicted or cleared id that did not fit in the queue
+        self._missed_floor = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Index the requests already stored, then follow new ones"""
+        self._thread = threading.Thread(target=self._run, name='search-index', daemon=True)
+        self._thread.start()
+
+    # Store callbacks
+
+    def add(self, record):
+        """on_add callback"""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def remove(self, record):
+        """on_evict callback"""
+        self._put_floor(record.id)
+
+    def clear(self, last_id):
+        """on_clear callback"""
+        self._put_floor(last_id)
+
+    def _put_floor(self, last_id):
+        try:
+            self._queue.put_nowait(last_id)
+        except queue.Full:
+            # Only the highest one matters; applied once the queue drains
+            self._missed_floor = max(self._missed_floor, last_id)
+
+    def _run(self):
+        self._backfill()
+        while True:
+            item = self._queue.get()
+            try:
+                if isinstance(item, int):
+                    self._drop_through(item)
+                else:
+                    self._index(item)
+                if self._missed_floor > self.floor:
+                    self._drop_through(self._missed_floor)
+            except Exception as e:
+                logger.error(f"Failed to index request: {e}")
+
+    def _backfill(self):
+        """Index stored records newest page first, then flip the postings into id order"""
+        cursor = None
+        while True:
+            try:
+                records, cursor = self.store.page(before=cursor, limit=BACKFILL_PAGE)
+            except Exception as e:
+                logger.error(f"Failed to index stored requests: {e}")
+                break
+            with self._lock:
+                for record in records:
+                    self._insert(record, backfill=True)
+                    self._backfilled = max(self._backfilled, record.id)
+            if cursor is None:
+                break
+        with self._lock:
+            for ids in self._postings.values():
+                ids.reverse()
+        if self.indexed:
+            logger.info(f"Indexed {self.indexed} stored requests for search")
+
+    def _index(self, record):
+        with self._lock:
+            self._insert(record)
+
+    def _insert(self, record, backfill=False):
+        if record.id is None or record.id <= self.floor:
+            return
+        if not backfill and record.id <= self._backfilled:
+            return
+        for term in record_terms(record, self.max_terms):
+            ids = self._postings.get(term)
+            if ids is None:
+                ids = self._postings[term] = array('q')
+            if backfill or not ids or ids[-1] < record.id:
+                ids.append(record.id)
+            else:
+                # on_add callbacks of concurrent requests may run out of order
+                bisect.insort(ids, record.id)
+        self.indexed += 1
+
+    def _drop_through(self, last_id):
+        with self._lock:
+            if last_id <= self.floor:
+                return
+            self._pruned += last_id - self.floor
+            self.floor = last_id
+            # Sweep once the dropped ids outnumber the live ones
+            if self._pruned * 2 >= max(self.indexed, 1):
+                self._sweep()
+
+    def _sweep(self):
+        for term in list(self._postings):
+            ids = self._trimmed(term)
+            if not ids:
+                del self._postings[term]
+        self.indexed = max(self.indexed - self._pruned, 0)
+        self._pruned = 0
+
+    def _trimmed(self, term):
+        ids = self._postings[term]
+        start = bisect.bisect_right(ids, self.floor)
+        if start:
+            del ids[:start]
+        return ids
+
+    # Queries
+
+    def search(self, query, before=None, limit=50):
+        """Newest-first ids of the records matching every term of the query.
+
+        Walks the shortest posting list backwards from the cursor and
+        bisects the others, so the cost depends on the page size and the
+        rarest term rather than on the number of stored records. Returns
+        (ids, next_cursor).
+        """
+        terms = query_terms(query)
+        if not terms:
+            raise ValueError("Empty search query")
+        with self._lock:
+            postings = []
+            for term in set(terms):
+                if term not in self._postings:
+                    return [], None
+                postings.append(self._trimmed(term))
+            postings.sort(key=len)
+            shortest, others = postings[0], postings[1:]
+            position = len(shortest) if before is None else bisect.bisect_left(shortest, before)
+            ids = []
+            while position > 0 and len(ids) < limit:
+                position -= 1
+                request_id = shortest[position]
+                if all(_contains(other, request_id) for other in others):
+                    ids.append(request_id)
+            next_cursor = ids[-1] if ids and len(ids) == limit and position > 0 else None
+            return ids, next_cursor
+
+    def stats(self):
+        with self._lock:
+            return {
+                'indexed': max(self.indexed - self._pruned, 0),
+                'terms': len(self._postings),
+                'pending': self._queue.qsize(),
+                'dropped': self.dropped
+            }
+
+
+def _contains(ids, request_id):
+    index = bisect.bisect_left(ids, request_id)
+    return index < len(ids) and ids[index] == request_id
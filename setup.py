@@ -6,7 +6,8 @@ setup(
     packages=find_packages(),
     install_requires=[
         "Flask>=2.3.2",
-        "requests>=2.31.0"
+        "requests>=2.31.0",
+        "aiohttp>=3.9.5"
     ],
     entry_points={
         'console_scripts': [
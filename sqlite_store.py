@@ -0,0 +1,461 @@
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from retry import dead_letter_entry
+from stats import PENDING_STATUSES
+from store import RequestRecord
+
+logger = logging.getLogger(__name__)
+
+# Attempts at writing a batch before its records are given up on
+WRITE_ATTEMPTS = 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    method TEXT NOT NULL,
+    forward_status TEXT,
+    size INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS requests_ts ON requests (ts);
+CREATE INDEX IF NOT EXISTS requests_method ON requests (method, id);
+CREATE INDEX IF NOT EXISTS requests_forward_status ON requests (forward_status);
+CREATE INDEX IF NOT EXISTS requests_status_code ON requests (json_extract(state, '$.forward.status_code'));
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+DEAD_LETTER_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    body_path TEXT,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dead_letters_body_path ON dead_letters (body_path);
+'''
+
+
+class SQLiteStats:
+    """RequestStats counterpart answered by indexed queries"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def count_method(self, method):
+        count = self._store._query_one(
+            'SELECT COUNT(*) FROM requests WHERE method = ?', (method,)
+        )
+        return count + sum(1 for r in self._store._pending_records() if r.method == method)
+
+    def count_recent(self, hours=1):
+        since = time.time() - hours * 3600
+        count = self._store._query_one(
+            'SELECT COUNT(*) FROM requests WHERE ts >= ?', (since,)
+        )
+        return count + sum(1 for r in self._store._pending_records() if r.ts >= since)
+
+    def record_forward(self, result, previous=None):
+        # Outcomes are read back from the indexed forward_status column
+        pass
+
+    def snapshot(self):
+        methods = dict(self._store._query_all(
+            'SELECT method, COUNT(*) FROM requests GROUP BY method'
+        ))
+        outcomes = dict(self._store._query_all(
+            'SELECT forward_status, COUNT(*) FROM requests WHERE forward_status IS NOT NULL '
+            'AND forward_status NOT IN (%s) GROUP BY forward_status' % ', '.join('?' * len(PENDING_STATUSES)),
+            PENDING_STATUSES
+        ))
+        upstream_statuses = Counter()
+        for status_code, count in self._store._query_all(
+                "SELECT json_extract(state, '$.forward.status_code') AS code, COUNT(*) FROM requests "
+                "WHERE code IS NOT NULL AND forward_status NOT IN (%s) GROUP BY code"
+                % ', '.join('?' * len(PENDING_STATUSES)), PENDING_STATUSES):
+            upstream_statuses[f"{status_code // 100}xx"] += count
+        return {'methods': methods, 'forward_outcomes': outcomes, 'upstream_statuses': dict(upstream_statuses)}
+
+
+class SQLiteRequestStore:
+    """SQLite-backed request store for histories too large for RAM.
+
+    Same interface as RequestStore. New records are handed to a background
+    writer that inserts them in batches (WAL mode), so request threads never
+    wait on the disk; until then they are served from a small pending map.
+    Listing, lookups and the dashboard counts are indexed queries.
+
+    Several processes can share one database when they pass the same
+    id_counter (a multiprocessing.Value): ids stay unique and ordered across
+    processes, and counts, retention and clear() go through the database.
+    """
+
+    def __init__(self, path, max_requests, batch_size=500, id_counter=None):
+        self.path = path
+        self.max_requests = max_requests
+        self.batch_size = batch_size
+        self.evicted = 0
+        self.dropped = 0
+        self.counters = SQLiteStats(self)
+        self.on_add = []
+        self.on_evict = []
+        self.on_forward = []
+        self.on_clear = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._pending = OrderedDict()
+        self._ops = []
+
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        max_id = conn.execute('SELECT MAX(id) FROM requests').fetchone()[0] or 0
+        row = conn.execute("SELECT value FROM meta WHERE key = 'last_id'").fetchone()
+        self.last_id = max(max_id, row[0] if row else 0)
+        self._cleared_through = 0
+        self._count = conn.execute('SELECT COUNT(*) FROM requests').fetchone()[0]
+        self._ids = itertools.count(self.last_id + 1)
+        self._id_counter = id_counter
+        if id_counter is not None:
+            with id_counter.get_lock():
+                id_counter.value = max(id_counter.value, self.last_id)
+
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    # Writing
+
+    def add(self, record):
+        with self._lock:
+            record.id = self._next_id()
+            self.last_id = record.id
+            self._pending[record.id] = record
+            self._ops.append(('insert', record))
+            self._cond.notify()
+        for callback in self.on_add:
+            callback(record)
+        return record
+
+    def _next_id(self):
+        if self._id_counter is None:
+            return next(self._ids)
+        with self._id_counter.get_lock():
+            self._id_counter.value += 1
+            return self._id_counter.value
+
+    def set_forward(self, record, result):
+        record.forward = result
+        with self._lock:
+            self._ops.append(('forward', record))
+            self._cond.notify()
+        if result['status'] != 'queued':
+            for callback in self.on_forward:
+                callback(record)
+
+    def clear(self):
+        with self._write_lock:
+            with self._lock:
+                self._pending.clear()
+                self._ops = []
+                if self._id_counter is not None:
+                    self.last_id = max(self.last_id, self._id_counter.value)
+                self._cleared_through = self.last_id
+                last_id = self.last_id
+            conn = self._connection()
+            with conn:
+                conn.execute('DELETE FROM requests')
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_id', ?)", (last_id,)
+                )
+            self._count = 0
+        for callback in self.on_clear:
+            callback(last_id)
+
+    def close(self, timeout=10):
+        """Wait up to `timeout` seconds for queued writes to reach the database"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._ops and not self._pending:
+                    return
+            time.sleep(0.01)
+        logger.warning(f"Gave up waiting for {len(self._ops)} queued SQLite writes")
+
+    def _run(self):
+        conn = self._connection()
+        failures = 0
+        while True:
+            with self._lock:
+                while not self._ops:
+                    self._cond.wait()
+                batch = self._ops[:self.batch_size]
+                del self._ops[:self.batch_size]
+            try:
+                with self._write_lock:
+                    self._write_batch(conn, batch)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                if failures < WRITE_ATTEMPTS:
+                    logger.error(f"Error writing requests to SQLite, retrying: {str(e)}")
+                    with self._lock:
+                        # Back at the front, so later ops stay behind it
+                        self._ops[:0] = batch
+                    time.sleep(0.1 * failures)
+                else:
+                    logger.error(f"Dropping {len(batch)} SQLite writes after {failures} attempts: {str(e)}")
+                    failures = 0
+                    self._drop(batch)
+
+    def _drop(self, batch):
+        """Forget the pending records of a batch that could not be written"""
+        with self._lock:
+            for op, record in batch:
+                if op == 'insert' and self._pending.pop(record.id, None) is not None:
+                    self.dropped += 1
+
+    def _write_batch(self, conn, batch):
+        if self._id_counter is not None:
+            # Another process may have cleared the store since the last batch
+            row = conn.execute("SELECT value FROM meta WHERE key = 'last_id'").fetchone()
+            if row:
+                self._cleared_through = max(self._cleared_through, row[0])
+        inserts = []
+        updates = []
+        for op, record in batch:
+            if record.id <= self._cleared_through:
+                continue
+            row = (
+                record.forward['status'] if record.forward else None,
+                json.dumps(record.to_state()),
+                record.id
+            )
+            if op == 'insert':
+                inserts.append((record.id, record.ts, record.method, record.size) + row[:2])
+            else:
+                updates.append(row)
+        evicted = []
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO requests (id, ts, method, size, forward_status, state) '
+                'VALUES (?, ?, ?, ?, ?, ?)', inserts
+            )
+            conn.executemany(
+                'UPDATE requests SET forward_status = ?, state = ? WHERE id = ?', updates
+            )
+            if self._id_counter is None:
+                self._count += len(inserts)
+            else:
+                self._count = conn.execute('SELECT COUNT(*) FROM requests').fetchone()[0]
+            overflow = self._count - self.max_requests
+            if overflow > 0:
+                cutoff = conn.execute(
+                    'SELECT id FROM requests ORDER BY id LIMIT 1 OFFSET ?', (overflow - 1,)
+                ).fetchone()[0]
+                if self.on_evict:
+                    evicted = [
+                        RequestRecord.from_state(json.loads(state)) for (state,) in
+                        conn.execute('SELECT state FROM requests WHERE id <= ?', (cutoff,))
+                    ]
+                conn.execute('DELETE FROM requests WHERE id <= ?', (cutoff,))
+                self._count -= overflow
+                self.evicted += overflow
+        with self._lock:
+            for op, record in batch:
+                if op == 'insert':
+                    self._pending.pop(record.id, None)
+        for record in evicted:
+            for callback in self.on_evict:
+                callback(record)
+
+    # Reading
+
+    def get(self, request_id):
+        try:
+            request_id = int(request_id)
+        except (TypeError, ValueError):
+            return None
+        record = self._pending.get(request_id)
+        if record is not None:
+            return record
+        row = self._connection().execute(
+            'SELECT state FROM requests WHERE id = ?', (request_id,)
+        ).fetchone()
+        return RequestRecord.from_state(json.loads(row[0])) if row else None
+
+    def page(self, before=None, limit=50, method=None, since=None, until=None):
+        """Newest-first page of records with ids below `before`"""
+        def matches(record):
+            return (
+                (before is None or record.id < before)
+                and (method is None or record.method == method)
+                and (since is None or record.ts >= since)
+                and (until is None or record.ts <= until)
+            )
+
+        # Pending records of this process come first: they hold the newest
+        # forward results for records the writer has already inserted
+        records = {}
+        for record in reversed(self._pending_records()):
+            if len(records) > limit:
+                break
+            if matches(record):
+                records[record.id] = record
+        clauses, params = [], []
+        if before is not None:
+            clauses.append('id < ?')
+            params.append(before)
+        if method is not None:
+            clauses.append('method = ?')
+            params.append(method)
+        if since is not None:
+            clauses.append('ts >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('ts <= ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        params.append(limit + 1)
+        rows = self._query_all(
+            f'SELECT id, state FROM requests {where} ORDER BY id DESC LIMIT ?', params
+        )
+        for request_id, state in rows:
+            if request_id not in records:
+                records[request_id] = RequestRecord.from_state(json.loads(state))
+        records = sorted(records.values(), key=lambda r: r.id, reverse=True)[:limit + 1]
+        has_more = len(records) > limit
+        records = records[:limit]
+        next_cursor = records[-1].id if has_more and records else None
+        return records, next_cursor
+
+    def ids_since(self, ts):
+        """Ids of the records received at or after ts, whichever process stored them"""
+        return [row[0] for row in self._query_all(
+            'SELECT id FROM requests WHERE ts >= ? ORDER BY id', (ts,)
+        )]
+
+    def snapshot(self):
+        records, _ = self.page(limit=len(self))
+        return list(reversed(records))
+
+    def __len__(self):
+        if self._id_counter is not None:
+            return self._query_one('SELECT COUNT(*) FROM requests') + len(self._pending)
+        return self._count + len(self._pending)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __reversed__(self):
+        return reversed(self.snapshot())
+
+    def stats(self):
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'records': len(self),
+            'bytes': self._query_one('SELECT COALESCE(SUM(size), 0) FROM requests'),
+            'max_requests': self.max_requests,
+            'pending_writes': len(self._ops),
+            'evicted': self.evicted,
+            'dropped': self.dropped
+        }
+
+    def _pending_records(self):
+        with self._lock:
+            return list(self._pending.values())
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def _query_one(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchone()[0]
+
+    def _query_all(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchall()
+
+
+class SQLiteDeadLetterQueue:
+    """DeadLetterQueue kept in a table of the SQLite store's database.
+
+    Used under the pre-fork launcher, so every worker lists, counts and
+    replays the same dead letters; take() removes entries in one transaction
+    so two workers never replay the same one.
+    """
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._connection().executescript(DEAD_LETTER_SCHEMA)
+
+    def add(self, job, result):
+        entry = dead_letter_entry(job, result)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'INSERT INTO dead_letters (body_path, entry) VALUES (?, ?)',
+                (entry['body_path'], json.dumps(entry))
+            )
+            conn.execute(
+                'DELETE FROM dead_letters WHERE id <= '
+                '(SELECT id FROM dead_letters ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                (self.max_entries,)
+            )
+        logger.warning(f"Request {entry['request_id']} moved to dead-letter queue: {entry['error']}")
+
+    def take(self, limit=None):
+        """Remove and return the oldest entries"""
+        conn = self._connection()
+        with conn:
+            # Take the write lock before reading so workers don't race
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(
+                'SELECT id, entry FROM dead_letters ORDER BY id LIMIT ?',
+                (-1 if limit is None else limit,)
+            ).fetchall()
+            if rows:
+                conn.execute('DELETE FROM dead_letters WHERE id <= ?', (rows[-1][0],))
+        return [dict(json.loads(entry), id=entry_id) for entry_id, entry in rows]
+
+    def list(self, limit=20):
+        """Newest entries first"""
+        rows = self._connection().execute(
+            'SELECT id, entry FROM dead_letters ORDER BY id DESC LIMIT ?', (limit,)
+        ).fetchall()
+        return [dict(json.loads(entry), id=entry_id) for entry_id, entry in rows]
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM dead_letters').fetchone()[0]
+
+    def holds_body(self, path):
+        """Whether a dead letter still needs a spilled body"""
+        return self._connection().execute(
+            'SELECT 1 FROM dead_letters WHERE body_path = ? LIMIT 1', (path,)
+        ).fetchone() is not None
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+
+def connect(path):
+    """SQLite connection in WAL mode, one per thread"""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import Counter, deque
+
+# Forward statuses of requests still on their way, not counted as outcomes
+PENDING_STATUSES = ('queued', 'retrying')
+
+
+class RequestStats:
+    """Request counters maintained at ingest time.
+
+    Per-method counts follow the contents of the store (records are removed
+    again when evicted), forward outcomes are cumulative, and the recent-request
+    count uses per-minute buckets, so every read is O(1) regardless of how
+    many requests are stored.
+    """
+
+    def __init__(self, window_minutes=60):
+        self.window_minutes = window_minutes
+        self._methods = Counter()
+        self._forward_outcomes = Counter()
+        self._upstream_statuses = Counter()
+        # [minute, count] pairs, oldest on the left
+        self._buckets = deque()
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        minute = int(record.ts // 60)
+        with self._lock:
+            self._methods[record.method] += 1
+            if self._buckets and self._buckets[-1][0] == minute:
+                self._buckets[-1][1] += 1
+            else:
+                self._buckets.append([minute, 1])
+                self._prune(minute)
+
+    def remove(self, record):
+        minute = int(record.ts // 60)
+        with self._lock:
+            self._methods[record.method] -= 1
+            for bucket in self._buckets:
+                if bucket[0] == minute:
+                    bucket[1] -= 1
+                    break
+                if bucket[0] > minute:
+                    break
+
+    def record_forward(self, result, previous=None):
+        """Count the latest outcome of a request, replacing its previous one.
+
+        Retries in progress are not outcomes; a request retried twice and
+        then forwarded counts once, as forwarded.
+        """
+        if result['status'] in PENDING_STATUSES:
+            return
+        with self._lock:
+            if previous is not None and previous['status'] not in PENDING_STATUSES:
+                self._count_forward(previous, -1)
+            self._count_forward(result, 1)
+
+    def _count_forward(self, result, delta):
+        self._forward_outcomes[result['status']] += delta
+        status_code = result.get('status_code')
+        if status_code:
+            self._upstream_statuses[f"{status_code // 100}xx"] += delta
+
+    def clear(self):
+        with self._lock:
+            self._methods.clear()
+            self._forward_outcomes.clear()
+            self._upstream_statuses.clear()
+            self._buckets.clear()
+
+    def count_method(self, method):
+        return self._methods[method]
+
+    def count_recent(self, hours=1):
+        """Requests stored during the last `hours` (at most the bucket window)"""
+        oldest = int(time.time() // 60) - int(hours * 60)
+        with self._lock:
+            return sum(count for minute, count in self._buckets if minute > oldest)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'methods': dict(self._methods),
+                'forward_outcomes': {k: v for k, v in self._forward_outcomes.items() if v},
+                'upstream_statuses': {k: v for k, v in self._upstream_statuses.items() if v}
+            }
+
+    def _prune(self, minute):
+        while self._buckets and self._buckets[0][0] <= minute - self.window_minutes:
+            self._buckets.popleft()
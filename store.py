@@ -0,0 +1,406 @@
+import itertools
+import json
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+
+from stats import RequestStats
+
+
+def parse_body(body):
+    """Parsed view of a raw request body: JSON if it parses, else text"""
+    if not body:
+        return None
+    text = body.decode('utf-8', 'replace')
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+class CompressedBody(bytes):
+    """zlib-compressed body bytes held by a compacted record"""
+
+    __slots__ = ()
+
+
+class HeaderTable:
+    """Interned header (name, value) pairs shared by the records holding them.
+
+    Deliveries from the same provider repeat most of their headers, so each
+    distinct pair is stored once and a compacted record keeps a tuple of
+    references to them. Pairs are counted by the records holding them and
+    dropped with the last one, so values of evicted records don't take up
+    room. A header holding more than max_values distinct values at once
+    (signatures, delivery ids) has further values kept per record, and the
+    table holds at most max_pairs pairs.
+    """
+
+    def __init__(self, max_values=64, max_pairs=10000):
+        self.max_values = max_values
+        self.max_pairs = max_pairs
+        # pair -> [shared pair, records holding it]
+        self._pairs = {}
+        # name -> distinct values interned for it
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def intern(self, headers):
+        """Tuple of shared (name, value) pairs for a headers dict"""
+        pairs = []
+        with self._lock:
+            for pair in headers.items():
+                entry = self._pairs.get(pair)
+                if entry is not None:
+                    entry[1] += 1
+                    pairs.append(entry[0])
+                    continue
+                name = sys.intern(str(pair[0]))
+                shared = (name, pair[1])
+                values = self._names.get(name, 0)
+                if values < self.max_values and len(self._pairs) < self.max_pairs:
+                    self._pairs[shared] = [shared, 1]
+                    self._names[name] = values + 1
+                pairs.append(shared)
+        return tuple(pairs)
+
+    def release(self, pairs):
+        """Drop a record's references, and the pairs no other record holds"""
+        with self._lock:
+            for pair in pairs:
+                entry = self._pairs.get(pair)
+                # Only the interned pair itself: an equal one may have been
+                # kept per record while the table was full
+                if entry is None or entry[0] is not pair:
+                    continue
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._pairs[pair]
+                    values = self._names[pair[0]] - 1
+                    if values:
+                        self._names[pair[0]] = values
+                    else:
+                        del self._names[pair[0]]
+
+    def clear(self):
+        with self._lock:
+            self._pairs.clear()
+            self._names.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pairs': len(self._pairs),
+                'max_pairs': self.max_pairs,
+                'references': sum(entry[1] for entry in self._pairs.values())
+            }
+
+    def __len__(self):
+        return len(self._pairs)
+
+
+class RequestRecord:
+    """A captured request; __slots__ keeps the per-record overhead small.
+
+    POST bodies are kept as the raw bytes received, and `data` parses them
+    only when it is read. Once stored, compact() shares the header pairs
+    through a HeaderTable and compresses large bodies. For streamed bodies
+    `body` is only a preview of body_size bytes spilled to body_path.
+    """
+
+    __slots__ = (
+        'id', 'method', 'url', '_headers', 'ts',
+        '_data', '_body', 'body_size', 'body_path', 'query_params', 'forward', 'size',
+        'timings'
+    )
+
+    def __init__(self, method, url, headers, ts, size=0):
+        self.id = None
+        self.method = method
+        self.url = url
+        self._headers = headers
+        self.ts = ts
+        self._data = None
+        self._body = None
+        self.body_size = None
+        self.body_path = None
+        self.query_params = None
+        self.forward = None
+        self.size = size
+        # Milliseconds spent receiving, parsing, storing and forwarding it
+        self.timings = None
+
+    @property
+    def timestamp(self):
+        return datetime.fromtimestamp(self.ts).strftime('%Y-%m-%d %H:%M:%S')
+
+    @property
+    def headers(self):
+        headers = self._headers
+        return dict(headers) if isinstance(headers, tuple) else headers
+
+    @headers.setter
+    def headers(self, value):
+        self._headers = value
+
+    @property
+    def body(self):
+        body = self._body
+        return zlib.decompress(body) if isinstance(body, CompressedBody) else body
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+
+    def compact(self, header_table, compress_bytes):
+        """Share the header pairs and compress a body of compress_bytes or more (0 = never)"""
+        if isinstance(self._headers, dict):
+            self._headers = header_table.intern(self._headers)
+        body = self._body
+        if compress_bytes and body is not None and len(body) >= compress_bytes \
+                and not isinstance(body, CompressedBody):
+            packed = zlib.compress(body)
+            if len(packed) < len(body):
+                self._body = CompressedBody(packed)
+                self.size -= len(body) - len(packed)
+
+    @property
+    def data(self):
+        if self._data is None and self.body is not None:
+            return parse_body(self.body)
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def summary(self):
+        """Fields needed to list the request without its headers and payload"""
+        return {
+            'id': self.id,
+            'method': self.method,
+            'url': self.url,
+            'ts': self.ts,
+            'timestamp': self.timestamp,
+            'forward': self.forward,
+            'size': self.size
+        }
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'method': self.method,
+            'url': self.url,
+            'headers': self.headers,
+            'ts': self.ts,
+            'timestamp': self.timestamp,
+            'data': self.data,
+            'body_size': self.body_size,
+            'query_params': self.query_params,
+            'forward': self.forward,
+            'timings': self.timings
+        }
+
+    def to_state(self):
+        """Plain-dict form used to persist the record"""
+        state = {
+            'id': self.id,
+            'method': self.method,
+            'url': self.url,
+            'headers': self.headers,
+            'ts': self.ts,
+            'timestamp': self.timestamp,
+            'data': self._data,
+            'body_size': self.body_size,
+            'body_path': self.body_path,
+            'query_params': self.query_params,
+            'forward': self.forward,
+            'size': self.size,
+            'timings': self.timings
+        }
+        body = self.body
+        if body is not None:
+            # Raw bytes survive the JSON round trip via surrogate escapes
+            state['body'] = body.decode('utf-8', 'surrogateescape')
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        record = cls(state['method'], state['url'], state['headers'], state['ts'], state['size'])
+        record.id = state['id']
+        record.data = state['data']
+        if state.get('body') is not None:
+            record.body = state['body'].encode('utf-8', 'surrogateescape')
+        record.body_size = state.get('body_size')
+        record.body_path = state.get('body_path')
+        record.query_params = state['query_params']
+        record.forward = state['forward']
+        record.timings = state.get('timings')
+        return record
+
+
+class RequestStore:
+    """Bounded in-memory store of captured requests.
+
+    Records are kept in insertion order and evicted oldest-first once either
+    the record count or the approximate total size exceeds its limit. Ids are
+    monotonic and never reused, even after clear(), and lookups by id are O(1).
+    With compact set, records are compacted as they are stored.
+    """
+
+    def __init__(self, max_requests, max_bytes, compact=False, compress_bytes=0):
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.header_table = HeaderTable() if compact else None
+        self.compress_bytes = compress_bytes
+        self.total_bytes = 0
+        self.evicted = 0
+        self.counters = RequestStats()
+        # Callbacks run outside the store lock: on_add(record),
+        # on_evict(record), on_forward(record) and on_clear(last_id)
+        self.on_add = []
+        self.on_evict = []
+        self.on_forward = []
+        self.on_clear = []
+        self.last_id = 0
+        self._records = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        """Assign the next id to record, store it and evict as needed"""
+        if self.header_table is not None:
+            record.compact(self.header_table, self.compress_bytes)
+        with self._lock:
+            record.id = next(self._ids)
+            evicted = self._insert(record)
+        for oldest in evicted:
+            for callback in self.on_evict:
+                callback(oldest)
+        for callback in self.on_add:
+            callback(record)
+        return record
+
+    def restore(self, record):
+        """Insert a previously persisted record, keeping its id.
+
+        Used when recovering captured requests at startup; no callbacks run
+        and later ids continue after the highest restored one.
+        """
+        if self.header_table is not None:
+            record.compact(self.header_table, self.compress_bytes)
+        with self._lock:
+            self._insert(record)
+            self._ids = itertools.count(self.last_id + 1)
+
+    def reserve_ids(self, last_id):
+        """Make sure new ids continue after last_id"""
+        with self._lock:
+            if last_id > self.last_id:
+                self.last_id = last_id
+                self._ids = itertools.count(last_id + 1)
+
+    def _insert(self, record):
+        evicted = []
+        self.last_id = max(self.last_id, record.id)
+        self._records[record.id] = record
+        self.total_bytes += record.size
+        self.counters.add(record)
+        while self._records and (
+            len(self._records) > self.max_requests
+            or self.total_bytes > self.max_bytes
+        ):
+            _, oldest = self._records.popitem(last=False)
+            self.total_bytes -= oldest.size
+            self.counters.remove(oldest)
+            if self.header_table is not None and isinstance(oldest._headers, tuple):
+                self.header_table.release(oldest._headers)
+            self.evicted += 1
+            evicted.append(oldest)
+        return evicted
+
+    def set_forward(self, record, result):
+        """Record the forward result of a stored request"""
+        previous = record.forward
+        record.forward = result
+        if result['status'] != 'queued':
+            self.counters.record_forward(result, previous)
+            for callback in self.on_forward:
+                callback(record)
+
+    def get(self, request_id):
+        """Return the record with the given id, or None"""
+        try:
+            return self._records.get(int(request_id))
+        except (TypeError, ValueError):
+            return None
+
+    def page(self, before=None, limit=50, method=None, since=None, until=None):
+        """Newest-first page of records with ids below `before`.
+
+        Ids are contiguous between the oldest and newest stored record, so the
+        walk starts directly at the cursor and, without a method filter, only
+        touches the records it returns. Returns (records, next_cursor); the
+        cursor is None when there are no older records.
+        """
+        with self._lock:
+            if not self._records:
+                return [], None
+            oldest_id = next(iter(self._records))
+            request_id = next(reversed(self._records))
+            if before is not None:
+                request_id = min(request_id, before - 1)
+            records = []
+            while request_id >= oldest_id and len(records) < limit:
+                record = self._records.get(request_id)
+                request_id -= 1
+                if record is None:
+                    continue
+                if since is not None and record.ts < since:
+                    request_id = oldest_id - 1
+                    break
+                if until is not None and record.ts > until:
+                    continue
+                if method is not None and record.method != method:
+                    continue
+                records.append(record)
+            next_cursor = records[-1].id if records and request_id >= oldest_id else None
+            return records, next_cursor
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self.total_bytes = 0
+            self.counters.clear()
+            if self.header_table is not None:
+                self.header_table.clear()
+            last_id = self.last_id
+        for callback in self.on_clear:
+            callback(last_id)
+
+    def snapshot(self):
+        """List of stored records, oldest first"""
+        with self._lock:
+            return list(self._records.values())
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __reversed__(self):
+        return reversed(self.snapshot())
+
+    def stats(self):
+        return {
+            'backend': 'memory',
+            'records': len(self._records),
+            'bytes': self.total_bytes,
+            'max_requests': self.max_requests,
+            'max_bytes': self.max_bytes,
+            'evicted': self.evicted,
+            'header_table': self.header_table.stats() if self.header_table is not None else None
+        }
@@ -0,0 +1,133 @@
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the incoming stream at a time
+CHUNK_SIZE = 64 * 1024
+
+
+class BodyTooLarge(Exception):
+    """The request body went over the configured size limit"""
+
+
+class BodySpill:
+    """Directory of request bodies too large to keep in memory, one file each.
+
+    A file is deleted once its last forward has finished, since nothing
+    reads it after that (the record keeps only the preview), or with its
+    record, unless one of the `holders` (pending retries, dead letters)
+    still needs it.
+    """
+
+    def __init__(self, directory):
+        # Absolute, like the paths mkstemp hands out and dead letters keep
+        self.directory = os.path.abspath(directory)
+        # Callables holder(path) -> True while a retry or dead letter needs the file
+        self.holders = []
+
+    def new_path(self):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.body', dir=self.directory)
+        os.close(fd)
+        return path
+
+    def release(self, path):
+        """Delete a spilled body unless something still refers to it"""
+        if not path or any(holder(path) for holder in self.holders):
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def remove(self, record):
+        """on_evict callback: delete the spilled body of an evicted record"""
+        self.release(record.body_path)
+
+    def detach(self, record):
+        """Delete the spilled body of a record that keeps only its preview"""
+        path, record.body_path = record.body_path, None
+        self.release(path)
+
+    def clear(self, last_id=None):
+        """on_clear callback: delete every spilled body no longer needed"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.body'):
+                self.release(os.path.join(self.directory, name))
+
+
+class StreamingBody:
+    """A large request body read from the incoming stream in chunks.
+
+    The first preview_bytes are read up front and kept in memory for the
+    capture store; every chunk is also written to the spill file. Iterating
+    yields the body chunk by chunk, so requests sends it upstream while it
+    is still arriving; drain() reads whatever was not sent. Memory use is
+    bounded by the preview plus one chunk whatever the body size.
+    """
+
+    def __init__(self, stream, length, preview_bytes, path, max_bytes=0):
+        self.stream = stream
+        # requests sends Content-Length when `len` is set, chunked otherwise
+        self.len = length
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.exceeded = False
+        self._file = open(path, 'wb')
+        self._sent_preview = False
+        self.preview = b''
+        while len(self.preview) < preview_bytes:
+            chunk = self._read(preview_bytes - len(self.preview))
+            if not chunk:
+                break
+            self.preview += chunk
+
+    def _read(self, size=CHUNK_SIZE):
+        if self._file is None:
+            return b''
+        chunk = self.stream.read(size)
+        if not chunk:
+            self._file.close()
+            self._file = None
+            return b''
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.exceeded = True
+            self._file.close()
+            self._file = None
+            raise BodyTooLarge(f"Request body exceeds {self.max_bytes} bytes")
+        self._file.write(chunk)
+        return chunk
+
+    def __iter__(self):
+        if not self._sent_preview:
+            self._sent_preview = True
+            if self.preview:
+                yield self.preview
+        while True:
+            chunk = self._read()
+            if not chunk:
+                return
+            yield chunk
+
+    def drain(self):
+        """Read the rest of the body into the spill file"""
+        if self.exceeded:
+            raise BodyTooLarge(f"Request body exceeds {self.max_bytes} bytes")
+        self._sent_preview = True
+        while self._read():
+            pass
+
+
+def is_large_body(length, transfer_encoding, threshold):
+    """Whether a request body should be streamed rather than buffered"""
+    if not threshold:
+        return False
+    if length is None:
+        return 'chunked' in (transfer_encoding or '').lower()
+    return length > threshold
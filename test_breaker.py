@@ -0,0 +1,129 @@
+"""
+Tests for the per-target circuit breaker and how its fast failures are
+retried
+"""
+
+import os
+import time
+
+os.environ.setdefault('STORE_BACKEND', 'memory')
+
+import pytest
+
+import app as webhook
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers, open_circuit_result
+from forwarder import combine_results
+from retry import DeadLetterQueue, RetryScheduler
+
+OK = {'status': 'forwarded', 'status_code': 200, 'elapsed_ms': 5}
+ERROR = {'status': 'error', 'error': 'Connection refused', 'elapsed_ms': 5}
+
+
+def make_breaker(open_seconds=30, slow_ms=0):
+    return CircuitBreaker('upstream', window=4, min_calls=4, error_rate=0.5, slow_ms=slow_ms,
+                          slow_rate=0.5, open_seconds=open_seconds)
+
+
+def trip(breaker):
+    for _ in range(4):
+        assert breaker.allow()
+        breaker.record(ERROR)
+
+
+def test_opens_once_enough_calls_fail():
+    breaker = make_breaker()
+    for result in (ERROR, OK, ERROR):
+        breaker.allow()
+        breaker.record(result)
+    # Fewer than min_calls so far
+    assert breaker.state == CLOSED
+    breaker.allow()
+    breaker.record(OK)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()['rejected'] == 1
+    assert breaker.stats()['trips'] == 1
+
+
+def test_5xx_and_slow_calls_count_as_failures():
+    breaker = make_breaker(slow_ms=100)
+    for result in ({'status': 'forwarded', 'status_code': 503}, OK,
+                   dict(OK, elapsed_ms=500), dict(OK, elapsed_ms=500)):
+        breaker.allow()
+        breaker.record(result)
+    assert breaker.state == OPEN
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success():
+    breaker = make_breaker(open_seconds=0.05)
+    trip(breaker)
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only the one probe while it is in flight
+    assert not breaker.allow()
+    breaker.record(OK)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_for_another_period():
+    breaker = make_breaker(open_seconds=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(ERROR)
+    assert breaker.state == OPEN
+    assert breaker.stats()['trips'] == 2
+    assert 0 < breaker.retry_after() <= 0.05
+
+
+def test_open_circuit_wait_does_not_spend_an_attempt(tmp_path):
+    dead_letters = DeadLetterQueue(str(tmp_path / 'dead.jsonl'), 10)
+    scheduler = RetryScheduler(lambda job: True, 2, 1, 10, dead_letters)
+    job = {'request_id': 1, 'method': 'POST', 'targets': ['upstream'], 'attempt': 2}
+    result = combine_results({'upstream': open_circuit_result('upstream')})
+    # Out of attempts, but none of them was spent on the circuit
+    delay = scheduler.schedule(job, result, wait=30)
+    assert 30 <= delay <= 31
+    assert job['attempt'] == 2
+    assert len(dead_letters) == 0
+    assert scheduler.schedule(job, combine_results({'upstream': dict(ERROR, finished_at='x')})) is None
+    assert len(dead_letters) == 1
+
+
+@pytest.fixture
+def retrying(monkeypatch, tmp_path):
+    breakers = CircuitBreakers(4, 4, 0.5, 0, 0.5, 30)
+    scheduled = []
+
+    class Scheduler(RetryScheduler):
+        def schedule(self, job, result, wait=None):
+            scheduled.append(wait)
+            return super().schedule(job, result, wait)
+
+    scheduler = Scheduler(lambda job: True, 5, 1, 10, DeadLetterQueue(str(tmp_path / 'dead.jsonl'), 10))
+    # Keep the scheduler's timer thread from resubmitting anything
+    monkeypatch.setattr(scheduler, '_thread', object())
+    monkeypatch.setattr(webhook, 'breakers', breakers)
+    monkeypatch.setattr(webhook, 'retry_scheduler', scheduler)
+    return breakers, scheduled
+
+
+def test_fast_failures_are_retried_once_the_circuit_allows(retrying):
+    breakers, scheduled = retrying
+    trip(breakers.get('upstream'))
+    job = {'request_id': None, 'method': 'POST', 'targets': ['upstream'], 'attempt': 1}
+    result = webhook.handle_forward_result(job, combine_results({'upstream': open_circuit_result('upstream')}))
+    assert result['status'] == 'retrying'
+    assert result['attempts'] == 0
+    assert 29 < scheduled[-1] <= 30
+    assert job['attempt'] == 1
+
+    # A real upstream failure still spends an attempt
+    failed = dict(ERROR, finished_at='2024-05-01 12:00:00')
+    result = webhook.handle_forward_result(job, combine_results({'upstream': failed}))
+    assert scheduled[-1] is None
+    assert result['attempts'] == 1
+    assert job['attempt'] == 2
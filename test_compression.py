@@ -0,0 +1,81 @@
+"""
+Tests for request body decoding: incremental inflating, the decompression
+bomb guard and the streaming threshold of decoded bodies
+"""
+
+import gzip
+import io
+import os
+import zlib
+
+import pytest
+
+from compression import Inflater, InflatingReader, InvalidEncoding, inflate
+from streaming import CHUNK_SIZE, BodyTooLarge
+
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def reader_of(raw, max_ratio=0, max_bytes=0):
+    stream = CountingStream(gzip.compress(raw))
+    return InflatingReader(stream, Inflater('gzip', max_ratio, max_bytes)), stream
+
+
+def test_decodes_gzip_zlib_and_raw_deflate():
+    raw = b'{"event": "push"}' * 100
+    assert inflate(gzip.compress(raw), 'gzip', 100) == raw
+    assert inflate(zlib.compress(raw), 'deflate', 100) == raw
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    assert inflate(compressor.compress(raw) + compressor.flush(), 'deflate', 100) == raw
+
+
+def test_invalid_body_and_bombs_are_rejected():
+    with pytest.raises(InvalidEncoding):
+        inflate(b'not gzip at all', 'gzip', 100)
+    with pytest.raises(BodyTooLarge):
+        inflate(gzip.compress(b'\0' * 20 * 1024 * 1024), 'gzip', 100)
+    with pytest.raises(BodyTooLarge):
+        inflate(gzip.compress(b'x' * 5000), 'gzip', 0, max_bytes=4096)
+
+
+def test_readline_inflates_only_up_to_the_newline():
+    lines = [os.urandom(32).hex().encode() + b'\n' for _ in range(20000)]
+    reader, stream = reader_of(b''.join(lines))
+    assert reader.readline() == lines[0]
+    assert reader.readline() == lines[1]
+    assert reader.readline(10) == lines[2][:10]
+    assert reader.readline() == lines[2][10:]
+    # Only the first chunk of the ~800 KB compressed stream was read
+    assert stream.reads == 1
+    assert reader.read() == b''.join(lines[3:])
+    assert reader.readline() == b''
+
+
+def test_readline_without_a_trailing_newline():
+    reader, _ = reader_of(b'first\nlast')
+    assert reader.readline() == b'first\n'
+    assert reader.readline() == b'last'
+    assert reader.readline() == b''
+
+
+def test_exceeds_reads_no_further_than_the_threshold():
+    raw = os.urandom(4 * CHUNK_SIZE)
+    reader, stream = reader_of(raw)
+    assert reader.exceeds(CHUNK_SIZE)
+    assert stream.reads <= 3
+    # Nothing is lost by looking ahead
+    assert reader.read() == raw
+
+    reader, _ = reader_of(b'small body')
+    assert not reader.exceeds(CHUNK_SIZE)
+    assert reader.read() == b'small body'
+    reader, _ = reader_of(raw)
+    assert not reader.exceeds(0)
@@ -0,0 +1,60 @@
+"""
+Tests for duplicate suppression: a request turned away must not make the
+sender's retry of it look like a duplicate
+"""
+
+import os
+
+os.environ.setdefault('STORE_BACKEND', 'memory')
+
+import pytest
+
+import app as webhook
+from dedup import DuplicateFilter
+from routing import Router
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(webhook, 'duplicate_filter', DuplicateFilter('Idempotency-Key', 300, 1000))
+    monkeypatch.setattr(webhook, 'router', Router([], 'http://127.0.0.1:9', 10))
+    monkeypatch.setattr(webhook, 'ASYNC_FORWARDING', True)
+    webhook.received_requests.clear()
+    return webhook.app.test_client()
+
+
+def post(client, key, payload=None):
+    return client.post('/', json=payload or {'event': 'order.created'}, headers={'Idempotency-Key': key})
+
+
+def test_duplicate_is_not_forwarded_again(client, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(webhook.forward_queue, 'submit', lambda job: submitted.append(job) or True)
+    assert post(client, 'key-1').status_code == 202
+    response = post(client, 'key-1')
+    assert response.status_code == 200
+    assert response.get_json()['duplicate_of'] == submitted[0]['request_id']
+    assert len(submitted) == 1
+
+
+def test_retry_after_forward_queue_full_is_forwarded(client, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(webhook.forward_queue, 'submit', lambda job: False)
+    assert post(client, 'key-2').status_code == 503
+
+    monkeypatch.setattr(webhook.forward_queue, 'submit', lambda job: submitted.append(job) or True)
+    response = post(client, 'key-2')
+    assert response.status_code == 202
+    assert [job['request_id'] for job in submitted] == [response.get_json()['request_id']]
+    # And the accepted one now holds the key
+    assert post(client, 'key-2').status_code == 200
+
+
+def test_release_only_forgets_the_key_of_its_own_request():
+    duplicates = DuplicateFilter('Idempotency-Key', 300, 1000)
+    key = duplicates.key('POST', '/', {'Idempotency-Key': 'abc'}, b'')
+    assert duplicates.claim(key, 1) is None
+    duplicates.release(key, 2)
+    assert duplicates.claim(key, 3) == 1
+    duplicates.release(key, 1)
+    assert duplicates.claim(key, 4) is None
@@ -0,0 +1,130 @@
+"""
+Tests for retries with backoff and the dead-letter queue: persistence of
+dead letters across restarts on both backends and their replay
+"""
+
+import time
+
+from retry import DeadLetterQueue, DeadLetterReplayer, RetryScheduler, failed_targets
+from sqlite_store import SQLiteDeadLetterQueue
+
+
+def make_job(request_id, **fields):
+    job = {
+        'request_id': request_id,
+        'method': 'POST',
+        'targets': ['default'],
+        'headers': {'Content-Type': 'application/json'},
+        'json': {'event': 'order.created', 'id': request_id},
+        'attempt': 1
+    }
+    job.update(fields)
+    return job
+
+
+ERROR = {'status': 'error', 'error': 'Connection refused'}
+
+
+def test_failed_targets_are_errors_and_5xx():
+    result = {'targets': {
+        'a': {'status': 'forwarded', 'status_code': 200},
+        'b': {'status': 'forwarded', 'status_code': 502},
+        'c': {'status': 'error', 'error': 'timeout'}
+    }}
+    assert failed_targets(result) == ['b', 'c']
+
+
+def test_job_out_of_attempts_is_dead_lettered(tmp_path):
+    dead_letters = DeadLetterQueue(str(tmp_path / 'dead.jsonl'), 10)
+    scheduler = RetryScheduler(lambda job: True, 3, 0.01, 0.01, dead_letters)
+    job = make_job(1)
+    assert scheduler.schedule(job, ERROR) is not None
+    assert job['attempt'] == 2
+    job['attempt'] = 3
+    assert scheduler.schedule(job, ERROR) is None
+    assert [entry['request_id'] for entry in dead_letters.list()] == [1]
+    assert dead_letters.list()[0]['error'] == 'Connection refused'
+
+
+def test_dead_letters_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'dead.jsonl')
+    dead_letters = DeadLetterQueue(path, 10)
+    dead_letters.add(make_job(1), ERROR)
+    dead_letters.add(make_job(2, json=None, body=b'\xff\xfebinary'), {'status': 'forwarded', 'status_code': 503})
+
+    reloaded = DeadLetterQueue(path, 10)
+    assert len(reloaded) == 2
+    entries = reloaded.list()
+    assert [entry['request_id'] for entry in entries] == [2, 1]
+    assert entries[0]['error'] == 'HTTP 503'
+
+    # Taken entries are gone from the file too, and new ids don't reuse old ones
+    assert [entry['request_id'] for entry in reloaded.take(1)] == [1]
+    reloaded.add(make_job(3), ERROR)
+    again = DeadLetterQueue(path, 10)
+    assert [entry['request_id'] for entry in again.list()] == [3, 2]
+    assert again.list()[0]['id'] > again.list()[1]['id']
+
+
+def test_oldest_dead_letters_are_dropped_beyond_max(tmp_path):
+    path = str(tmp_path / 'dead.jsonl')
+    dead_letters = DeadLetterQueue(path, 2)
+    for request_id in range(1, 6):
+        dead_letters.add(make_job(request_id), ERROR)
+    assert [entry['request_id'] for entry in dead_letters.list()] == [5, 4]
+    assert [entry['request_id'] for entry in DeadLetterQueue(path, 2).list()] == [5, 4]
+
+
+def test_sqlite_dead_letters_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'webhook.db')
+    dead_letters = SQLiteDeadLetterQueue(path, 10)
+    dead_letters.add(make_job(1), ERROR)
+    dead_letters.add(make_job(2, body_path='/tmp/body'), ERROR)
+
+    reloaded = SQLiteDeadLetterQueue(path, 10)
+    assert len(reloaded) == 2
+    assert reloaded.holds_body('/tmp/body')
+    assert [entry['request_id'] for entry in reloaded.take()] == [1, 2]
+    assert len(SQLiteDeadLetterQueue(path, 10)) == 0
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_replay_resubmits_jobs_with_a_fresh_attempt_count(tmp_path):
+    dead_letters = DeadLetterQueue(str(tmp_path / 'dead.jsonl'), 10)
+    dead_letters.add(make_job(1, attempt=5), ERROR)
+    dead_letters.add(make_job(2, json=None, body=b'\xff\xfebinary', attempt=5), ERROR)
+    submitted = []
+    replayer = DeadLetterReplayer(dead_letters, lambda job: submitted.append(job) or True)
+
+    assert replayer.start(rate=1000) == 2
+    wait_for(lambda: not replayer.stats()['running'])
+    assert [job['request_id'] for job in submitted] == [1, 2]
+    assert all(job['attempt'] == 1 for job in submitted)
+    assert submitted[1]['body'] == b'\xff\xfebinary'
+    assert replayer.stats()['replayed'] == 2
+    assert len(dead_letters) == 0
+
+
+def test_replay_waits_while_the_forward_queue_is_full(tmp_path):
+    dead_letters = DeadLetterQueue(str(tmp_path / 'dead.jsonl'), 10)
+    dead_letters.add(make_job(1), ERROR)
+    answers = [False, False, True]
+    submitted = []
+
+    def submit(job):
+        accepted = answers.pop(0)
+        if accepted:
+            submitted.append(job)
+        return accepted
+
+    replayer = DeadLetterReplayer(dead_letters, submit)
+    replayer.start(rate=1000)
+    wait_for(lambda: not replayer.stats()['running'])
+    assert [job['request_id'] for job in submitted] == [1]
+    assert not answers
@@ -0,0 +1,42 @@
+"""
+Tests for the routing table and fan-out result handling
+"""
+
+from forwarder import combine_results
+from routing import Router
+
+
+def test_sub_paths_only_when_a_route_matches_on_the_path():
+    assert not Router([], 'http://upstream', 10).uses_path
+    assert not Router([{'name': 'a', 'url': 'http://a', 'methods': ['POST']}], None, 10).uses_path
+    router = Router([
+        {'name': 'github', 'url': 'http://a', 'path': '^/github'},
+        {'name': 'all', 'url': 'http://b'}
+    ], None, 10)
+    assert router.uses_path
+    assert router.match('POST', '/github/push', {}, None) == ['github', 'all']
+    assert router.match('POST', '/stripe', {}, None) == ['all']
+
+
+def test_headers_match_case_insensitively():
+    router = Router([{'name': 'a', 'url': 'http://a', 'headers': {'X-GitHub-Event': '^push$'}}], None, 10)
+    assert router.match('POST', '/', {'x-github-event': 'push'}, None) == ['a']
+    assert router.match('POST', '/', {'X-Github-Event': 'issues'}, None) == []
+
+
+def test_combine_results_without_targets_is_an_error():
+    result = combine_results({})
+    assert result['status'] == 'error'
+    assert result['targets'] == {}
+    assert 'finished_at' in result
+
+
+def test_combine_results_partial():
+    result = combine_results({
+        'a': {'status': 'forwarded', 'status_code': 200, 'finished_at': '2024-05-01 12:00:01', 'elapsed_ms': 5},
+        'b': {'status': 'error', 'error': 'timeout', 'finished_at': '2024-05-01 12:00:02', 'elapsed_ms': 9}
+    })
+    assert result['status'] == 'partial'
+    assert result['status_code'] == 200
+    assert result['elapsed_ms'] == 9
+    assert result['error'] == 'b: timeout'
@@ -0,0 +1,63 @@
+"""
+Tests for the search index: term extraction, queries and its bounded queue
+"""
+
+import time
+
+from search import SearchIndex, record_terms
+from store import RequestRecord, RequestStore
+
+
+def make_record(request_id, data, headers=None):
+    record = RequestRecord('POST', 'http://localhost:5000/hooks', headers or {'X-Event': 'push'}, 1715000000.0, 100)
+    record.id = request_id
+    record.data = data
+    return record
+
+
+def test_terms_are_cut_off_in_the_order_they_are_found():
+    record = make_record(1, {f"field{n}": f"value{n}" for n in range(50)})
+    terms = record_terms(record, 20)
+    assert len(terms) == 20
+    assert terms[:4] == ['post', 'http', 'localhost', '5000']
+    assert terms == record_terms(make_record(1, dict(record.data)), 20)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_search_matches_every_term_newest_first():
+    index = SearchIndex(RequestStore(100, 1024 * 1024))
+    index.start()
+    index.add(make_record(1, {'order': {'id': 1234}, 'status': 'paid'}))
+    index.add(make_record(2, {'order': {'id': 5678}, 'status': 'paid'}))
+    index.add(make_record(3, {'order': {'id': 1234}, 'status': 'refunded'}, {'X-Event': 'refund'}))
+    wait_for(lambda: index.stats()['indexed'] == 3)
+    assert index.search('paid')[0] == [2, 1]
+    assert index.search('order.id=1234')[0] == [3, 1]
+    assert index.search('order.id=1234 x-event=push')[0] == [1]
+    assert index.search('paid', limit=1) == ([2], 2)
+    assert index.search('paid', before=2)[0] == [1]
+
+    index.remove(make_record(1, None))
+    wait_for(lambda: index.search('paid')[0] == [2])
+
+
+def test_records_beyond_the_queue_are_dropped_and_counted():
+    # Not started, so nothing drains the queue
+    index = SearchIndex(RequestStore(100, 1024 * 1024), queue_size=2)
+    for request_id in range(1, 5):
+        index.add(make_record(request_id, {'n': request_id}))
+    index.remove(make_record(3, None))
+    stats = index.stats()
+    assert stats['pending'] == 2
+    assert stats['dropped'] == 2
+
+    # The eviction that did not fit is applied once the queue drains
+    index.start()
+    wait_for(lambda: index.floor == 3)
+    assert index.search('n')[0] == []
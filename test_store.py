@@ -0,0 +1,90 @@
+"""
+Tests for the in-memory request store: record compaction and its round
+trip through the persisted state, eviction and the shared header table
+"""
+
+import json
+
+from store import CompressedBody, HeaderTable, RequestRecord, RequestStore
+
+
+def make_record(body, headers=None):
+    headers = headers or {'Content-Type': 'application/json', 'X-Github-Event': 'push'}
+    record = RequestRecord('POST', 'http://localhost:5000/', headers, 1715000000.0,
+                           len(body) + sum(len(k) + len(v) for k, v in headers.items()))
+    record.body = body
+    return record
+
+
+def test_compact_round_trip_through_state():
+    body = json.dumps({'commits': [{'message': 'Fix retry backoff'}] * 100}).encode()
+    record = make_record(body)
+    record.id = 7
+    record.query_params = {'page': '1'}
+    record.forward = {'status': 'forwarded', 'status_code': 200}
+    original = record.to_state()
+
+    record.compact(HeaderTable(), 1024)
+    assert isinstance(record._body, CompressedBody)
+    assert isinstance(record._headers, tuple)
+    assert record.size < original['size']
+
+    state = record.to_state()
+    assert state == dict(original, size=record.size)
+    # Survives the JSON encoding used by the journal and the SQLite store
+    restored = RequestRecord.from_state(json.loads(json.dumps(state)))
+    assert restored.to_state() == state
+    assert restored.body == body
+    assert restored.data == json.loads(body)
+    assert restored.headers == original['headers']
+
+
+def test_binary_body_round_trip():
+    body = bytes(range(256)) * 8
+    record = make_record(body, {'Content-Type': 'application/octet-stream'})
+    record.id = 1
+    record.compact(HeaderTable(), 1024)
+    restored = RequestRecord.from_state(json.loads(json.dumps(record.to_state())))
+    assert restored.body == body
+
+
+def test_small_or_incompressible_bodies_are_kept_as_is():
+    record = make_record(b'{"a": 1}')
+    record.compact(HeaderTable(), 1024)
+    assert not isinstance(record._body, CompressedBody)
+
+
+def test_header_pairs_are_shared_and_released_with_their_records():
+    store = RequestStore(2, 1024 * 1024, compact=True, compress_bytes=1024)
+    first = store.add(make_record(b'{}'))
+    second = store.add(make_record(b'{}'))
+    assert first._headers[0] is second._headers[0]
+    assert store.header_table.stats()['pairs'] == 2
+
+    # Evicting the first record leaves the pairs the second still holds
+    store.add(make_record(b'{}', {'Content-Type': 'text/plain'}))
+    assert store.header_table.stats() == {'pairs': 3, 'max_pairs': 10000, 'references': 3}
+    store.add(make_record(b'{}', {'Content-Type': 'text/plain'}))
+    assert store.header_table.stats() == {'pairs': 1, 'max_pairs': 10000, 'references': 2}
+    store.clear()
+    assert store.header_table.stats()['pairs'] == 0
+
+
+def test_full_table_interns_again_once_pairs_are_released():
+    table = HeaderTable(max_values=64, max_pairs=2)
+    stale = table.intern({'X-Delivery': 'a', 'X-Other': 'b'})
+    kept = table.intern({'X-Delivery': 'c'})
+    assert kept[0] not in table._pairs
+    table.release(kept)
+    table.release(stale)
+    assert len(table) == 0
+    assert table.intern({'X-Delivery': 'c'})[0] is table.intern({'X-Delivery': 'c'})[0]
+
+
+def test_headers_with_many_values_are_kept_per_record():
+    table = HeaderTable(max_values=2)
+    records = [table.intern({'X-Signature': str(n)}) for n in range(4)]
+    assert len(table) == 2
+    table.release(records[0])
+    table.intern({'X-Signature': '4'})
+    assert len(table) == 2